@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+
+from tests.component_harness import done_message, ip_message, run_standard_component, text_outputs
+from zalfmas_fbp.components.consumers.africa_calibration_consumer import run_component
+from zalfmas_fbp.components.consumers.common import yield_aggregator
+from zalfmas_fbp.components.consumers.common.yield_aggregator import YieldAggregator, extract_yields
+
+
+def _result(country_id: int, year_to_yield: dict[int, float]) -> str:
+    return json.dumps(
+        {
+            "customId": {"country_id": country_id, "nodata": False},
+            "data": [
+                {"origSpec": "yearly", "results": [{"Year": y, "Yield": v} for y, v in year_to_yield.items()]},
+                {"origSpec": "crop", "results": [{"Yield": 1000.0}]},
+            ],
+        }
+    )
+
+
+def test_extract_yields_matches_full_parsing() -> None:
+    text = _result(3, {2001: 1.5, 2000: 2.5})
+
+    custom_id, years, yields = extract_yields(text)
+    expected = yield_aggregator._extract_from_dict(json.loads(text))
+
+    assert custom_id == expected[0] == {"country_id": 3, "nodata": False}
+    assert years.tolist() == expected[1].tolist() == [2001, 2000]
+    assert yields.tolist() == expected[2].tolist() == [1.5, 2.5]
+
+
+def test_aggregator_averages_per_country_and_year() -> None:
+    aggregator = YieldAggregator()
+    aggregator.add(1, np.array([2001, 2002]), np.array([1.0, 2.0]))
+    aggregator.add(1, np.array([1999, 2001]), np.array([5.0, 3.0]))
+    aggregator.add(2, np.array([2005, 2005]), np.array([1.0, 4.0]))
+    aggregator.add(2, np.array([], dtype=np.int64), np.array([]))
+
+    assert aggregator.averages() == {"1|1999": 5.0, "1|2001": 2.0, "1|2002": 2.0, "2|2005": 2.5}
+
+    aggregator.clear()
+    assert aggregator.averages() == {}
+
+
+def test_component_sends_averages_per_round(monkeypatch, tmp_path) -> None:
+    last = json.dumps({"customId": {"no_of_sent_envs": 2, "nodata": True}})
+    results = [_result(1, {2000: 2.0}), _result(1, {2000: 4.0, 2001: 1.0}), last, _result(2, {2000: 3.0})]
+    result = run_standard_component(
+        run_component,
+        monkeypatch,
+        inputs={"conf": [done_message()], "result": [*map(ip_message, results), done_message()]},
+        outputs=["year_to_yield"],
+        config={"path_to_out": str(tmp_path)},
+    )
+
+    assert [json.loads(out) for out in text_outputs(result.output("year_to_yield"))] == [{"1|2000": 3.0, "1|2001": 1.0}]
+    assert "last expected env received" in (tmp_path / "consumer.out").read_text()
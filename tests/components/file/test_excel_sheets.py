@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from zalfmas_fbp.components.file.common.excel_sheets import sheet_records, sheet_table, table_bytes
+
+
+def _sheet() -> pandas.DataFrame:
+    return pandas.DataFrame(
+        {
+            "EID": [1, 1, 2],
+            "date": pandas.to_datetime(["2024-05-16 12:00", None, "2023-01-02 00:00"]),
+            "n": [1, 2, 3],
+            "x": [0.5, np.nan, 2.0],
+            "name": ["a", None, 3],
+        }
+    )
+
+
+def test_sheet_records_convert_columns_in_bulk() -> None:
+    records = sheet_records(_sheet(), ["EID"])
+
+    assert records == [
+        {"EID": "1", "date": "2024-05-16", "n": 1, "x": 0.5, "name": "a"},
+        {"EID": "1", "date": None, "n": 2, "x": None, "name": None},
+        {"EID": "2", "date": "2023-01-02", "n": 3, "x": 2.0, "name": "3"},
+    ]
+    assert all(type(r["n"]) is int and type(r["x"]) in (float, type(None)) for r in records)
+
+
+def test_sheet_table_round_trips_as_arrow_and_parquet() -> None:
+    table = sheet_table(_sheet())
+
+    assert table.column("name").to_pylist() == ["a", None, "3"]
+    assert table.column("x").to_pylist() == [0.5, None, 2.0]
+    assert pa.ipc.open_stream(table_bytes(table, "arrow_ipc")).read_all().equals(table)
+    assert pq.read_table(pa.BufferReader(table_bytes(table, "parquet"))).column("n").to_pylist() == [1, 2, 3]
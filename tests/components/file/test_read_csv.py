@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import pyarrow as pa
+import pytest
+from mas.schema.common import common_capnp
+from zalfmas_common import common
+
+from tests.component_harness import done_message, run_standard_component
+from zalfmas_fbp.components.file.read_csv import run_component
+
+SETUP_TYPE = "mas.schema.model.monica.sim_setup_capnp:Setup"
+CSV = """run-id;crop;fertilization;co2;comment
+1;wheat;TRUE;400.5;first
+2;maize;false;x;"second; quoted"
+3;rye;true; 410 ;third
+"""
+
+
+def _run(monkeypatch, tmp_path, **config):
+    path = tmp_path / "setups.csv"
+    path.write_text(CSV)
+    return run_standard_component(
+        run_component,
+        monkeypatch,
+        inputs={"conf": [done_message()]},
+        outputs=["out"],
+        config={
+            "id_col": "run-id",
+            "col_to_field_names": {"run-id": "runId", "crop": "cropId"},
+            "send_ids": [1, 2, 3],
+            "file": str(path),
+            "struct_type": SETUP_TYPE,
+            "to_attr": None,
+            "block_size": 64,
+            **config,
+        },
+    ).output()
+
+
+def _rows(setups) -> list[tuple]:
+    return [(s.runId, s.cropId, s.fertilization, round(s.co2, 1), s.comment) for s in setups]
+
+
+EXPECTED = [
+    (1, "wheat", True, 400.5, "first"),
+    (2, "maize", False, 0.0, "second; quoted"),
+    (3, "rye", True, 410.0, "third"),
+]
+
+
+def test_rows_are_sent_as_structs(monkeypatch, tmp_path) -> None:
+    struct_type, _ = common.load_capnp_module(SETUP_TYPE)
+
+    out = _run(monkeypatch, tmp_path, send_ids=[1, 3])
+
+    assert _rows(ip.content.as_struct(struct_type) for ip in out.values) == [EXPECTED[0], EXPECTED[2]]
+
+
+def test_batches_are_sent_as_lists_of_structs(monkeypatch, tmp_path) -> None:
+    struct_type, _ = common.load_capnp_module(SETUP_TYPE)
+
+    out = _run(monkeypatch, tmp_path, batch_rows=2)
+
+    batches = [ip.content.as_struct(common_capnp.Value).lv for ip in out.values]
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert _rows(v.p.as_struct(struct_type) for batch in batches for v in batch) == EXPECTED
+
+
+@pytest.mark.parametrize("block_size", [64, 1 << 20])
+def test_batches_are_sent_as_arrow_streams(monkeypatch, tmp_path, block_size: int) -> None:
+    out = _run(monkeypatch, tmp_path, batch_rows=10, batch_format="arrow", block_size=block_size)
+
+    tables = [pa.ipc.open_stream(ip.content.as_struct(common_capnp.Blob).data).read_all() for ip in out.values]
+    table = pa.concat_tables(tables)
+    assert table.column_names == ["runId", "cropId", "fertilization", "co2", "comment"]
+    assert table.column("co2").to_pylist() == [400.5, None, 410.0]
+    assert table.column("runId").to_pylist() == [1, 2, 3]
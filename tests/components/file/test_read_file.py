@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+from mas.schema.common import common_capnp
+from zalfmas_common import common
+
+from tests.component_harness import run_process_component
+from zalfmas_fbp.components.file.common.line_batches import iter_line_batches
+from zalfmas_fbp.components.file.read_file import METADATA, ReadFile
+
+LINES = ["header\n", "a\n", "bb\n", "ccc\n", "dddd\n", "é\n"]
+
+
+def _run(tmp_path, **config):
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(LINES), encoding="utf-8")
+    component = ReadFile(METADATA)
+    component.apply_config_values({"file": str(path), **config})
+    return run_process_component(component, inputs={}, outputs=("out",)).output().values
+
+
+def test_single_lines_are_sent_without_batching(tmp_path) -> None:
+    out = _run(tmp_path, skip_lines=1)
+
+    assert [ip.content.as_text() for ip in out] == LINES[1:]
+
+
+@pytest.mark.parametrize(
+    ("batch_lines", "batch_bytes", "expected"),
+    [
+        (2, 0, [2, 2, 1]),
+        (0, 5, [2, 2, 1]),
+        (3, 3, [2, 1, 1, 1]),
+    ],
+)
+def test_iter_line_batches_limits_lines_and_bytes(tmp_path, batch_lines, batch_bytes, expected) -> None:
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(LINES), encoding="utf-8")
+
+    with path.open(encoding="utf-8") as file:
+        batches = list(iter_line_batches(file, batch_lines, batch_bytes, skip_lines=1))
+
+    assert [len(batch) for batch in batches] == expected
+    assert [line for batch in batches for line in batch] == LINES[1:]
+
+
+def test_batches_are_sent_as_lists_with_counts(tmp_path) -> None:
+    out = _run(tmp_path, skip_lines=1, batch_lines=2)
+
+    assert [list(ip.content.as_struct(common_capnp.Value).lt) for ip in out] == [LINES[1:3], LINES[3:5], LINES[5:]]
+    assert [common.get_fbp_attr(ip, "first_line").as_struct(common_capnp.Value).ui64 for ip in out] == [2, 4, 6]
+    assert [common.get_fbp_attr(ip, "line_count").as_struct(common_capnp.Value).ui64 for ip in out] == [2, 2, 1]
+
+
+def test_batches_are_sent_as_text_into_attribute(tmp_path) -> None:
+    out = _run(tmp_path, batch_lines=4, batch_format="text", to_attr="lines")
+
+    assert [common.get_fbp_attr(ip, "lines").as_text() for ip in out] == ["".join(LINES[:4]), "".join(LINES[4:])]
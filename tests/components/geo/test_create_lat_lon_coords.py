@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import numpy as np
+import pyarrow as pa
+
+from zalfmas_fbp.components.geo import create_lat_lon_coords
+from zalfmas_fbp.components.geo.common.mapped_grid import MappedGrid
+from zalfmas_fbp.components.geo.create_lat_lon_coords import coords_to_arrow, region_coords
+
+IDS_GRID = MappedGrid(
+    np.array([[1, 1, 2, -9999], [0, 2, 2, 3], [3, 3, -9999, 1]]),
+    {"ncols": 4, "nrows": 3, "xllcorner": 0.0, "yllcorner": 0.0, "cellsize": 1.0, "nodata_value": -9999},
+)
+TL = {"lat": 3.5, "lon": -0.5}
+BR = {"lat": -0.5, "lon": 4.5}
+
+
+def _cell_by_cell(ids: list[int]) -> list[list[float]]:
+    coords = []
+    for lat_scaled in range(int(TL["lat"] * 4), int(BR["lat"] * 4) - 1, -1):
+        for lon_scaled in range(int(TL["lon"] * 4), int(BR["lon"] * 4) + 1):
+            lat, lon = lat_scaled / 4, lon_scaled / 4
+            country_id = IDS_GRID.value(lat, lon)
+            if country_id and (len(ids) == 0 or country_id in ids):
+                coords.append([lat, lon, country_id])
+    return coords
+
+
+def _coords(blocks) -> list[list[float]]:
+    return [[lat, lon, i] for lats, lons, ids in blocks for lat, lon, i in zip(lats, lons, ids, strict=True)]
+
+
+def test_region_coords_match_cell_by_cell_lookup(monkeypatch) -> None:
+    monkeypatch.setattr(create_lat_lon_coords, "BLOCK_CELLS", 7)
+
+    for ids in ([], [2, 3]):
+        assert _coords(region_coords(TL, BR, 0.25, 4.0, IDS_GRID, ids)) == _cell_by_cell(ids)
+
+
+def test_coords_are_written_as_arrow_stream() -> None:
+    data = coords_to_arrow(region_coords(TL, BR, 0.25, 4.0, IDS_GRID, [3]))
+
+    table = pa.ipc.open_stream(data).read_all()
+    assert table.column_names == ["lat", "lon", "id"]
+    assert [list(row.values()) for row in table.to_pylist()] == _cell_by_cell([3])
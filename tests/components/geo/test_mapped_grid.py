@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+from zalfmas_fbp.components.geo.common.mapped_grid import compile_ascii_grid, load_grid_mapped
+
+HEADER = "ncols 3\nnrows 2\nxllcorner 10.0\nyllcorner 50.0\ncellsize 1.0\nnodata_value -9999\n"
+
+
+def test_values_are_gathered_from_the_memory_mapped_grid(tmp_path) -> None:
+    path = tmp_path / "ids.asc"
+    path.write_text(HEADER + "1 2 3\n4 -9999 6\n")
+
+    grid = load_grid_mapped(path, int, cache_dir=tmp_path / "cache")
+    values, valid = grid.values(np.array([51.5, 50.5, 50.5, 49.0]), np.array([10.5, 12.5, 11.5, 10.5]))
+
+    assert isinstance(grid.grid, np.memmap)
+    assert values[valid].tolist() == [1, 6]
+    assert valid.tolist() == [True, True, False, False]
+    assert grid.value(51.5, 11.5) == 2
+    assert grid.value(50.5, 11.5) is None
+    assert grid.value(50.5, 11.5, return_no_data=True) == -9999
+
+
+def test_grid_is_recompiled_only_when_the_source_changes(tmp_path) -> None:
+    path = tmp_path / "ids.asc"
+    path.write_text(HEADER + "1 2 3\n4 5 6\n")
+    cache_dir = tmp_path / "cache"
+
+    npy_path = compile_ascii_grid(path, int, cache_dir)
+    compiled_at = npy_path.stat().st_mtime_ns
+    assert compile_ascii_grid(path, int, cache_dir).stat().st_mtime_ns == compiled_at
+
+    path.write_text(HEADER + "7 2 3\n4 5 6\n")
+    os.utime(path, ns=(compiled_at + 10**9, compiled_at + 10**9))
+
+    assert load_grid_mapped(path, int, cache_dir=cache_dir).value(51.5, 10.5) == 7
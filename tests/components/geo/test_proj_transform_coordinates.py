@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+from mas.schema.fbp import fbp_capnp
+from mas.schema.geo import geo_capnp
+from zalfmas_common import geo
+
+from tests.component_harness import PortMessage, PortValue, done_message, ip_message, run_standard_component
+from zalfmas_fbp.components.geo.common.reproject import transform_coords
+from zalfmas_fbp.components.geo.proj_transform_coordinates import run_component
+
+
+def _latlon(lat: float, lon: float):
+    return geo_capnp.LatLonCoord.new_message(lat=lat, lon=lon)
+
+
+def test_batched_transform_matches_single_transforms() -> None:
+    coords = [
+        _latlon(52.5, 13.4),
+        geo_capnp.UTMCoord.new_message(zone=32, latitudeBand="N", r=400000.0, h=5800000.0),
+        _latlon(48.1, 11.6),
+    ]
+
+    batched = transform_coords(coords, "latlon")
+
+    assert [(c.lat, c.lon) for c in batched[::2]] == [(52.5, 13.4), (48.1, 11.6)]
+    expected = geo.transform_from_to_geo_coord(coords[1], "latlon")
+    assert batched[1].lat == pytest.approx(expected.lat)
+    assert batched[1].lon == pytest.approx(expected.lon)
+    utm = transform_coords(coords[:1], "utm32n")[0]
+    assert (utm.r, utm.h) == pytest.approx(geo.get_xy(geo.transform_from_to_geo_coord(coords[0], "utm32n")))
+
+
+def test_component_transforms_in_batches_and_keeps_substreams(monkeypatch) -> None:
+    close = PortMessage(PortValue(fbp_capnp.IP.new_message(type="closeBracket")))
+    result = run_standard_component(
+        run_component,
+        monkeypatch,
+        inputs={
+            "conf": [done_message()],
+            "in": [ip_message(_latlon(52.5, 13.4)), close, ip_message(_latlon(48.1, 11.6)), done_message()],
+        },
+        outputs=["out"],
+        config={"from_name": "latlon", "to_name": "utm32n", "from_attr": None, "to_attr": None, "batch_size": 10},
+    )
+
+    out = result.output().values
+    assert [ip.type for ip in out] == ["standard", "closeBracket", "standard"]
+    assert out[0].content.as_struct(geo_capnp.UTMCoord).r == pytest.approx(798609.5209, abs=1e-3)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+import pytest
+from mas.schema.geo import geo_capnp
+from mas.schema.grid import grid_capnp
+
+from tests.component_harness import done_message, ip_message, run_standard_component
+from zalfmas_fbp.components.grid.common.calc import compile_calc
+from zalfmas_fbp.components.grid.common.lookup import GridLookup
+from zalfmas_fbp.components.grid.use_grid_service import apply_calc, run_component
+
+
+class _Result:
+    def __init__(self, val):
+        self.val = val
+
+
+class _Grid:
+    """Returns lat * 10 as float value (no data for negative lats) after a short delay."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def closestValueAt(self, coord):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if coord["lat"] < 0:
+            return _Result(grid_capnp.Grid.Value.new_message(no=True))
+        return _Result(grid_capnp.Grid.Value.new_message(f=coord["lat"] * 10))
+
+    def cast_as(self, _schema):
+        return self
+
+
+def test_calc_expressions_are_evaluated_on_arrays() -> None:
+    calc = compile_calc("2 * GV ^ 2 + sqrt(gv) - a")
+
+    np.testing.assert_allclose(calc({"gv": np.array([1.0, 4.0]), "a": 1}), [2.0, 33.0])
+    with pytest.raises(ValueError, match="Unsupported"):
+        compile_calc("__import__('os')")
+
+
+def test_invalid_integer_calc_results_become_no_data() -> None:
+    values = [("i", 4), ("i", -4), ("ui", 9), ("ui", 1), ("no", None)]
+
+    assert apply_calc(values, {"f(gv)": "sqrt(gv) - 2"}) == [
+        ("i", 0),
+        ("no", None),
+        ("ui", 1),
+        ("no", None),
+        ("no", None),
+    ]
+    ((which, value),) = apply_calc([("f", -4.0)], {"f(gv)": "sqrt(gv)"})
+    assert which == "f"
+    assert np.isnan(value)
+
+
+def test_lookup_deduplicates_caches_and_bounds_concurrency() -> None:
+    grid = _Grid()
+    lookup = GridLookup(grid, max_concurrent=2, cache_size=10, cache_decimals=3)
+
+    async def run():
+        first = await lookup.lookup([(1.0, 1.0), (2.0, 2.0), (1.00001, 1.0), (3.0, 3.0), (-1.0, 0.0)])
+        second = await lookup.lookup([(2.0, 2.0), (1.0, 1.0)])
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == [("f", 10.0), ("f", 20.0), ("f", 10.0), ("f", 30.0), ("no", None)]
+    assert second == [("f", 20.0), ("f", 10.0)]
+    assert grid.requests == 4
+    assert grid.max_in_flight == 2
+    assert (lookup.hits, lookup.misses) == (3, 4)
+
+
+def test_component_applies_calc_to_batches(monkeypatch) -> None:
+    grid = _Grid()
+
+    async def read_or_connect(self, name):
+        return grid
+
+    monkeypatch.setattr("zalfmas_fbp.run.ports.PortConnector.read_or_connect", read_or_connect, raising=False)
+    coords = [geo_capnp.LatLonCoord.new_message(lat=lat, lon=0.0) for lat in (1.0, 4.0, -1.0)]
+    result = run_standard_component(
+        run_component,
+        monkeypatch,
+        inputs={"conf": [done_message()], "in": [*map(ip_message, coords), done_message()], "service": []},
+        outputs=["out"],
+        config={"from_attr": None, "to_attr": None, "calc": {"f(gv)": "gv * k", "k": 2}, "batch_size": 2},
+    )
+
+    values = [ip.content.as_struct(grid_capnp.Grid.Value) for ip in result.output().values]
+    assert [v.which() for v in values] == ["f", "f", "no"]
+    assert [v.f for v in values[:2]] == [20.0, 80.0]
@@ -0,0 +1 @@
+"""JSON component tests."""
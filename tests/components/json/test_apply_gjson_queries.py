@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+
+from zalfmas_fbp.components.json.apply_gjson_queries import (
+    _apply_queries,
+    _merge_substream_payloads,
+    _QueryPlan,
+    _SubstreamMerger,
+)
+from zalfmas_fbp.components.json.common import codec
+
+
+@pytest.mark.parametrize(
+    "queries",
+    [
+        ["data", "items", "1", "name"],
+        ["data", "by_id", "0"],
+        ["data.items", "#.size"],
+        ["data", "items", "#.size", "0"],
+    ],
+)
+def test_query_plan_matches_sequential_queries(queries: list[str]) -> None:
+    data = {"data": {"items": [{"name": "a", "size": 1}, {"name": "b", "size": 2}], "by_id": {"0": "zero"}}}
+
+    assert _QueryPlan(queries).apply(data) == _apply_queries(data, queries)
+
+
+@pytest.mark.parametrize(
+    "payloads",
+    [
+        [],
+        [{"a": 1}, {"b": 2}, {"a": 3}],
+        [[1, 2], [], [3]],
+        [[], []],
+        [{"a": 1}, [1, 2], "x"],
+        [[1], {"a": 1}, None],
+    ],
+)
+def test_substream_merger_matches_merged_payloads(payloads: list) -> None:
+    merger = _SubstreamMerger("json")
+    for payload in payloads:
+        merger.add(payload)
+
+    out_ip = merger.write_ip([{"key": "id", "value": "1"}])
+
+    assert codec.decode_ip_content(out_ip) == _merge_substream_payloads(payloads)
+    assert [kv.key for kv in out_ip.attributes] == ["id"]
+
+
+@pytest.mark.parametrize("encoding", ["json", "msgpack"])
+def test_substream_merger_keeps_preceding_objects_in_mixed_results(encoding: str) -> None:
+    payloads = [{"a": 1}, {"b": 2}, [1], {"c": 3}]
+    merger = _SubstreamMerger(encoding)
+    for payload in payloads:
+        merger.add(payload)
+
+    assert codec.decode_ip_content(merger.write_ip([])) == payloads == _merge_substream_payloads(payloads)
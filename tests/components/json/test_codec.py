@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+import math
+
+import pytest
+from mas.schema.fbp import fbp_capnp
+
+from zalfmas_fbp.components.json.common import codec
+
+
+def test_codec_round_trips_json_text_and_bytes() -> None:
+    value = {"a": [1, 2.5, None, True], "b": {"c": "ü"}}
+
+    assert codec.loads(codec.dumps(value)) == value
+    assert codec.loads(codec.dumps_bytes(value)) == value
+    assert json.loads(codec.dumps(value)) == value
+
+
+def test_codec_falls_back_to_stdlib_for_nan_and_big_ints() -> None:
+    assert math.isnan(codec.loads('{"x": NaN}')["x"])
+    assert codec.loads(codec.dumps({"x": 2**70})) == {"x": 2**70}
+
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads("{invalid")
+
+
+def test_codec_round_trips_nan_and_infinity() -> None:
+    value = {"x": math.nan, "y": [1.0, math.inf, -math.inf], "z": None}
+
+    text = codec.dumps(value)
+    decoded = codec.loads(text)
+
+    assert text == json.dumps(value)
+    assert math.isnan(decoded["x"])
+    assert decoded["y"] == [1.0, math.inf, -math.inf]
+    assert decoded["z"] is None
+
+
+def test_codec_decodes_text_ip_content_as_json() -> None:
+    out_ip = codec.new_ip({"x": 1}, attributes=[{"key": "id", "value": "1"}])
+
+    assert out_ip.content.as_text() == codec.dumps({"x": 1})
+    assert codec.decode_ip_content(fbp_capnp.IP.new_message(content='{"x": 1}')) == {"x": 1}
+    assert [kv.key for kv in out_ip.attributes] == ["id"]
+
+
+def test_codec_round_trips_msgpack_ip_content() -> None:
+    pytest.importorskip("msgspec")
+
+    out_ip = codec.new_ip({"x": [1, 2]}, encoding="msgpack")
+
+    assert out_ip.sysAttributes.contentType == codec.MSGPACK_CONTENT_TYPE
+    assert codec.decode_ip_content(out_ip.as_reader()) == {"x": [1, 2]}
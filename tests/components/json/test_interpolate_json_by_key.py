@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+
+from zalfmas_fbp.components.json.interpolate_json_by_key import InterpolateJsonByKeyConfig, _transform
+
+
+def _config(**kwargs) -> InterpolateJsonByKeyConfig:
+    return InterpolateJsonByKeyConfig.model_validate({"x_key": "date", "y_key": "v", **kwargs})
+
+
+_DATA = [
+    {"id": "a", "date": "2020-01-03", "v": 30},
+    {"id": "a", "date": "2020-01-01", "v": 10},
+    {"id": "a", "date": "2020-01-03", "v": 50},
+    {"id": "b", "date": "2020-01-01", "v": 1},
+]
+
+
+@pytest.mark.parametrize(
+    ("mode", "extrapolation", "expected"),
+    [
+        ("linear", "null", [None, 10.0, 30.0, 50.0, None]),
+        ("linear", "linear", [-10.0, 10.0, 30.0, 50.0, 70.0]),
+        ("step", "clamp", [10.0, 10.0, 10.0, 50.0, 50.0]),
+        ("nearest", "null", [None, 10.0, 10.0, 50.0, None]),
+    ],
+)
+def test_interpolation_modes(mode: str, extrapolation: str, expected: list[float | None]) -> None:
+    inter_x = ["2019-12-31", "2020-01-01", "2020-01-02", "2020-01-03", "2020-01-04"]
+    cfg = _config(group_key="id", inter_x=inter_x, mode=mode, extrapolation=extrapolation)
+
+    rows = _transform(_DATA, cfg)
+
+    assert [row["v"] for row in rows if row["id"] == "a"] == expected
+    assert rows[0] == {"date": "2019-12-31", "v": expected[0], "id": "a"}
+
+
+def test_query_type_must_match_group_x_type() -> None:
+    with pytest.raises(ValueError, match="type mismatch"):
+        _transform(_DATA, _config(inter_x=[1.5]))
+
+
+def test_bool_y_values_are_rejected_after_equal_numeric_values() -> None:
+    numeric = [{"date": 1, "v": 1}, {"date": 2, "v": 0}]
+    bools = [{"date": 1, "v": True}, {"date": 2, "v": False}]
+    cfg = _config(inter_x=[1.5])
+
+    assert [row["v"] for row in _transform(numeric, cfg)] == [0.5]
+    with pytest.raises(TypeError, match="bool is not supported"):
+        _transform(bools, cfg)
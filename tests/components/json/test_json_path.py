@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import pytest
+
+from zalfmas_fbp.components.json.apply_gjson_queries import _apply_queries
+from zalfmas_fbp.components.json.common.json_path import MISSING, compile_path
+
+
+def test_compiled_paths_are_cached_and_resolve_keys_and_indices() -> None:
+    data = {"a": {"b": [{"c": 1}, {"c": 2}]}}
+
+    path = compile_path("a/b/-1/c")
+    assert compile_path("a/b/-1/c") is path
+    assert path.get(data) == 2
+    assert compile_path("a/x").get(data) is MISSING
+    assert compile_path("a/b/5").get(data) is MISSING
+    assert compile_path("a/b/*/c", wildcards=True).get(data) == [1, 2]
+
+
+def test_star_is_a_literal_key_unless_wildcards_are_enabled() -> None:
+    data = {"a": {"*": 1, "b": 2}}
+
+    assert compile_path("a/*").get(data) == 1
+    assert compile_path("a/*").set(data, 3) == {"a": {"*": 3, "b": 2}}
+    assert compile_path("a/*", wildcards=True).get(data) == [3, 2]
+
+
+def test_update_applies_to_all_wildcard_matches_and_raises_for_missing_paths() -> None:
+    data = {"a": [{"v": 1}, {"v": 2}]}
+
+    assert compile_path("a/*/v", wildcards=True).update(data, lambda v: v * 10) == {"a": [{"v": 10}, {"v": 20}]}
+    assert compile_path("").set(data, 1) == 1
+    with pytest.raises(KeyError):
+        compile_path("a/0/x").set(data, 1)
+    with pytest.raises(IndexError):
+        compile_path("a/2/v").get_strict(data)
+    with pytest.raises(TypeError):
+        compile_path("a/0/v/0").set(data, 1)
+
+
+def test_simple_gjson_queries_match_gjson_results() -> None:
+    data = {"items": [{"name": "a", "size": 1}, {"name": "b", "size": 2}], "by_id": {"0": "zero"}}
+
+    assert _apply_queries(data, ["items.1.name"]) == "b"
+    assert _apply_queries(data, ["by_id.0"]) == "zero"
+    assert _apply_queries(data, ["items", "#.size"]) == [1, 2]
+
+
+def test_failing_wildcard_update_leaves_value_unchanged() -> None:
+    missing = {"a": [{"v": 1}, {"x": 2}]}
+    failing = {"a": [{"v": 1}, {"v": None}]}
+
+    with pytest.raises(KeyError):
+        compile_path("a/*/v", wildcards=True).update(missing, lambda v: v * 10)
+    with pytest.raises(TypeError):
+        compile_path("a/*/v", wildcards=True).update(failing, lambda v: v * 10)
+
+    assert missing == {"a": [{"v": 1}, {"x": 2}]}
+    assert failing == {"a": [{"v": 1}, {"v": None}]}
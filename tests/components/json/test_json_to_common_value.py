@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from mas.schema.common import common_capnp
+
+from zalfmas_fbp.components.json.json_to_common_value import JsonToCommonValueConfig, _build_value, _value_fields
+
+
+def test_nested_values_are_built_without_recursion_limit() -> None:
+    deep: list = []
+    current = deep
+    for _ in range(5000):
+        current.append([])
+        current = current[0]
+
+    value, field, _ = _build_value(deep, JsonToCommonValueConfig(), _value_fields())
+
+    assert field == "lv"
+    assert value.lv[0].which() == "lv"
+
+
+def test_numeric_lists_select_smallest_type_and_objects_become_pairs() -> None:
+    value, field, _ = _build_value(
+        {"small": [1, 2.0, -3], "big": [1.5, 1e39], "text": "x"},
+        JsonToCommonValueConfig(),
+        _value_fields(),
+    )
+
+    assert field == "lpair"
+    pairs = {p.fst.as_text(): p.snd.as_struct(common_capnp.Value) for p in value.lpair}
+    assert list(pairs["small"].li8) == [1, 2, -3]
+    assert list(pairs["big"].lf64) == [1.5, 1e39]
+    assert pairs["text"].t == "x"
+
+
+def test_type_hints_reuse_the_type_selected_for_a_path() -> None:
+    cfg = JsonToCommonValueConfig(cache_type_hints=True)
+    type_hints: dict[tuple, str] = {}
+
+    _build_value({"v": [1000]}, cfg, _value_fields(), type_hints)
+    value, _, _ = _build_value({"v": [1]}, cfg, _value_fields(), type_hints)
+
+    assert type_hints == {("v",): "li16"}
+    assert value.lpair[0].snd.as_struct(common_capnp.Value).which() == "li16"
+
+
+def test_numeric_type_hints_are_not_applied_to_string_lists() -> None:
+    cfg = JsonToCommonValueConfig(cache_type_hints=True)
+    type_hints: dict[tuple, str] = {}
+
+    _build_value({"v": [1, 2]}, cfg, _value_fields(), type_hints)
+    value, _, _ = _build_value({"v": ["1", "2"]}, cfg, _value_fields(), type_hints)
+    expected, _, _ = _build_value({"v": ["1", "2"]}, cfg, _value_fields())
+
+    hinted = value.lpair[0].snd.as_struct(common_capnp.Value)
+    assert hinted.which() == expected.lpair[0].snd.as_struct(common_capnp.Value).which() == "lt"
+    assert list(hinted.lt) == ["1", "2"]
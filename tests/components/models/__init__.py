@@ -0,0 +1 @@
+"""Model component tests."""
@@ -0,0 +1,30 @@
+"""Builders of MONICA JSON results shared by the MONICA result tests."""
+
+from __future__ import annotations
+
+
+def output_id(name: str) -> dict:
+    return {
+        "name": name,
+        "displayName": "",
+        "unit": "kg",
+        "jsonInput": name,
+        "fromLayer": -1,
+        "toLayer": -1,
+        "layerAggOp": 0,
+        "timeAggOp": 0,
+        "organ": 6,
+    }
+
+
+def daily_yield_result(*values: float) -> dict:
+    """A MONICA result with one daily section of Date and Yield columns holding values."""
+    return {
+        "data": [
+            {
+                "origSpec": '"daily"',
+                "outputIds": [output_id("Date"), output_id("Yield")],
+                "results": [["2020-01-01"] * len(values), list(values)],
+            },
+        ],
+    }
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any
+
+from mas.schema.common import common_capnp
+from mas.schema.model import model_capnp
+
+from tests.component_harness import done_message, ip_message, run_process_component
+from zalfmas_fbp.components.models.monica.create_monica_capnp_env import METADATA, Component
+
+
+def test_batch_mode_spreads_envs_over_array_outputs_in_order() -> None:
+    component = Component(METADATA)
+    soil = [{"Thickness": 0.3, "Sand": 0.4}]
+
+    result = run_process_component(
+        component,
+        inputs={
+            "conf": [
+                ip_message(common_capnp.StructuredText.new_message(type="toml", value="batch_size = 2")),
+                done_message(),
+            ],
+            "timeseries": [
+                ip_message(common_capnp.StructuredText.new_message(type="unstructured", value="climate.csv")),
+                done_message(),
+            ],
+            "soil": [
+                ip_message(common_capnp.StructuredText.new_message(type="json", value=json.dumps(soil))),
+                done_message(),
+            ],
+            "in": [
+                *(ip_message(json.dumps({"id": i, "params": {"siteParameters": {}}})) for i in range(3)),
+                done_message(),
+            ],
+        },
+        outputs=(),
+        array_outputs={"array_out": 2},
+    )
+
+    envs_per_port = [
+        [
+            json.loads(ip.content.as_struct(model_capnp.Env).rest.as_struct(common_capnp.StructuredText).value)
+            for ip in writer.values
+        ]
+        for writer in result.array_output("array_out")
+    ]
+    assert [[env["id"] for env in envs] for envs in envs_per_port] == [[0, 2], [1]]
+    envs = [env for envs in envs_per_port for env in envs]
+    # the values of the finished timeseries and soil ports are reused for all following envs
+    assert all(env["pathToClimateCSV"] == "climate.csv" for env in envs)
+    assert all(env["params"]["siteParameters"]["SoilProfileParameters"] == soil for env in envs)
+
+
+class _SturdyRefPointer:
+    def __init__(self, sturdy_ref: str):
+        self._st = common_capnp.StructuredText.new_message(type="sturdyRef", value=sturdy_ref)
+
+    def as_struct(self, _schema: Any) -> Any:
+        return self._st
+
+
+def test_sturdy_refs_of_a_batch_are_connected_once() -> None:
+    component = Component(METADATA)
+    connects = []
+
+    async def cast_cap_or_connect(any_pointer: Any, _interface_type: Any) -> tuple[Any, Any]:
+        connects.append(any_pointer)
+        await asyncio.sleep(0)
+        return object(), None
+
+    component.cast_cap_or_connect = cast_cap_or_connect  # type: ignore[method-assign]
+
+    async def resolve() -> list[tuple[Any, Any]]:
+        return await asyncio.gather(
+            *(component._cast_cap_or_connect_cached(_SturdyRefPointer(ref), None) for ref in ("a", "a", "b", "a"))
+        )
+
+    caps = [cap for cap, _ in asyncio.run(resolve())]
+
+    assert len(connects) == 2
+    assert caps[0] is caps[1] is caps[3]
+    assert caps[2] is not caps[0]
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from zalfmas_fbp.components.models.monica.common import env_template
+from zalfmas_fbp.components.models.monica.common.env_template import EnvTemplate
+
+
+def _env() -> dict[str, Any]:
+    return {
+        "params": {
+            "siteParameters": {"Latitude": 0.0, "SoilProfileParameters": [{"Sand": 0.4}]},
+            "simulationParameters": {"UseAutomaticIrrigation": False},
+        },
+        "cropRotation": [{"worksteps": [{"type": "Sowing", "date": "0000-10-01"}, {"type": "Harvest"}]}],
+        "climateCSV": "",
+    }
+
+
+def test_env_template_render_matches_dumped_merged_env_and_keeps_template_unchanged() -> None:
+    env = _env()
+    template = EnvTemplate(copy.deepcopy(env))
+
+    rendered = template.render(
+        {
+            ("params", "siteParameters", "Latitude"): 52.5,
+            ("cropRotation", 0, "worksteps", 1, "latest-date"): "2020-09-01",
+            ("customId",): {"id": "a"},
+        },
+    )
+
+    expected = copy.deepcopy(env)
+    expected["params"]["siteParameters"]["Latitude"] = 52.5
+    expected["cropRotation"][0]["worksteps"][1]["latest-date"] = "2020-09-01"
+    expected["customId"] = {"id": "a"}
+    assert rendered == json.dumps(expected)
+    assert template.render({}) == json.dumps(env)
+
+
+def test_env_template_rejects_invalid_overlays() -> None:
+    template = EnvTemplate(_env())
+
+    with pytest.raises(IndexError):
+        template.render({("cropRotation", 3, "worksteps"): []})
+    with pytest.raises(KeyError):
+        template.render({("unknown", "key"): 1})
+    with pytest.raises(ValueError, match="nested"):
+        template.render({("params", "siteParameters", "Latitude"): 1, ("params", "siteParameters"): {}})
+
+
+def test_load_env_template_reloads_on_changed_mtime(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        env_template.monica_io,
+        "create_env_json_from_json_config",
+        lambda config: {"crop": config["crop"], "sim": config["sim"]},
+    )
+    sim_path = tmp_path / "sim.json"
+    crop_path = tmp_path / "crop.json"
+    site_path = tmp_path / "site.json"
+    sim_path.write_text(json.dumps({"climate.csv-options": {}, "v": 1}))
+    crop_path.write_text(json.dumps({"cropRotation": ["a", "b", "c"]}))
+    site_path.write_text("{}")
+
+    first = env_template.load_env_template(str(sim_path), str(crop_path), str(site_path), "WW")
+    assert env_template.load_env_template(str(sim_path), str(crop_path), str(site_path), "WW") is first
+    assert first.get(("crop", "cropRotation", 2)) == "WW"
+
+    sim_path.write_text(json.dumps({"climate.csv-options": {}, "v": 2}))
+    mtime_ns = sim_path.stat().st_mtime_ns + 1_000_000_000
+    os.utime(sim_path, ns=(mtime_ns, mtime_ns))
+
+    second = env_template.load_env_template(str(sim_path), str(crop_path), str(site_path), "WW")
+    assert second is not first
+    assert second.get(("sim", "v")) == 2
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+from tests.components.models.monica_results import daily_yield_result
+from zalfmas_fbp.components.models.monica.common.result_writer import PooledResultWriter, result_sections
+
+
+def _rows(path: Path) -> list[list[str]]:
+    with path.open(newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_append_writes_headers_once_and_reopens_evicted_files(tmp_path: Path) -> None:
+    first = tmp_path / "a.csv"
+    second = tmp_path / "b.csv"
+    with PooledResultWriter(append=True, max_open_files=1) as writer:
+        writer.write(first, result_sections(daily_yield_result(1.0)))
+        writer.write(second, result_sections(daily_yield_result(2.0)))
+        writer.write(first, result_sections(daily_yield_result(3.0, 4.0)))
+
+    assert _rows(first) == [
+        ["daily"],
+        ["Date", "Yield"],
+        ["[kg]", "[kg]"],
+        ["2020-01-01", "1.0"],
+        ["2020-01-01", "3.0"],
+        ["2020-01-01", "4.0"],
+    ]
+    assert _rows(second)[3:] == [["2020-01-01", "2.0"]]
+
+
+def test_without_append_a_result_replaces_the_file(tmp_path: Path) -> None:
+    path = tmp_path / "a.csv"
+    with PooledResultWriter() as writer:
+        writer.write(path, result_sections(daily_yield_result(1.0)))
+        writer.write(path, result_sections(daily_yield_result(2.0)))
+
+    assert _rows(path) == [["daily"], ["Date", "Yield"], ["[kg]", "[kg]"], ["2020-01-01", "2.0"], []]
+
+
+def test_parquet_output_keeps_types_and_units(tmp_path: Path) -> None:
+    with PooledResultWriter("parquet", append=True) as writer:
+        writer.write(tmp_path / "a.csv", result_sections(daily_yield_result(1.0)))
+        writer.write(tmp_path / "a.csv", result_sections(daily_yield_result(2.5)))
+
+    table = pq.read_table(tmp_path / "a.parquet")
+    assert table.column("Yield").to_pylist() == [1.0, 2.5]
+    assert table.schema.field("Yield").metadata == {b"unit": b"[kg]"}
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import json
+
+import pyarrow as pa
+from mas.schema.common import common_capnp
+
+from tests.component_harness import done_message, ip_message, run_process_component
+from tests.components.models.monica_results import daily_yield_result
+from zalfmas_fbp.components.models.monica.monica_results_to_arrow import METADATA, Component
+
+
+def _result_ip(row: int, *values: float):
+    result = {**daily_yield_result(*values), "customId": {"row": row}}
+    return ip_message(common_capnp.StructuredText.new_message(type="json", value=json.dumps(result)))
+
+
+def test_results_are_collected_into_one_arrow_table_per_section() -> None:
+    component = Component(METADATA)
+    conf = 'batch_rows = 3\nmetadata_columns = { row = "customId/row" }'
+
+    result = run_process_component(
+        component,
+        inputs={
+            "conf": [
+                ip_message(common_capnp.StructuredText.new_message(type="toml", value=conf)),
+                done_message(),
+            ],
+            "in": [_result_ip(1, 1.0, 2.0), _result_ip(2, 3.0), _result_ip(3, 4.0), done_message()],
+        },
+    )
+
+    # every table is sent as chunked payload, the attributes are attached to the open bracket
+    open_brackets = [ip for ip in result.output().values if ip.type == "openBracket"]
+    blobs = [ip for ip in result.output().values if ip.type == "standard"]
+    tables = [pa.ipc.open_stream(ip.content.as_struct(common_capnp.Blob).data).read_all() for ip in blobs]
+    assert [table.column("row").to_pylist() for table in tables] == [[1, 1, 2], [3]]
+    assert tables[0].column("Yield").to_pylist() == [1.0, 2.0, 3.0]
+    assert {kv.key: kv.value.as_text() for kv in open_brackets[0].attributes} == {"section": "daily"}
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from zalfmas_fbp.components.producers import africa_calibration_producer
+from zalfmas_fbp.components.producers.africa_calibration_producer import EnvTemplates
+
+SETUP = {"start_date": "", "end_date": "", "scenario": "historical", "crop": "maize"}
+CONFIG = {"sim.json": "sim.json", "site.json": "site.json", "crop.json": "crop.json"}
+
+
+def _write_templates(path: Path) -> None:
+    (path / "sim.json").write_text(json.dumps({"climate.csv-options": {}, "include-file-base-path": "data"}))
+    (path / "site.json").write_text(json.dumps({"EnvironmentParameters": {}}))
+    (path / "crop.json").write_text(
+        json.dumps(
+            {"CropParameters": {}, "cropRotation": [{"worksteps": [{"type": "Sowing", "crop": ["ref", "crops", ""]}]}]}
+        )
+    )
+
+
+def _create_env(crop_site_sim: dict[str, Any]) -> dict[str, Any]:
+    crop_params = {"species": {"a": 0}, "cultivar": {"b": 0}}
+    return {
+        "params": {"userCropParameters": crop_site_sim["crop"]["CropParameters"]},
+        "cropRotation": [{"worksteps": [{"type": "Sowing", "crop": {"cropParams": crop_params}}]}],
+    }
+
+
+def _crop_params(env: dict[str, Any]) -> dict[str, Any]:
+    return env["cropRotation"][0]["worksteps"][0]["crop"]["cropParams"]
+
+
+def test_env_template_is_built_once_and_gets_the_params_of_each_round(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _write_templates(tmp_path)
+    created = []
+
+    def create_env(crop_site_sim: dict[str, Any]) -> dict[str, Any]:
+        created.append(crop_site_sim)
+        return _create_env(crop_site_sim)
+
+    monkeypatch.setattr(africa_calibration_producer.monica_io, "create_env_json_from_json_config", create_env)
+    templates = EnvTemplates(tmp_path, SETUP, CONFIG)
+
+    first = templates.env_template({"a": 1, "b": 2})
+    second = templates.env_template({"a": 3})
+
+    assert len(created) == 1
+    assert _crop_params(first) == {"species": {"a": 1}, "cultivar": {"b": 2}}
+    assert _crop_params(second) == {"species": {"a": 3}, "cultivar": {"b": 0}}
+
+    crop_json = tmp_path / "crop.json"
+    mtime_ns = crop_json.stat().st_mtime_ns + 1_000_000_000
+    os.utime(crop_json, ns=(mtime_ns, mtime_ns))
+    templates.env_template({})
+
+    assert len(created) == 2
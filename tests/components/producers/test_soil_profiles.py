@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import numpy as np
+
+from zalfmas_fbp.components.producers.common import soil_profiles
+from zalfmas_fbp.components.producers.common.soil_profiles import LAYERS, SoilProfiles
+
+CONV_FACTORS = {"sand": 0.01, "clay": 0.01, "corg": 0.01, "bd": 10.0}
+
+
+def _soil_vars() -> dict[str, np.ma.MaskedArray]:
+    rng = np.random.default_rng(42)
+    soil_vars = {}
+    for elem in CONV_FACTORS:
+        data = rng.integers(1, 100, size=(8, 6, 5)).astype(np.float64)
+        mask = np.zeros(data.shape, dtype=bool)
+        # shallow soils: cells masked from a random layer downwards
+        depth = rng.integers(3, 9, size=(6, 5))
+        mask[np.arange(8)[:, None, None] >= depth[None]] = True
+        soil_vars[elem] = np.ma.MaskedArray(data, mask=mask)
+    return soil_vars
+
+
+def _profile_cell_by_cell(soil_vars, row: int, col: int):
+    layer_depth = 8
+    for var in soil_vars.values():
+        for i in range(8):
+            if np.ma.is_masked(var[i, row, col]):
+                layer_depth = min(layer_depth, i)
+                break
+    layer_depth -= 1
+    if layer_depth < 4:
+        return None
+    return [
+        {
+            "Thickness": [monica_depth_m, "m"],
+            "SoilOrganicCarbon": [soil_vars["corg"][i, row, col] * CONV_FACTORS["corg"], "%"],
+            "SoilBulkDensity": [soil_vars["bd"][i, row, col] * CONV_FACTORS["bd"], "kg m-3"],
+            "Sand": [soil_vars["sand"][i, row, col] * CONV_FACTORS["sand"], "fraction"],
+            "Clay": [soil_vars["clay"][i, row, col] * CONV_FACTORS["clay"], "fraction"],
+        }
+        for i, _, monica_depth_m in LAYERS
+        if i <= layer_depth
+    ]
+
+
+def test_window_reads_match_cell_by_cell_profiles(monkeypatch) -> None:
+    monkeypatch.setattr(soil_profiles, "MAX_WINDOW_CELLS", 8)
+    soil_vars = _soil_vars()
+    cells = [(row, col) for row in range(6) for col in range(5)][::-1]
+
+    profiles = SoilProfiles(soil_vars, CONV_FACTORS).profiles(cells)
+
+    assert list(profiles) == cells
+    for row, col in cells:
+        assert profiles[row, col] == _profile_cell_by_cell(soil_vars, row, col)
+    assert any(profile is None for profile in profiles.values())
+    assert any(profile is not None for profile in profiles.values())
+
+
+def test_profiles_are_cached_by_cell() -> None:
+    reads = []
+
+    class _Var:
+        def __init__(self, data):
+            self.data = data
+
+        def __getitem__(self, key):
+            reads.append(key)
+            return self.data[key]
+
+    profiles = SoilProfiles({elem: _Var(var) for elem, var in _soil_vars().items()}, CONV_FACTORS)
+    profiles.profiles([(1, 1), (4, 3)])
+    profiles.profile(4, 3)
+
+    assert len(reads) == len(CONV_FACTORS)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+
+import capnp
+from mas.schema.soil import soil_capnp
+
+from zalfmas_fbp.components.soil.common.profiles import CachedProfile, SoilProfileFetcher
+
+
+class _Result:
+    def __init__(self, profiles):
+        self.profiles = profiles
+
+
+class _Service:
+    """Returns a profile located at the requested coordinate (none for negative lats) after a short delay."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def closestProfilesAt(self, coord, query):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if coord["lat"] < 0:
+            return _Result([])
+        data = soil_capnp.ProfileData.new_message(percentageOfArea=coord["lat"])
+        return _Result(
+            [soil_capnp.Profile._new_client(CachedProfile(data.to_bytes_packed(), coord["lat"], coord["lon"]))]
+        )
+
+
+def _run(coro):
+    return asyncio.run(capnp.run(coro))
+
+
+def test_fetcher_shares_requests_per_cell_and_bounds_concurrency() -> None:
+    service = _Service()
+    fetcher = SoilProfileFetcher(service, {"mandatory": ["soilType"]}, max_concurrent=2, cell_size=0.5)
+
+    async def run():
+        profiles = await fetcher.fetch([(1.1, 1.1), (1.2, 1.3), (2.1, 2.1), (3.1, 3.1), (-1.0, 0.0)])
+        again = await fetcher.fetch([(2.4, 2.4)])
+        return [None if p is None else (await p.geoLocation()).lat for p in profiles + again]
+
+    assert _run(run()) == [1.1, 1.1, 2.1, 3.1, None, 2.1]
+    assert service.requests == 4
+    assert service.max_in_flight == 2
+    assert (fetcher.hits, fetcher.misses) == (2, 4)
+
+
+def test_fetcher_reuses_persisted_profiles(tmp_path) -> None:
+    cache_path = tmp_path / "soil.sqlite"
+    first_service = _Service()
+    second_service = _Service()
+
+    async def fetch(service):
+        fetcher = SoilProfileFetcher(service, {"mandatory": ["soilType"]}, cache_path=cache_path)
+        try:
+            (profile,) = await fetcher.fetch([(1.5, 2.5)])
+            return (await profile.data()).percentageOfArea, (await profile.geoLocation()).lon
+        finally:
+            fetcher.close()
+
+    assert _run(fetch(first_service)) == (1.5, 2.5)
+    assert _run(fetch(second_service)) == (1.5, 2.5)
+    assert (first_service.requests, second_service.requests) == (1, 0)
+
+
+class _FailingService(_Service):
+    async def closestProfilesAt(self, coord, query):
+        if coord["lat"] > 10:
+            msg = "service failed"
+            raise RuntimeError(msg)
+        return await super().closestProfilesAt(coord, query)
+
+
+def test_fetcher_keys_cells_from_origin_and_survives_failing_requests() -> None:
+    service = _FailingService()
+    fetcher = SoilProfileFetcher(service, {"mandatory": ["soilType"]}, cell_size=0.5, cell_origin=(0.25, 0.25))
+
+    async def run():
+        profiles = await fetcher.fetch([(1.2, 1.2), (1.3, 1.3), (11.0, 11.0)])
+        return [None if p is None else (await p.geoLocation()).lat for p in profiles]
+
+    # 1.2 and 1.3 are in different cells of a raster with cells starting at .25/.75
+    assert _run(run()) == [1.2, 1.3, None]
+    assert fetcher.key(1.2, 1.2) != fetcher.key(1.3, 1.3)
+
+
+def test_cached_profile_has_info_but_cant_be_saved() -> None:
+    data = soil_capnp.ProfileData.new_message(percentageOfArea=50)
+
+    async def run():
+        profile = soil_capnp.Profile._new_client(CachedProfile(data.to_bytes_packed(), 1.0, 2.0, id="cell-1"))
+        info = await profile.info()
+        try:
+            await profile.save()
+        except capnp.KjException as e:
+            return info.id, e.description
+        return info.id, None
+
+    info_id, error = _run(run())
+    assert info_id == "cell-1"
+    assert error is not None
+    assert "can't be saved" in error
+    assert "NotImplementedError" not in error
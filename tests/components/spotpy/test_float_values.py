@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import numpy as np
+from mas.schema.common import common_capnp
+from mas.schema.fbp import fbp_capnp
+
+from zalfmas_fbp.components.spotpy.common.float_values import (
+    float64_blob_ip,
+    ip_to_numpy,
+    replace_sentinels,
+    sentinels_from_attributes,
+)
+
+
+def test_lf64_ip_is_converted_with_sentinels_from_attributes() -> None:
+    ip = fbp_capnp.IP.new_message(
+        content=common_capnp.Value.new_message(lf64=[1.0, -9999.0, 2.5, -8888.0]),
+        attributes=[
+            {"key": "nan_sentinel", "value": common_capnp.Value.new_message(f64=-9999.0)},
+            {"key": "null_sentinel", "value": common_capnp.Value.new_message(f64=-8888.0)},
+            {"key": "param_set_id", "value": "x"},
+        ],
+    )
+
+    values = ip_to_numpy(ip, sentinels=sentinels_from_attributes(ip.attributes))
+
+    np.testing.assert_array_equal(values, [1.0, np.nan, 2.5, np.nan])
+
+
+def test_float64_blob_round_trips() -> None:
+    ip = float64_blob_ip([0.5, 1e300, -1.0])
+
+    values = ip_to_numpy(ip, sentinels=[-1.0])
+
+    np.testing.assert_array_equal(values, [0.5, 1e300, np.nan])
+    assert values.flags.writeable
+
+
+def test_replace_sentinels_without_sentinels_keeps_array() -> None:
+    values = np.array([1.0, 2.0])
+
+    assert replace_sentinels(values, []) is values
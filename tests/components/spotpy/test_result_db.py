@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+import spotpy
+
+from zalfmas_fbp.components.spotpy.common.result_db import BufferedResultDb, install_result_db, load_results
+
+
+class _Setup:
+    def parameters(self):
+        return spotpy.parameter.generate([spotpy.parameter.Uniform("x", 0, 1), spotpy.parameter.Uniform("y", 0, 1)])
+
+    def simulation(self, vector):
+        return [vector.x, vector.x + vector.y, 2.0]
+
+    def evaluation(self):
+        return [0.5, 1.0, 2.0]
+
+    def objectivefunction(self, simulation, evaluation):
+        return spotpy.objectivefunctions.rmse(evaluation, simulation)
+
+
+@pytest.mark.parametrize("db_format", ["parquet", "memmap"])
+def test_sampler_results_are_written_in_blocks(tmp_path, db_format: str) -> None:
+    dbname = tmp_path / "results"
+    sampler = spotpy.algorithms.mc(_Setup(), dbname=str(dbname), dbformat="csv", random_state=1)
+    result_db = BufferedResultDb(dbname, sampler.parnames, db_format=db_format, block_rows=4)
+    install_result_db(sampler, result_db)
+
+    sampler.sample(10)
+    results = load_results(dbname, db_format)
+
+    assert results.dtype.names == ("like1", "parx", "pary", "simulation_0", "simulation_1", "simulation_2", "chain")
+    assert len(results) == 10
+    np.testing.assert_allclose(results["simulation_1"], results["parx"] + results["pary"], rtol=1e-6)
+    assert np.all(results["simulation_2"] == 2.0)
+    assert not (tmp_path / "results.csv").exists()
+
+
+def test_getdata_includes_buffered_rows(tmp_path) -> None:
+    result_db = BufferedResultDb(tmp_path / "results", ["a"], db_format="memmap", block_rows=100, save_sim=False)
+    for i in range(3):
+        result_db.save([float(i), -float(i)], [i * 10], [1.0, 2.0], chains=0)
+
+    data = result_db.getdata()
+
+    assert data.dtype.names == ("like1", "like2", "para", "chain")
+    assert data["para"].tolist() == [0.0, 10.0, 20.0]
+    result_db.finalize()
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import numpy as np
+
+from zalfmas_fbp.components.spotpy.common.sim_cache import SimulationCache, context_hash
+from zalfmas_fbp.components.spotpy.spotpy_comp import SpotPySetup
+
+
+def test_memory_tier_evicts_least_recently_used() -> None:
+    cache = SimulationCache(maxsize=2, decimals=3)
+    cache.put([1.0, 2.0], np.array([1.0]))
+    cache.put([3.0, 4.0], np.array([2.0]))
+    assert cache.get([1.0001, 2.0]) is not None
+
+    cache.put([5.0, 6.0], np.array([3.0]))
+
+    assert cache.get([3.0, 4.0]) is None
+    assert cache.get([1.0, 2.0]).tolist() == [1.0]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_persistent_tier_is_reused_by_context(tmp_path) -> None:
+    path = tmp_path / "sims.sqlite"
+    cache = SimulationCache(maxsize=0, path=path, context=context_hash("obs", b"\x01"))
+    cache.put([0.5], np.array([1.0, np.nan]))
+    cache.close()
+
+    resumed = SimulationCache(path=path, context=context_hash("obs", b"\x01"))
+    other = SimulationCache(path=path, context=context_hash("obs", b"\x02"))
+
+    np.testing.assert_array_equal(resumed.get([0.5]), [1.0, np.nan])
+    assert other.get([0.5]) is None
+
+
+def test_setup_returns_cached_values_without_simulating() -> None:
+    cache = SimulationCache()
+    cache.put([1.0, 2.0], np.array([3.0]))
+    setup = SpotPySetup([], [0.0], None, None, None, sim_cache=cache)
+
+    assert setup.simulation([1.0, 2.0]).tolist() == [3.0]
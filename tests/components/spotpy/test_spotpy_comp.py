@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import namedtuple
+
+import numpy as np
+import pytest
+from mas.schema.common import common_capnp
+from mas.schema.fbp import fbp_capnp
+
+from tests.component_harness import PortMessage, PortValue
+from zalfmas_fbp.components.spotpy.spotpy_comp import InFlightForEach, SpotPySetup
+
+
+class _Vector(list):
+    name = ("a", "b")
+
+
+class _ReversingModel:
+    """Replies to `batch` parameter sets at a time in reverse order, with sum(params) as simulated value."""
+
+    def __init__(self, batch: int):
+        self.batch = batch
+        self.received: list = []
+        self.replies: asyncio.Queue = asyncio.Queue()
+
+    async def write(self, value) -> None:
+        self.received.append(value)
+        if len(self.received) % self.batch == 0:
+            for ip in reversed(self.received[-self.batch :]):
+                params = ip.content.as_struct(common_capnp.Value).lpair
+                out_ip = fbp_capnp.IP.new_message(
+                    content=common_capnp.Value.new_message(
+                        lf64=[sum(p.snd.as_struct(common_capnp.Value).f64 for p in params)]
+                    ),
+                    attributes=[{"key": attr.key, "value": attr.value.as_text()} for attr in ip.attributes],
+                )
+                await self.replies.put(PortMessage(PortValue(out_ip)))
+
+    async def read(self) -> PortMessage:
+        return await self.replies.get()
+
+
+def test_parallel_simulations_are_matched_by_sim_id() -> None:
+    async def run() -> list:
+        model = _ReversingModel(batch=4)
+        setup = SpotPySetup([], [0.0], model, model, asyncio.get_running_loop(), sim_id_attr="sim_id")
+        vectors = [_Vector([float(i), 10.0 * i]) for i in range(4)]
+        return await asyncio.gather(*(asyncio.to_thread(setup.simulation, v) for v in vectors))
+
+    results = asyncio.run(run())
+
+    assert [r.tolist() for r in results] == [[0.0], [11.0], [22.0], [33.0]]
+
+
+class _Sampler:
+    def __init__(self):
+        self.all_params = np.array([0.0, 5.0])
+        self.non_constant_positions = np.array([0])
+        self.partype = namedtuple("Params", ["a", "b"])
+        self.setup = self
+
+    def simulation(self, vector):
+        time.sleep(0.05 if vector.a == 0 else 0.0)
+        return [vector.a + vector.b]
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_in_flight_for_each_runs_jobs_concurrently(ordered: bool) -> None:
+    repeat = InFlightForEach(_Sampler(), max_in_flight=3, ordered=ordered)
+
+    results = list(repeat((i, np.array([float(i)])) for i in range(5)))
+    repeat.terminate()
+
+    assert sorted((id, sim) for id, _, sim in results) == [(i, [i + 5.0]) for i in range(5)]
+    assert (results[0][0] == 0) is ordered
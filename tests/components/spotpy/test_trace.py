@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import numpy as np
+import spotpy
+
+from tests.component_harness import done_message, ip_message, run_process_component, text_outputs
+from zalfmas_fbp.components.spotpy.common.trace import TraceWriter, install_trace, read_trace, write_trace
+from zalfmas_fbp.components.spotpy.plot_calibration_trace import Component
+
+
+def _results() -> np.ndarray:
+    return np.rec.fromarrays(
+        [np.array([3.0, 2.0, 1.0]), np.array([0.1, 0.2, 0.3]), np.array([5.0, 6.0, 7.0]), np.zeros(3)],
+        names=["like1", "parx", "simulation_0", "chain"],
+    ).view(np.ndarray)
+
+
+def test_trace_keeps_objective_function_and_parameter_columns(tmp_path) -> None:
+    path = write_trace(_results(), tmp_path / "out" / "trace.parquet")
+
+    trace = read_trace(path)
+
+    assert trace.column_names == ["like1", "parx", "chain"]
+    assert trace.column("like1").to_pylist() == [3.0, 2.0, 1.0]
+
+
+def test_plot_component_renders_png_next_to_trace(tmp_path) -> None:
+    trace_path = write_trace(_results(), tmp_path / "trace.parquet")
+
+    result = run_process_component(Component(), inputs={"trace": [ip_message(str(trace_path)), done_message()]})
+
+    assert text_outputs(result.output()) == [str(tmp_path / "trace.png")]
+    assert (tmp_path / "trace.png").read_bytes().startswith(b"\x89PNG")
+
+
+def test_calibration_component_does_not_import_matplotlib() -> None:
+    code = "import sys, zalfmas_fbp.components.spotpy.spotpy_comp; print('matplotlib' in sys.modules)"
+
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout == "False\n"
+
+
+class _Setup:
+    def parameters(self):
+        return spotpy.parameter.generate([spotpy.parameter.Uniform("x", 0, 1)])
+
+    def simulation(self, vector):
+        return [vector.x]
+
+    def evaluation(self):
+        return [0.5]
+
+    def objectivefunction(self, simulation, evaluation):
+        return spotpy.objectivefunctions.rmse(evaluation, simulation)
+
+
+def test_trace_is_written_while_sampling(tmp_path) -> None:
+    trace_path = tmp_path / "out" / "trace.parquet"
+    sampler = spotpy.algorithms.mc(_Setup(), dbname=str(tmp_path / "results"), dbformat="ram", random_state=1)
+    trace_writer = TraceWriter(trace_path, sampler.parnames, block_rows=4)
+    install_trace(sampler, trace_writer)
+    rows_during_sampling = []
+    save = trace_writer.save
+
+    def save_and_read(*args, **kwargs):
+        save(*args, **kwargs)
+        rows_during_sampling.append(read_trace(trace_path).num_rows if trace_path.exists() else 0)
+
+    trace_writer.save = save_and_read
+
+    sampler.sample(10)
+    trace = read_trace(trace_writer.close())
+
+    assert rows_during_sampling == [0, 0, 0, 4, 4, 4, 4, 8, 8, 8]
+    assert trace.column_names == ["like1", "parx", "chain"]
+    assert trace.num_rows == 10
+    np.testing.assert_allclose(trace.column("like1").to_numpy(), np.abs(trace.column("parx").to_numpy() - 0.5))
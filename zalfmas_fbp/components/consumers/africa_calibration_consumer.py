@@ -15,7 +15,6 @@
 
 import json
 import logging
-from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
 from typing import Any
@@ -24,10 +23,13 @@ from mas.schema.fbp import fbp_capnp
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+from zalfmas_fbp.components.consumers.common.yield_aggregator import YieldAggregator, extract_yields
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
 
+OUT_FILE_BUFFER_SIZE = 1 << 20
+
 METADATA = meta.Component(
     category=meta.Category(
         id="consumers",
@@ -70,69 +72,56 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
             path_to_out_dir.mkdir(parents=True)
         except OSError:
             logger.exception("run-calibration-consumer.py: Couldn't create dir: %s !", config["path_to_out"])
-    with path_to_out_file.open("a") as _:
-        _.write(f"config: {config}\n")
+    # kept open for the whole run and flushed after each round
+    with path_to_out_file.open("a", buffering=OUT_FILE_BUFFER_SIZE) as out_file:
+        out_file.write(f"config: {config}\n")
+
+        aggregator = YieldAggregator()
+
+        envs_received = 0
+        no_of_envs_expected = None
+        while pc.in_ports["result"] and pc.out_ports["year_to_yield"]:
+            try:
+                msg = await pc.in_ports["result"].read()
+                if msg.which() == "done":
+                    pc.in_ports["result"] = None
+                    continue
 
-    country_id_to_year_to_yields = defaultdict(lambda: defaultdict(list))
+                result_ip = msg.value.as_struct(fbp_capnp.IP)
+                custom_id, years, yields = extract_yields(result_ip.content.as_text())
 
-    envs_received = 0
-    no_of_envs_expected = None
-    close_out_port = False
-    while pc.in_ports["result"] and pc.out_ports["year_to_yield"]:
-        try:
-            msg = await pc.in_ports["result"].read()
-            if msg.which() == "done":
-                close_out_port = True
-                continue
-
-            result_ip = msg.value.as_struct(fbp_capnp.IP)
-            monica_result = json.loads(result_ip.content.as_text())
-
-            custom_id = monica_result["customId"]
-            if "no_of_sent_envs" in custom_id:
-                no_of_envs_expected = custom_id["no_of_sent_envs"]
-            else:
-                envs_received += 1
-
-                out_str = f"{Path(__file__).name}: received result customId: {custom_id}\n"
-                logger.info("%s", out_str.rstrip())
-                with path_to_out_file.open("a") as _:
-                    _.write(out_str)
-
-                country_id = custom_id["country_id"]
-
-                for data in monica_result.get("data", []):
-                    results = data.get("results", [])
-                    for vals in results:
-                        if "Year" in vals:
-                            country_id_to_year_to_yields[country_id][int(vals["Year"])].append(vals["Yield"])
-
-            if no_of_envs_expected == envs_received:
-                out_str = f"{Path(__file__).name}: {datetime.now()} last expected env received\n"
-                logger.info("%s", out_str.rstrip())
-                with path_to_out_file.open("a") as _:
-                    _.write(out_str)
-
-                country_id_and_year_to_avg_yield = {}
-                for country_id, rest in country_id_to_year_to_yields.items():
-                    for year, yields in rest.items():
-                        no_of_yields = len(yields)
-                        if no_of_yields > 0:
-                            country_id_and_year_to_avg_yield[f"{country_id}|{year}"] = sum(yields) / no_of_yields
-
-                out_ip = fbp_capnp.IP.new_message(content=json.dumps(country_id_and_year_to_avg_yield))
-                await pc.out_ports["year_to_yield"].write(value=out_ip)
-
-                # reset and wait for next round
-                country_id_to_year_to_yields.clear()
-                no_of_envs_expected = None
-                envs_received = 0
-
-                if close_out_port:
-                    pc.in_ports["result"] = None
+                if "no_of_sent_envs" in custom_id:
+                    no_of_envs_expected = custom_id["no_of_sent_envs"]
+                else:
+                    envs_received += 1
+
+                    out_str = f"{Path(__file__).name}: received result customId: {custom_id}\n"
+                    logger.info("%s", out_str.rstrip())
+                    out_file.write(out_str)
+
+                    aggregator.add(custom_id["country_id"], years, yields)
+
+                if no_of_envs_expected == envs_received:
+                    out_str = f"{Path(__file__).name}: {datetime.now()} last expected env received\n"
+                    logger.info("%s", out_str.rstrip())
+                    out_file.write(out_str)
+                    out_file.flush()
+
+                    out_ip = fbp_capnp.IP.new_message(content=json.dumps(aggregator.averages()))
+                    await pc.out_ports["year_to_yield"].write(value=out_ip)
+
+                    # reset and wait for next round
+                    aggregator.clear()
+                    no_of_envs_expected = None
+                    envs_received = 0
+
+            except Exception:
+                logger.exception("%s Exception", Path(__file__).name)
 
-        except Exception:
-            logger.exception("%s Exception", Path(__file__).name)
+        if envs_received > 0:
+            logger.warning(
+                "%s: input closed after %d results of an incomplete round", Path(__file__).name, envs_received
+            )
 
     await pc.close_out_ports()
     logger.info("%s: process finished", Path(__file__).name)
@@ -0,0 +1,118 @@
+"""Incremental averaging of MONICA yields per country and year.
+
+Only the customId and the Year/Yield values of a MONICA result are extracted. With msgspec installed
+they are decoded directly into typed structs, skipping everything else in the result; otherwise the
+result is parsed with the JSON codec. The yields are summed up in numpy arrays indexed by year per country.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+from zalfmas_fbp.components.json.common import codec
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+type Extracted = tuple[dict[str, Any], np.ndarray, np.ndarray]
+"""customId, years and yields of a MONICA result."""
+
+
+def _extract_from_dict(monica_result: dict[str, Any]) -> Extracted:
+    years: list[int] = []
+    yields: list[float] = []
+    for data in monica_result.get("data", []):
+        for vals in data.get("results", []):
+            if "Year" in vals:
+                years.append(int(vals["Year"]))
+                yields.append(vals["Yield"])
+    return monica_result["customId"], np.array(years, dtype=np.int64), np.array(yields, dtype=np.float64)
+
+
+if msgspec is not None:
+
+    class _Vals(msgspec.Struct):
+        Year: int | None = None
+        Yield: float | None = None
+
+    class _Data(msgspec.Struct):
+        results: list[_Vals] = msgspec.field(default_factory=list)
+
+    class _Result(msgspec.Struct):
+        customId: dict[str, Any]
+        data: list[_Data] = msgspec.field(default_factory=list)
+
+    _decode_result = msgspec.json.Decoder(_Result).decode
+
+    def extract_yields(text: str | bytes) -> Extracted:
+        """Extract the customId, years and yields from a JSON serialized MONICA result."""
+        try:
+            result = _decode_result(text)
+        except msgspec.ValidationError:
+            return _extract_from_dict(codec.loads(text))
+        vals = [v for data in result.data for v in data.results if v.Year is not None]
+        return (
+            result.customId,
+            np.fromiter((v.Year for v in vals), dtype=np.int64, count=len(vals)),
+            np.fromiter((v.Yield for v in vals), dtype=np.float64, count=len(vals)),
+        )
+
+else:
+
+    def extract_yields(text: str | bytes) -> Extracted:
+        """Extract the customId, years and yields from a JSON serialized MONICA result."""
+        return _extract_from_dict(codec.loads(text))
+
+
+class YieldAggregator:
+    """Sums and counts of yields per country, in arrays indexed by year - first_year."""
+
+    def __init__(self):
+        self._first_years: dict[Any, int] = {}
+        self._sums: dict[Any, np.ndarray] = {}
+        self._counts: dict[Any, np.ndarray] = {}
+
+    def add(self, country_id: Any, years: np.ndarray, yields: np.ndarray) -> None:
+        if len(years) == 0:
+            return
+        first_year = min(int(years.min()), self._first_years.get(country_id, int(years.min())))
+        last_year = int(years.max())
+        if country_id in self._sums:
+            self._grow(country_id, first_year, last_year)
+        else:
+            self._first_years[country_id] = first_year
+            self._sums[country_id] = np.zeros(last_year - first_year + 1)
+            self._counts[country_id] = np.zeros(last_year - first_year + 1, dtype=np.int64)
+        idx = years - first_year
+        np.add.at(self._sums[country_id], idx, yields)
+        np.add.at(self._counts[country_id], idx, 1)
+
+    def _grow(self, country_id: Any, first_year: int, last_year: int) -> None:
+        old_first_year = self._first_years[country_id]
+        sums = self._sums[country_id]
+        before = old_first_year - first_year
+        after = max(0, last_year - (old_first_year + len(sums) - 1))
+        if before > 0 or after > 0:
+            self._first_years[country_id] = first_year
+            self._sums[country_id] = np.pad(sums, (before, after))
+            self._counts[country_id] = np.pad(self._counts[country_id], (before, after))
+
+    def averages(self) -> dict[str, float]:
+        """The average yields keyed by 'country_id|year', for all years with yields."""
+        avgs: dict[str, float] = {}
+        for country_id, sums in self._sums.items():
+            counts = self._counts[country_id]
+            (idx,) = np.nonzero(counts)
+            first_year = self._first_years[country_id]
+            for i, avg in zip(idx.tolist(), (sums[idx] / counts[idx]).tolist(), strict=True):
+                avgs[f"{country_id}|{first_year + i}"] = avg
+        return avgs
+
+    def clear(self) -> None:
+        self._first_years.clear()
+        self._sums.clear()
+        self._counts.clear()
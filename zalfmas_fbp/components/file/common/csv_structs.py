@@ -0,0 +1,153 @@
+"""Streaming CSV rows into Cap'n Proto structs.
+
+The dialect is sniffed from a prefix of the file only. The file is then parsed by pyarrow in record
+batches of string columns, so memory stays bounded, and every column of a batch is converted to the
+type of its struct field at once.
+"""
+
+from __future__ import annotations
+
+import csv
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+SNIFF_BYTES = 1 << 16
+BLOCK_SIZE = 1 << 20
+
+INT_TYPES = {
+    "int8": pa.int64(),
+    "int16": pa.int64(),
+    "int32": pa.int64(),
+    "int64": pa.int64(),
+    "uint8": pa.uint64(),
+    "uint16": pa.uint64(),
+    "uint32": pa.uint64(),
+    "uint64": pa.uint64(),
+}
+
+
+def sniff_dialect(path: str | Path, sniff_bytes: int = SNIFF_BYTES) -> tuple[type[csv.Dialect], list[str]]:
+    """The dialect and the header columns of the CSV file, determined from its first sniff_bytes."""
+    with Path(path).open(newline="") as _:
+        prefix = _.read(sniff_bytes)
+        if len(prefix) == sniff_bytes and "\n" in prefix:
+            # don't sniff a partial last line
+            prefix = prefix[: prefix.rindex("\n") + 1]
+    dialect = csv.Sniffer().sniff(prefix, delimiters=";,\t")
+    header = next(csv.reader(prefix.splitlines(), dialect))
+    return dialect, header
+
+
+def read_batches(
+    path: str | Path,
+    dialect: type[csv.Dialect],
+    header: list[str],
+    columns: list[str],
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[pa.RecordBatch]:
+    """Stream the columns of the CSV file (without the header line) as record batches of strings."""
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=block_size, skip_rows=1, column_names=header),
+        parse_options=pa_csv.ParseOptions(
+            delimiter=dialect.delimiter,
+            quote_char=dialect.quotechar or False,
+            double_quote=dialect.doublequote,
+            escape_char=dialect.escapechar or False,
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=dict.fromkeys(columns, pa.string()),
+            include_columns=columns,
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    yield from reader
+
+
+def _convert_each(values: list[str], convert: Any) -> list[Any]:
+    out = []
+    for value in values:
+        try:
+            out.append(convert(value))
+        except ValueError:
+            out.append(None)
+    return out
+
+
+def convert_column(array: pa.Array, fld_type: str, enumerants: Any = None) -> list[Any]:
+    """Convert a string column to the values of a struct field of fld_type, None where a value is invalid."""
+    if fld_type == "bool":
+        return pc.equal(pc.utf8_lower(array), "true").to_pylist()
+    if fld_type == "text":
+        return array.to_pylist()
+    if fld_type in ("float32", "float64") or fld_type in INT_TYPES:
+        try:
+            return pc.cast(
+                array, pa.float64() if fld_type in ("float32", "float64") else INT_TYPES[fld_type]
+            ).to_pylist()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            # at least one value arrow can't parse, fall back to Python's more lenient parsing per value
+            return _convert_each(array.to_pylist(), float if fld_type in ("float32", "float64") else int)
+    if fld_type == "enum":
+        return [value if value in enumerants else None for value in array.to_pylist()]
+    return [None] * len(array)
+
+
+class CsvStructs:
+    """Maps the columns of a CSV file to the fields of a Cap'n Proto struct type."""
+
+    def __init__(self, struct_type: Any, header: list[str], col_to_field_names: dict[str, str]):
+        self.struct_type = struct_type
+        fieldnames = struct_type.schema.fieldnames
+        self.fields = struct_type.schema.fields
+        # csv column -> struct field, for the columns which are struct fields
+        self.columns = {
+            col: col_to_field_names.get(col, col) for col in header if col_to_field_names.get(col, col) in fieldnames
+        }
+        self._defaults = struct_type.new_message()
+
+    def field_values(self, batch: pa.RecordBatch) -> dict[str, list[Any]]:
+        """The converted values of the struct fields in the batch, None where a value is invalid."""
+        values = {}
+        for col, field in self.columns.items():
+            fld_type = self.fields[field].proto.slot.type.which()
+            enumerants = self.fields[field].schema.enumerants if fld_type == "enum" else None
+            values[field] = convert_column(batch.column(col), fld_type, enumerants)
+        return values
+
+    def values_or_default(self, field: str, values: list[Any]) -> list[Any]:
+        """The values as the struct would hold them, so invalid values become the field's default."""
+        default = getattr(self._defaults, field)
+        return [default if value is None else value for value in values]
+
+    def new_structs(self, field_values: dict[str, list[Any]], rows: list[int]) -> list[Any]:
+        structs = []
+        for i in rows:
+            structs.append(
+                self.struct_type.new_message(
+                    **{field: values[i] for field, values in field_values.items() if values[i] is not None}
+                )
+            )
+        return structs
+
+    def arrow_batch(self, field_values: dict[str, list[Any]], rows: list[int]) -> pa.RecordBatch:
+        """The selected rows as typed record batch, with nulls for invalid values."""
+        arrays = {}
+        for field, values in field_values.items():
+            fld_type = self.fields[field].proto.slot.type.which()
+            selected = [values[i] for i in rows]
+            if fld_type == "bool":
+                arrays[field] = pa.array(selected, pa.bool_())
+            elif fld_type in ("float32", "float64"):
+                arrays[field] = pa.array(selected, pa.float64())
+            elif fld_type in INT_TYPES:
+                arrays[field] = pa.array(selected, INT_TYPES[fld_type])
+            else:
+                arrays[field] = pa.array(selected, pa.string())
+        return pa.RecordBatch.from_pydict(arrays)
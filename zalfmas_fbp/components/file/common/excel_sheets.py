@@ -0,0 +1,83 @@
+"""Converting Excel sheets in bulk.
+
+The workbook is opened once and parsed sheet by sheet, with the calamine engine if python-calamine is
+installed. Every column of a sheet is converted at once, to JSON compatible records or to an Arrow table.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+from typing import Any, Literal
+
+import pandas
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+type Kind = Literal["date", "int", "float", "str"]
+
+
+def resolve_engine(engine: str) -> str | None:
+    """The pandas Excel engine to use, 'auto' prefers calamine and otherwise leaves the choice to pandas."""
+    if engine != "auto":
+        return engine
+    return "calamine" if importlib.util.find_spec("python_calamine") is not None else None
+
+
+def column_kind(series: pandas.Series) -> Kind:
+    dt = str(series.dtype)
+    if dt.startswith("datetime"):
+        return "date"
+    if dt.startswith("int"):
+        return "int"
+    if dt.startswith("float"):
+        return "float"
+    return "str"
+
+
+def convert_column(series: pandas.Series, kind: Kind) -> list[Any]:
+    """The values of the column as Python objects of kind, None for missing values."""
+    if kind == "int":
+        return series.tolist()
+    missing = series.isna()
+    if kind == "date":
+        values = series.dt.strftime("%Y-%m-%d")
+    elif kind == "float":
+        values = series
+    else:
+        values = series.map(str, na_action="ignore")
+    return values.astype(object).where(~missing, None).tolist()
+
+
+def sheet_columns(df: pandas.DataFrame, key_cols: list[str]) -> dict[str, list[Any]]:
+    """The converted columns of the sheet, key columns as text."""
+    return {
+        c: df[c].map(str).tolist() if c in key_cols else convert_column(df[c], column_kind(df[c])) for c in df.columns
+    }
+
+
+def sheet_records(df: pandas.DataFrame, key_cols: list[str]) -> list[dict[str, Any]]:
+    """The rows of the sheet as JSON compatible dicts."""
+    return pandas.DataFrame(sheet_columns(df, key_cols), columns=df.columns, dtype=object).to_dict(orient="records")
+
+
+def sheet_table(df: pandas.DataFrame) -> pa.Table:
+    """The sheet as Arrow table, text and mixed columns as strings."""
+    arrays = {}
+    for c in df.columns:
+        kind = column_kind(df[c])
+        if kind == "str":
+            arrays[str(c)] = pa.array(convert_column(df[c], kind), pa.string())
+        else:
+            arrays[str(c)] = pa.Array.from_pandas(df[c])
+    return pa.table(arrays)
+
+
+def table_bytes(table: pa.Table, output: Literal["arrow_ipc", "parquet"]) -> bytes:
+    sink = io.BytesIO()
+    if output == "parquet":
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue()
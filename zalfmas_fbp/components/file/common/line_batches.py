@@ -0,0 +1,52 @@
+"""Reading text files as batches of lines."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import TextIO
+
+# size hint for the lines read from the file at once
+READ_HINT = 1 << 20
+
+
+def _utf8_len(line: str) -> int:
+    return len(line) if line.isascii() else len(line.encode())
+
+
+def iter_line_batches(
+    file: TextIO,
+    batch_lines: int = 0,
+    batch_bytes: int = 0,
+    skip_lines: int = 0,
+) -> Iterator[list[str]]:
+    """Yield the lines of file (with line endings) in batches.
+
+    A batch ends when it has batch_lines lines or at least batch_bytes UTF-8 encoded bytes,
+    whichever comes first (0 means no limit). The first skip_lines lines are skipped.
+    """
+    batch: list[str] = []
+    size = 0
+    while lines := file.readlines(READ_HINT):
+        if skip_lines > 0:
+            skipped = min(skip_lines, len(lines))
+            skip_lines -= skipped
+            lines = lines[skipped:]
+        if batch_bytes <= 0 and batch_lines > 0:
+            # only the number of lines counts, slice instead of adding line by line
+            while lines:
+                take = batch_lines - len(batch)
+                batch.extend(lines[:take])
+                lines = lines[take:]
+                if len(batch) == batch_lines:
+                    yield batch
+                    batch = []
+            continue
+        for line in lines:
+            batch.append(line)
+            size += _utf8_len(line)
+            if len(batch) == batch_lines or (batch_bytes > 0 and size >= batch_bytes):
+                yield batch
+                batch = []
+                size = 0
+    if batch:
+        yield batch
@@ -13,21 +13,32 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-import csv
 import logging
 from pathlib import Path
 from typing import Any
 
 import capnp
+import pyarrow as pa
+from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
 from zalfmas_common import common
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.file.common.csv_structs import (
+    BLOCK_SIZE,
+    SNIFF_BYTES,
+    CsvStructs,
+    read_batches,
+    sniff_dialect,
+)
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
 
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
 METADATA = meta.Component(
     category=meta.Category(
         id="file",
@@ -48,8 +59,10 @@ METADATA = meta.Component(
     outPorts=[
         meta.Port(
             name="out",
-            contentType="mas.schema.model.monica.sim_setup_capnp:Setup",
-            desc="A single row from the CSV file sent as Setup struct.",
+            contentType="mas.schema.model.monica.sim_setup_capnp:Setup "
+            f"| common.capnp:Value[lv] | common.capnp:Blob[{ARROW_STREAM_CONTENT_TYPE}]",
+            desc="A single row from the CSV file sent as Setup struct or, if 'batch_rows' is set, "
+            "a batch of rows as list of structs or Arrow IPC stream.",
         ),
     ],
     defaultConfig={
@@ -81,7 +94,28 @@ METADATA = meta.Component(
         "to_attr": meta.ConfigEntry(
             value=None,
             type="string",
-            desc="Instead of sending a row as IP content, send it in this attribute.",
+            desc="Instead of sending a row (or batch) as IP content, send it in this attribute.",
+        ),
+        "batch_rows": meta.ConfigEntry(
+            value=0,
+            type="int",
+            desc="If > 0, send up to this many rows per IP instead of one IP per row.",
+        ),
+        "batch_format": meta.ConfigEntry(
+            value="structs",
+            type=["structs", "arrow"],
+            desc="Format of a batch: 'structs' is a common.capnp:Value list (lv) of structs (p), "
+            "'arrow' an Arrow IPC stream blob with the typed struct field columns.",
+        ),
+        "sniff_bytes": meta.ConfigEntry(
+            value=SNIFF_BYTES,
+            type="int",
+            desc="Number of bytes at the start of the file used to determine the CSV dialect.",
+        ),
+        "block_size": meta.ConfigEntry(
+            value=BLOCK_SIZE,
+            type="int",
+            desc="Number of bytes parsed at once. Bounds the memory used for reading the file.",
         ),
     },
 )
@@ -93,60 +127,85 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
 
     struct_type, _ = common.load_capnp_module(config["struct_type"])
     struct_fieldnames = struct_type.schema.fieldnames
-    struct_fields = struct_type.schema.fields
     col_to_field_names = config["col_to_field_names"]
     id_col = col_to_field_names.get(config["id_col"], config["id_col"])
-    send_ids = config["send_ids"] if config["send_ids"] is not None else None
+    send_ids = set(config["send_ids"]) if config["send_ids"] is not None else None
+    to_attr = config["to_attr"]
+    batch_rows = int(config.get("batch_rows") or 0)
+    batch_format = config.get("batch_format", "structs")
+
+    def new_ip(content: Any) -> Any:
+        out_ip = fbp_capnp.IP.new_message()
+        if to_attr:
+            out_ip.attributes = [{"key": to_attr, "value": content}]
+        else:
+            out_ip.content = content
+        return out_ip
+
+    # selected rows of parsed record batches, waiting to be sent as one batch
+    pending: list[tuple[dict[str, list[Any]], list[int]]] = []
+
+    def no_of_pending_rows() -> int:
+        return sum(len(rows) for _, rows in pending)
+
+    async def write_pending(csv_structs: CsvStructs):
+        if batch_format == "arrow":
+            record_batches = [csv_structs.arrow_batch(field_values, rows) for field_values, rows in pending]
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, record_batches[0].schema) as writer:
+                for record_batch in record_batches:
+                    writer.write_batch(record_batch)
+            data = sink.getvalue().to_pybytes()
+            if to_attr:
+                out_ip = new_ip(common_capnp.Blob.new_message(contentType=ARROW_STREAM_CONTENT_TYPE, data=data))
+            else:
+                out_ip = process.blob_ip(data, content_type=ARROW_STREAM_CONTENT_TYPE)
+        else:
+            structs = [
+                struct for field_values, rows in pending for struct in csv_structs.new_structs(field_values, rows)
+            ]
+            value = common_capnp.Value.new_message()
+            values = value.init("lv", len(structs))
+            for i, struct in enumerate(structs):
+                values[i].p = struct
+            out_ip = new_ip(value)
+        pending.clear()
+        await pc.out_ports["out"].write(value=out_ip)
 
     if pc.out_ports["out"]:
         try:
-            with Path(config["file"]).open() as _:
-                # determine seperator char
-                dialect = csv.Sniffer().sniff(_.read(), delimiters=";,\t")
-                _.seek(0)
-                # read csv with seperator char
-                reader = csv.reader(_, dialect)
-                header_cols = next(reader)
-                for row in reader:
-                    val = struct_type.new_message()
-                    for i, header_col in enumerate(header_cols):
-                        # potentially map header column names to names of the structs field names
-                        header_col = col_to_field_names.get(header_col, header_col)
-                        if header_col not in struct_fieldnames:
-                            continue
-                        value = row[i]
-                        fld_type = struct_fields[header_col].proto.slot.type.which()
-                        try:
-                            if fld_type == "bool":
-                                val.__setattr__(header_col, value.lower() == "true")
-                            elif fld_type == "text":
-                                val.__setattr__(header_col, value)
-                            elif fld_type in ["float32", "float64"]:
-                                val.__setattr__(header_col, float(value))
-                            elif fld_type in [
-                                "int8",
-                                "int16",
-                                "int32",
-                                "int64",
-                                "uint8",
-                                "uint16",
-                                "uint32",
-                                "uint64",
-                            ]:
-                                val.__setattr__(header_col, int(value))
-                            elif fld_type == "enum":
-                                if value in struct_fields[header_col].schema.enumerants:
-                                    val.__setattr__(header_col, value)
-                        except ValueError:
-                            continue
-
-                    if send_ids is None or (id_col in struct_fieldnames and val.__getattr__(id_col) in send_ids):
-                        out_ip = fbp_capnp.IP.new_message()
-                        if config["to_attr"]:
-                            out_ip.attributes = [{"key": config["to_attr"], "value": val}]
-                        else:
-                            out_ip.content = val
-                        await pc.out_ports["out"].write(value=out_ip)
+            # determine seperator char and header from the start of the file
+            dialect, header = sniff_dialect(config["file"], int(config.get("sniff_bytes") or SNIFF_BYTES))
+            csv_structs = CsvStructs(struct_type, header, col_to_field_names)
+            columns = list(csv_structs.columns) or header[:1]
+            for batch in read_batches(
+                config["file"], dialect, header, columns, int(config.get("block_size") or BLOCK_SIZE)
+            ):
+                field_values = csv_structs.field_values(batch)
+                if send_ids is None:
+                    rows = list(range(batch.num_rows))
+                elif id_col in struct_fieldnames and id_col in field_values:
+                    ids = csv_structs.values_or_default(id_col, field_values[id_col])
+                    rows = [i for i, id_ in enumerate(ids) if id_ in send_ids]
+                elif id_col in struct_fieldnames:
+                    # no id column in the file, all rows have the default id
+                    rows = list(range(batch.num_rows)) if getattr(struct_type.new_message(), id_col) in send_ids else []
+                else:
+                    rows = []
+
+                if batch_rows > 0:
+                    while rows:
+                        free = batch_rows - no_of_pending_rows()
+                        pending.append((field_values, rows[:free]))
+                        rows = rows[free:]
+                        if no_of_pending_rows() == batch_rows:
+                            await write_pending(csv_structs)
+                else:
+                    for struct in csv_structs.new_structs(field_values, rows):
+                        await pc.out_ports["out"].write(value=new_ip(struct))
+
+            if pending:
+                await write_pending(csv_structs)
 
         except capnp.KjException as e:
             logger.exception("%s: %s RPC Exception: %s", Path(__file__).name, config["name"], e.description)
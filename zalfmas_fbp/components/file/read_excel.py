@@ -14,9 +14,9 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-from collections import defaultdict
 from typing import Any, Literal, override
 
 import capnp
@@ -24,17 +24,13 @@ import numpy as np
 import pandas
 from pydantic import Field
 from zalfmas_capnp_schemas_with_stubs import (
-    climate_capnp,
     common_capnp,
     fbp_capnp,
-    field_exp_data_capnp,
-    soil_capnp,
 )
 from zalfmas_common import common
-from zalfmas_common.climate import csv_file_based
-from zalfmas_services.soil import sqlite_soil_data_service as sds
 
 import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.file.common.excel_sheets import resolve_engine, sheet_records, sheet_table, table_bytes
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -43,6 +39,9 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_CONTENT_TYPE = common_capnp.MimeTypes.applicationVndApacheParquet
+
 
 class Config(process.ProcessConfig):
     file: str = Field(
@@ -88,6 +87,20 @@ class Config(process.ProcessConfig):
     include_brackets_when_sending_nested: bool = Field(
         True, description="""Add a bracket IP pair around each nesting level."""
     )
+    engine: str = Field(
+        "auto",
+        description="""pandas Excel engine, e.g. 'calamine' or 'openpyxl'. 'auto' uses calamine if python-calamine
+        is installed, otherwise pandas' default engine.""",
+    )
+    output: Literal["json", "arrow_ipc", "parquet"] = Field(
+        "json",
+        description="""'json' sends the (possibly nested) JSON datastructure. 'arrow_ipc' and 'parquet' send each
+        sheet as (chunked) Arrow IPC stream or Parquet blob with the sheet name attribute, ignoring the nesting.""",
+    )
+    sheet_attr: str = Field(
+        "sheet",
+        description="Name of the attribute carrying the sheet name, if output is 'arrow_ipc' or 'parquet'.",
+    )
 
 
 METADATA = meta.Component(
@@ -107,8 +120,9 @@ METADATA = meta.Component(
     outPorts=[
         meta.Port(
             name="out",
-            contentType="Text (JSON)",
-            desc="The selected Excel tables as (possibly nested) JSON datastructures.",
+            contentType=f"Text (JSON) | common.capnp:Blob[{ARROW_STREAM_CONTENT_TYPE} | {PARQUET_CONTENT_TYPE}]",
+            desc="""The selected Excel tables as (possibly nested) JSON datastructures or
+            one Arrow IPC stream or Parquet blob per sheet.""",
         )
     ],
     config=Config,
@@ -151,24 +165,6 @@ class Component(process.Process[Config]):
         data: dict[str, Any] = {}
 
         # read additional (custom/optional) sheets dynamically and attach them based on their key columns
-        def convert_cell(raw, kind: Literal["date", "int", "float", "str"]):
-            try:
-                if raw is None or (np.isscalar(raw) and pandas.isna(raw)):
-                    return None
-            except (TypeError, ValueError):
-                pass
-            try:
-                if kind == "date":
-                    return str(raw)[:10]
-                if kind == "int":
-                    return int(raw)
-                if kind == "float":
-                    return float(raw)
-                return str(raw)
-            except Exception:
-                logger.exception("%s: could not convert value %s as %s", self.name, raw, kind)
-                return None
-
         def add_dynamic_sheet(sheet_name: str, sheet_df: pandas.DataFrame):
             cols = list(sheet_df.columns)
             # the attachment level is determined by the key columns present in the sheet
@@ -186,20 +182,8 @@ class Component(process.Process[Config]):
             sub_key = sheet_name.lower()
             # if the key columns are unique per row store a single object, otherwise a list of rows
             as_list = bool(sheet_df.duplicated(subset=key_cols).any()) if len(key_cols) > 0 else True  # False
-            # derive a converter per column from its pandas dtype
-            kinds: dict[str, Literal["date", "int", "float", "str"]] = {}
-            for c in cols:
-                dt = str(sheet_df[c].dtype)
-                if dt.startswith("datetime"):
-                    kinds[c] = "date"
-                elif dt.startswith("int"):
-                    kinds[c] = "int"
-                elif dt.startswith("float"):
-                    kinds[c] = "float"
-                else:
-                    kinds[c] = "str"
-
-            for i in sheet_df.axes[0]:
+            # all columns are converted at once, key columns to text
+            for record in sheet_records(sheet_df, key_cols):
                 target = data
                 ref = ""
                 cols_so_far = []
@@ -214,15 +198,12 @@ class Component(process.Process[Config]):
                         target = target[level_name]
                         ref += f"{level_name}/"
                     # create the actual data level
-                    key_value = str(sheet_df[key_col][i])
+                    key_value = record[key_col]
                     if key_value not in target:
                         target[key_value] = {}
                     target = target[key_value]
                     ref += f"{key_value}/"
 
-                record = {
-                    c: (str(sheet_df[c][i]) if c in key_cols else convert_cell(sheet_df[c][i], kinds[c])) for c in cols
-                }
                 if as_list:
                     existing = target.get(sub_key)
                     if not isinstance(existing, list):
@@ -232,20 +213,35 @@ class Component(process.Process[Config]):
                 else:
                     target[sub_key] = record
 
-        all_sheet_names = pandas.ExcelFile(file).sheet_names
-        sheet_names: list[str] = []
-        if self.config.load_all:
-            sheet_names = all_sheet_names
-        else:
-            for s in self.config.sheets_to_load:
-                if s in all_sheet_names:
-                    sheet_names.append(s)
-        if len(sheet_names) > 0:
-            dynamic_dfs = pandas.read_excel(file, sheet_name=sheet_names, header=self.config.index_of_header_row)
+        async def send_sheet_table(sheet_name: str, sheet_df: pandas.DataFrame) -> bool:
+            if not self.out_ports["out"]:
+                return False
+            output = self.config.output
+            data = await asyncio.to_thread(lambda: table_bytes(sheet_table(sheet_df), output))
+            content_type = PARQUET_CONTENT_TYPE if output == "parquet" else ARROW_STREAM_CONTENT_TYPE
+            out_ip = process.blob_ip(data, content_type=content_type)
+            out_ip.attributes = [{"key": self.config.sheet_attr, "value": sheet_name}]
+            return await self.write_out_chunked("out", out_ip)
+
+        # the workbook is opened once and parsed sheet by sheet, so only one sheet's data frame is held at a time
+        with pandas.ExcelFile(file, engine=resolve_engine(self.config.engine)) as workbook:
+            all_sheet_names = workbook.sheet_names
+            sheet_names: list[str] = []
+            if self.config.load_all:
+                sheet_names = all_sheet_names
+            else:
+                for s in self.config.sheets_to_load:
+                    if s in all_sheet_names:
+                        sheet_names.append(s)
             for s in sheet_names:
-                add_dynamic_sheet(s, dynamic_dfs[s])
+                sheet_df = await asyncio.to_thread(workbook.parse, s, header=self.config.index_of_header_row)
+                if self.config.output == "json":
+                    add_dynamic_sheet(s, sheet_df)
+                elif not await send_sheet_table(s, sheet_df):
+                    logger.info("%s: Could not send IP. Process finished.", self.name)
+                    return
 
-        if self.out_ports["out"]:
+        if self.config.output == "json" and self.out_ports["out"]:
             try:
 
                 async def send_it(d: dict[str, Any], nesting_levels=[]):
@@ -13,16 +13,19 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
+import asyncio
 import logging
 from pathlib import Path
-from typing import override
+from typing import Literal, override
 
 import capnp
+from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
 from pydantic import Field
 from zalfmas_common import common
 
 import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.file.common.line_batches import iter_line_batches
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -45,6 +48,25 @@ class ReadFileConfig(process.ProcessConfig):
         0,
         description="If lines mode is true, skip that many lines at the beginning of the file.",
     )
+    batch_lines: int = Field(
+        0,
+        ge=0,
+        description="If lines mode is true, send up to that many lines per message (0 = no line limit).",
+    )
+    batch_bytes: int = Field(
+        0,
+        ge=0,
+        description="If lines mode is true, end a batch of lines once it has that many bytes (0 = no byte limit).",
+    )
+    batch_format: Literal["list", "text"] = Field(
+        "list",
+        description="Send a batch of lines as List(Text) value ('list') or as the lines joined into one text ('text').",
+    )
+    buffer_size: int = Field(
+        1 << 20,
+        gt=0,
+        description="Size of the read buffer in bytes.",
+    )
 
 
 METADATA = meta.Component(
@@ -68,7 +90,9 @@ METADATA = meta.Component(
         meta.Port(
             name="out",
             contentType="Text",
-            desc="Output either full file content or each line as as separate message.",
+            desc="Output either full file content or each line as as separate message. "
+            "Batches of lines are sent as List(Text) value or newline joined text with "
+            "attributes 'first_line' (1-based line number) and 'line_count'.",
         ),
     ],
     config=ReadFileConfig,
@@ -95,8 +119,10 @@ class ReadFile(process.Process[ReadFileConfig]):
 
         try:
             skip_lines = self.config.skip_lines
-            with Path(self.config.file).open() as file:
-                if self.config.lines_mode:
+            with Path(self.config.file).open(buffering=self.config.buffer_size) as file:
+                if self.config.lines_mode and (self.config.batch_lines > 0 or self.config.batch_bytes > 0):
+                    await self.send_line_batches(file)
+                elif self.config.lines_mode:
                     for line in file:
                         if skip_lines > 0:
                             skip_lines -= 1
@@ -111,7 +137,7 @@ class ReadFile(process.Process[ReadFileConfig]):
                             logger.info("%s: Could not send IP. Process finished.", self.name)
                             return
                 else:
-                    file_content = file.read()
+                    file_content = await asyncio.to_thread(file.read)
                     out_ip = fbp_capnp.IP.new_message()
                     if self.config.to_attr is not None and len(self.config.to_attr) > 0:
                         out_ip.attributes = [{"key": self.config.to_attr, "value": file_content}]
@@ -126,6 +152,30 @@ class ReadFile(process.Process[ReadFileConfig]):
 
         logger.info("%s: process finished", self.name)
 
+    async def send_line_batches(self, file) -> None:
+        batches = iter_line_batches(file, self.config.batch_lines, self.config.batch_bytes, self.config.skip_lines)
+        first_line = self.config.skip_lines + 1
+        # reading and decoding the next batch happens in a worker thread
+        while lines := await asyncio.to_thread(next, batches, None):
+            if self.config.batch_format == "text":
+                value = "".join(lines)
+            else:
+                value = common_capnp.Value.new_message(lt=lines)
+            attrs = [
+                {"key": "first_line", "value": common_capnp.Value.new_message(ui64=first_line)},
+                {"key": "line_count", "value": common_capnp.Value.new_message(ui64=len(lines))},
+            ]
+            out_ip = fbp_capnp.IP.new_message()
+            if self.config.to_attr is not None and len(self.config.to_attr) > 0:
+                out_ip.attributes = [{"key": self.config.to_attr, "value": value}, *attrs]  # pyright: ignore
+            else:
+                out_ip.content = value
+                out_ip.attributes = attrs  # pyright: ignore
+            if not await self.write_out("out", out_ip):
+                logger.info("%s: Could not send IP. Process finished.", self.name)
+                return
+            first_line += len(lines)
+
 
 def main():
     process.run_process_from_metadata_and_cmd_args(ReadFile(METADATA), METADATA)
@@ -0,0 +1,122 @@
+"""Memory-mapped lat/lon ASCII grids.
+
+zalfmas_common.rect_ascii_grid_management.load_grid_cached parses the ASCII grid at every process start
+and looks up one coordinate per call. Here an ASCII grid is compiled once into a .npy file (plus a JSON
+file with the grid header and the source's mtime and size), which is recompiled only when the source
+changes. The .npy file is memory-mapped, so processes using the same grid share it via the page cache,
+and whole arrays of coordinates are looked up with one numpy gather.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from zalfmas_common import rect_ascii_grid_management as ragm
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "zalfmas_grids"
+
+
+class MappedGrid:
+    """A lat/lon grid with values stored in a (memory-mapped) 2D array.
+
+    Row and column of a coordinate are computed like in load_grid_cached, so both return the same values.
+    """
+
+    def __init__(self, grid: np.ndarray, metadata: dict[str, float]):
+        self.grid = grid
+        self.metadata = metadata
+        ll0r = ragm.get_lat_0_lon_0_resolution_from_grid_metadata(metadata)
+        self.lat_0 = ll0r["lat_0"]
+        self.lon_0 = ll0r["lon_0"]
+        self.res = ll0r["res"]
+        self.nodata_value = metadata["nodata_value"]
+
+    def rows_cols(self, lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        rows = np.trunc((self.lat_0 - np.asarray(lats, dtype=np.float64)) / self.res).astype(np.intp)
+        cols = np.trunc((np.asarray(lons, dtype=np.float64) - self.lon_0) / self.res).astype(np.intp)
+        return rows, cols
+
+    def values(
+        self,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        return_no_data: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """The values at the coordinates and a mask of which of them are valid.
+
+        Values outside the grid (and no-data values unless return_no_data) are invalid,
+        their entry in the values array is undefined.
+        """
+        rows, cols = self.rows_cols(lats, lons)
+        valid = (rows >= 0) & (rows < self.grid.shape[0]) & (cols >= 0) & (cols < self.grid.shape[1])
+        values = self.grid[np.where(valid, rows, 0), np.where(valid, cols, 0)]
+        if not return_no_data:
+            valid &= values != self.nodata_value
+        return values, valid
+
+    def value(self, lat: float, lon: float, return_no_data: bool = False) -> int | float | None:
+        """The value at a single coordinate or None."""
+        values, valid = self.values(np.array([lat]), np.array([lon]), return_no_data)
+        return values[0].item() if valid[0] else None
+
+
+def _cache_files(path: Path, dtype: np.dtype, cache_dir: Path) -> tuple[Path, Path]:
+    name = hashlib.sha1(f"{path.resolve()}|{dtype.str}".encode()).hexdigest()
+    return cache_dir / f"{path.name}.{name[:16]}.npy", cache_dir / f"{path.name}.{name[:16]}.json"
+
+
+def compile_ascii_grid(path: str | Path, dtype: type | np.dtype, cache_dir: str | Path | None = None) -> Path:
+    """Compile the ASCII grid at path into its .npy file in cache_dir, unless it is up to date.
+
+    Returns the path of the .npy file.
+    """
+    path = Path(path)
+    dtype = np.dtype(dtype)
+    npy_path, header_path = _cache_files(path, dtype, Path(cache_dir or DEFAULT_CACHE_DIR))
+    stat = path.stat()
+    source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if npy_path.exists() and header_path.exists():
+        with header_path.open() as _:
+            if json.load(_).get("source") == source:
+                return npy_path
+
+    metadata, _ = ragm.read_header(str(path))
+    grid = np.loadtxt(path, dtype=dtype, skiprows=len(metadata), ndmin=2)
+    npy_path.parent.mkdir(parents=True, exist_ok=True)
+    # write to temporary files first, so concurrent processes never see half written files
+    fd, tmp_npy = tempfile.mkstemp(dir=npy_path.parent, suffix=".npy")
+    with os.fdopen(fd, "wb") as _:
+        np.save(_, grid)
+    fd, tmp_header = tempfile.mkstemp(dir=npy_path.parent, suffix=".json")
+    with os.fdopen(fd, "w") as _:
+        json.dump({"metadata": metadata, "source": source}, _)
+    Path(tmp_npy).replace(npy_path)
+    Path(tmp_header).replace(header_path)
+    return npy_path
+
+
+@lru_cache(maxsize=32)
+def _load(path: str, dtype: str, cache_dir: str | None, mtime_ns: int) -> MappedGrid:
+    npy_path = compile_ascii_grid(path, np.dtype(dtype), cache_dir)
+    with npy_path.with_suffix(".json").open() as _:
+        metadata = json.load(_)["metadata"]
+    return MappedGrid(np.load(npy_path, mmap_mode="r"), metadata)
+
+
+def load_grid_mapped(path: str | Path, dtype: type | np.dtype, cache_dir: str | Path | None = None) -> MappedGrid:
+    """Load the ASCII grid at path as memory-mapped grid, compiling it first if needed.
+
+    Grids are cached per process as long as the source file does not change.
+    """
+    return _load(
+        str(path),
+        np.dtype(dtype).str,
+        None if cache_dir is None else str(cache_dir),
+        Path(path).stat().st_mtime_ns,
+    )
@@ -0,0 +1,78 @@
+"""Reprojection of geo.capnp coordinates with cached pyproj transformers.
+
+zalfmas_common.geo.transform_from_to_geo_coord creates a new pyproj Transformer on every call,
+which costs more than the transformation itself. Here transformers are created once per CRS pair,
+and lists of coordinates are transformed with one vectorized call per source CRS.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+from mas.schema.geo import geo_capnp
+from pyproj import Transformer
+from zalfmas_common import geo
+
+
+def crs_name(coord: Any) -> str:
+    """The CRS name (as understood by zalfmas_common.geo.name_to_crs) of a geo.capnp coordinate."""
+    schema = coord.schema
+    if schema == geo_capnp.LatLonCoord.schema:
+        return "latlon"
+    if schema == geo_capnp.UTMCoord.schema:
+        return f"utm{coord.zone}{coord.latitudeBand}".lower()
+    if schema == geo_capnp.GKCoord.schema:
+        return f"gk{coord.meridianNo}"
+    msg = f"Unsupported coordinate type: {schema}"
+    raise ValueError(msg)
+
+
+@lru_cache(maxsize=64)
+def transformer(from_name: str, to_name: str) -> Transformer:
+    """A cached always_xy transformer between two CRS names."""
+    from_crs = geo.name_to_crs(from_name)
+    to_crs = geo.name_to_crs(to_name)
+    if from_crs is None or to_crs is None:
+        msg = f"Unknown CRS name: {from_name if from_crs is None else to_name}"
+        raise ValueError(msg)
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+
+def transform_xy(
+    xs: np.ndarray | Sequence[float],
+    ys: np.ndarray | Sequence[float],
+    from_name: str,
+    to_name: str,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Transform arrays of x (lon, r) and y (lat, h) values in one call."""
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if from_name.lower() == to_name.lower():
+        return xs, ys
+    return transformer(from_name.lower(), to_name.lower()).transform(xs, ys)
+
+
+def transform_coord(coord: Any, to_name: str) -> Any:
+    """Transform a single coordinate, like zalfmas_common.geo.transform_from_to_geo_coord."""
+    return transform_coords([coord], to_name)[0]
+
+
+def transform_coords(coords: Sequence[Any], to_name: str) -> list[Any]:
+    """Transform coordinates of possibly different CRSs into to_name coordinates, keeping their order."""
+    by_crs: defaultdict[str, list[int]] = defaultdict(list)
+    for i, coord in enumerate(coords):
+        by_crs[crs_name(coord)].append(i)
+
+    out: list[Any] = [None] * len(coords)
+    for from_name, indices in by_crs.items():
+        xys = [geo.get_xy(coords[i]) for i in indices]
+        xs = np.fromiter((xy[0] for xy in xys), dtype=np.float64, count=len(xys))
+        ys = np.fromiter((xy[1] for xy in xys), dtype=np.float64, count=len(xys))
+        to_xs, to_ys = transform_xy(xs, ys, from_name, to_name)
+        for i, x, y in zip(indices, to_xs.tolist(), to_ys.tolist(), strict=True):
+            out[i] = geo.name_to_struct_instance(to_name, x=x, y=y)
+    return out
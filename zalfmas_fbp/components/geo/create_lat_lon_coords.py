@@ -15,20 +15,26 @@
 
 import json
 import logging
+from collections.abc import Iterator
 from pathlib import Path
 from typing import Any
 
+import numpy as np
+import pyarrow as pa
 from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
 from mas.schema.geo import geo_capnp
-from zalfmas_common import rect_ascii_grid_management as grid
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.geo.common.mapped_grid import MappedGrid, load_grid_mapped
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
 
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
 METADATA = meta.Component(
     category=meta.Category(
         id="geo",
@@ -59,8 +65,10 @@ METADATA = meta.Component(
     outPorts=[
         meta.Port(
             name="out",
-            contentType="common.capnp:Pair(ID, geo.capnp:LatLonCoord) | string (JSON array)",
-            desc="Either a stream of LatLonCoords or a serialized JSON array [[lat1,lon1],[lat2,lon2]] of lat/lon pairs.",
+            contentType=f"common.capnp:Pair(ID, geo.capnp:LatLonCoord) | string (JSON array) "
+            f"| common.capnp:Blob[{ARROW_STREAM_CONTENT_TYPE}]",
+            desc="Either a stream of LatLonCoords, a serialized JSON array [[lat1,lon1,id1],[lat2,lon2,id2]] "
+            "or an Arrow IPC stream with the columns lat, lon and id.",
         ),
     ],
     defaultConfig={
@@ -69,6 +77,12 @@ METADATA = meta.Component(
             type="bool",
             desc="If True, the component will stream the output Lat/Lon coord by Lat/Lon coord.",
         ),
+        "arrow": meta.ConfigEntry(
+            value=False,
+            type="bool",
+            desc="If True, the coords of a region are sent as one Arrow IPC stream blob (columns lat, lon, id). "
+            "Takes precedence over 'stream'.",
+        ),
         "create_substream": meta.ConfigEntry(
             value=False,
             type="bool",
@@ -97,6 +111,57 @@ METADATA = meta.Component(
 )
 
 
+# maximum number of grid cells masked at once
+BLOCK_CELLS = 1 << 22
+
+
+def region_coords(
+    tl: dict[str, float],
+    br: dict[str, float],
+    resolution: float,
+    res_scale_factor: float,
+    ids_grid: MappedGrid,
+    ids: list[int],
+) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield blocks of (lats, lons, ids) of the cells within the bounds, row by row from north to south.
+
+    Cells without ID (no data, outside the grid or 0) or with an ID not in ids (if given) are left out.
+    """
+    step = int(resolution * res_scale_factor)
+    lats = np.arange(int(tl["lat"] * res_scale_factor), int(br["lat"] * res_scale_factor) - 1, -step)
+    lats = lats / res_scale_factor
+    lons = np.arange(int(tl["lon"] * res_scale_factor), int(br["lon"] * res_scale_factor) + 1, step)
+    lons = lons / res_scale_factor
+    if len(lats) == 0 or len(lons) == 0:
+        return
+
+    rows, _ = ids_grid.rows_cols(lats, np.zeros_like(lats))
+    _, cols = ids_grid.rows_cols(np.zeros_like(lons), lons)
+    nrows, ncols = ids_grid.grid.shape
+    col_valid = (cols >= 0) & (cols < ncols)
+    cols = np.where(col_valid, cols, 0)
+    block_rows = max(1, BLOCK_CELLS // len(lons))
+    for start in range(0, len(lats), block_rows):
+        block_rows_idx = rows[start : start + block_rows]
+        row_valid = (block_rows_idx >= 0) & (block_rows_idx < nrows)
+        values = ids_grid.grid[np.where(row_valid, block_rows_idx, 0)[:, None], cols[None, :]]
+        mask = row_valid[:, None] & col_valid[None, :] & (values != ids_grid.nodata_value) & (values != 0)
+        if len(ids) > 0:
+            mask &= np.isin(values, ids)
+        lat_idx, lon_idx = np.nonzero(mask)
+        if len(lat_idx) > 0:
+            yield lats[start + lat_idx], lons[lon_idx], values[lat_idx, lon_idx]
+
+
+def coords_to_arrow(blocks: Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]) -> bytes:
+    schema = pa.schema([("lat", pa.float64()), ("lon", pa.float64()), ("id", pa.int64())])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for lats, lons, ids in blocks:
+            writer.write_batch(pa.record_batch([lats, lons, ids.astype(np.int64)], schema=schema))
+    return sink.getvalue().to_pybytes()
+
+
 async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
     pc = await p.PortConnector.create_from_port_infos_reader(
         port_infos_reader_sr,
@@ -126,12 +191,13 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
         },
     }
 
-    country_ids_data = grid.load_grid_cached(config["path_to_ids_grid"], int)
+    country_ids_data = load_grid_mapped(config["path_to_ids_grid"], int)
 
     # get just default values for region and ids
     region = config["region"]
     country_ids = json.loads(config["ids"])
     do_stream = config["stream"]
+    do_arrow = config.get("arrow", False)
     create_substream = config["create_substream"]
 
     # at least one input port has to be connected
@@ -156,41 +222,40 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
             logger.exception("%s Exception", Path(__file__).name)
 
         lat_lon_bounds = region_to_lat_lon_bounds.get(region)
+        if "tl" not in lat_lon_bounds:
+            lat_lon_bounds = lat_lon_bounds[config["resolution"]]
 
-        lats_scaled = range(
-            int(lat_lon_bounds["tl"]["lat"] * s_res_scale_factor),
-            int(lat_lon_bounds["br"]["lat"] * s_res_scale_factor) - 1,
-            -int(s_resolution * s_res_scale_factor),
+        blocks = region_coords(
+            lat_lon_bounds["tl"],
+            lat_lon_bounds["br"],
+            s_resolution,
+            s_res_scale_factor,
+            country_ids_data,
+            country_ids,
         )
 
+        if do_arrow:
+            try:
+                out_ip = process.blob_ip(coords_to_arrow(blocks), content_type=ARROW_STREAM_CONTENT_TYPE)
+                await pc.out_ports["out"].write(value=out_ip)
+            except Exception:
+                logger.exception("%s Exception", Path(__file__).name)
+            continue
+
         if do_stream and create_substream:
             await pc.out_ports["out"].write(value=fbp_capnp.IP.new_message(type="openBracket"))
         lat_lons = []
-        for lat_scaled in lats_scaled:
-            lat = lat_scaled / s_res_scale_factor
-            logger.debug("%s latitude %.2f", Path(__file__).name, round(lat, 2))
-
-            lons_scaled = range(
-                int(lat_lon_bounds["tl"]["lon"] * s_res_scale_factor),
-                int(lat_lon_bounds["br"]["lon"] * s_res_scale_factor) + 1,
-                int(s_resolution * s_res_scale_factor),
-            )
-            for lon_scaled in lons_scaled:
-                lon = lon_scaled / s_res_scale_factor
-
-                country_id = country_ids_data["value"](lat, lon, False)
-                if not country_id or (len(country_ids) > 0 and country_id not in country_ids):
-                    continue
-
-                if do_stream:
+        for lats, lons, ids in blocks:
+            if do_stream:
+                for lat, lon, country_id in zip(lats.tolist(), lons.tolist(), ids.tolist(), strict=True):
                     id_and_ll = common_capnp.Pair.new_message(
                         fst=common_capnp.Value.new_message(i64=country_id),
                         snd=geo_capnp.LatLonCoord.new_message(lat=lat, lon=lon),
                     )
                     out_ip = fbp_capnp.IP.new_message(content=id_and_ll)
                     await pc.out_ports["out"].write(value=out_ip)
-                else:
-                    lat_lons.append([lat, lon, id])
+            else:
+                lat_lons.extend(map(list, zip(lats.tolist(), lons.tolist(), ids.tolist(), strict=True)))
 
         if do_stream:
             if create_substream:
@@ -20,10 +20,10 @@ from typing import Any
 from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
 from zalfmas_common import common, geo
-from zalfmas_common import rect_ascii_grid_management as ragm
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+from zalfmas_fbp.components.geo.common.mapped_grid import load_grid_mapped
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -68,6 +68,11 @@ METADATA = meta.Component(
             type=["int", "float"],
             desc="Type of value to read from grid.",
         ),
+        "grid_cache_dir": meta.ConfigEntry(
+            value=None,
+            type="string",
+            desc="Directory of the compiled (memory-mapped) grid files. Defaults to a directory in the system temp dir.",
+        ),
         "debug_out": meta.ConfigEntry(
             value=True,
             type="bool",
@@ -85,11 +90,13 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
         msg = "No path_to_grid given at start of component."
         raise ValueError(msg)
 
-    grid_data = ragm.load_grid_cached(
+    grid_data = load_grid_mapped(
         config["path_to_grid"],
         int if config["type"] == "int" else float,
-        print_path=debug_out,
+        cache_dir=config.get("grid_cache_dir"),
     )
+    if debug_out:
+        logger.info("%s: loaded grid %s", Path(__file__).name, config["path_to_grid"])
 
     while pc.in_ports["in"] and pc.out_ports["out"]:
         try:
@@ -101,7 +108,7 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
 
             in_ip = msg.value.as_struct(fbp_capnp.IP)
             ll = in_ip.content.as_struct(geo.name_to_struct_type("latlon"))
-            val = grid_data["value"](ll.lat, ll.lon)
+            val = grid_data.value(ll.lat, ll.lon)
             if config["type"] == "int":
                 cval = common_capnp.Value.new_message(i64=val)
             else:
@@ -21,6 +21,7 @@ import capnp
 from mas.schema.fbp import fbp_capnp
 from zalfmas_common import common, geo
 
+from zalfmas_fbp.components.geo.common.reproject import transform_coords
 from zalfmas_fbp.run import components as c
 from zalfmas_fbp.run import metadata as meta
 from zalfmas_fbp.run import ports as p
@@ -77,6 +78,12 @@ METADATA = meta.Component(
             type="string",
             desc="Attribute name to use as the output.",
         ),
+        "batch_size": meta.ConfigEntry(
+            value=1,
+            type="int",
+            desc="""Number of coordinates transformed together in one vectorized call.
+            A batch is also written at the end of a substream and of the input.""",
+        ),
     },
 )
 
@@ -86,6 +93,24 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
     await p.update_config_from_port(config, pc.in_ports["conf"])
 
     from_type = geo.name_to_struct_type(config["from_name"])
+    batch_size = max(1, int(config.get("batch_size") or 1))
+    # input IPs and their coordinates, waiting to be transformed together
+    batch: list[tuple[Any, Any]] = []
+
+    async def write_batch():
+        to_coords = transform_coords([from_coord for _, from_coord in batch], config["to_name"])
+        for (in_ip, _), to_coord in zip(batch, to_coords, strict=True):
+            out_ip = fbp_capnp.IP.new_message()
+            if not config["to_attr"]:
+                out_ip.content = to_coord
+            common.copy_and_set_fbp_attrs(
+                in_ip,
+                out_ip,
+                **({config["to_attr"]: to_coord} if config["to_attr"] else {}),
+            )
+            await pc.out_ports["out"].write(value=out_ip)
+        batch.clear()
+
     while pc.in_ports["in"] and pc.out_ports["out"]:
         try:
             in_msg = await pc.in_ports["in"].read()
@@ -94,27 +119,32 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
                 continue
 
             in_ip = in_msg.value.as_struct(fbp_capnp.IP)
+            if in_ip.type != "standard":
+                # substream boundaries end a batch and are forwarded unchanged
+                await write_batch()
+                await pc.out_ports["out"].write(value=in_ip)
+                continue
+
             attr = common.get_fbp_attr(in_ip, config["from_attr"])
             if attr:
                 from_coord = attr.as_struct(from_type)
             else:
                 from_coord = in_ip.content.as_struct(from_type)
-            to_coord = geo.transform_from_to_geo_coord(from_coord, config["to_name"])
-            out_ip = fbp_capnp.IP.new_message()
-            if not config["to_attr"]:
-                out_ip.content = to_coord
-            common.copy_and_set_fbp_attrs(
-                in_ip,
-                out_ip,
-                **({config["to_attr"]: to_coord} if config["to_attr"] else {}),
-            )
-            await pc.out_ports["out"].write(value=out_ip)
+            batch.append((in_ip, from_coord))
+            if len(batch) >= batch_size:
+                await write_batch()
 
         except capnp.KjException as e:
             logger.exception("%s: %s RPC Exception: %s", Path(__file__).name, config["name"], e.description)
             if e.type in ["DISCONNECTED"]:
                 break
 
+    try:
+        if batch and pc.out_ports["out"]:
+            await write_batch()
+    except capnp.KjException as e:
+        logger.exception("%s: %s RPC Exception: %s", Path(__file__).name, config["name"], e.description)
+
     await pc.close_out_ports()
     logger.info("%s: process finished", Path(__file__).name)
 
@@ -0,0 +1 @@
+"""Shared helpers for grid components."""
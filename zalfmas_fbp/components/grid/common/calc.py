@@ -0,0 +1,101 @@
+"""Simple arithmetic expressions, compiled once and evaluated on numpy arrays.
+
+The supported syntax follows pymep's real parser: numbers, variables, + - * / ^ (power), parentheses
+and the functions sin, cos, tan, sinh, cosh, tanh, asin, acos, atan, sqrt, exp, log (natural), log10 and abs.
+Like in pymep, expressions and variable names are case-insensitive.
+"""
+
+from __future__ import annotations
+
+import ast
+import operator
+from collections.abc import Callable, Mapping
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+
+type Calc = Callable[[Mapping[str, Any]], np.ndarray]
+
+_BIN_OPS: dict[type[ast.operator], Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: np.power,
+}
+_UNARY_OPS: dict[type[ast.unaryop], Callable[[Any], Any]] = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+_FUNCTIONS: dict[str, Callable[[Any], Any]] = {
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "sinh": np.sinh,
+    "cosh": np.cosh,
+    "tanh": np.tanh,
+    "asin": np.arcsin,
+    "acos": np.arccos,
+    "atan": np.arctan,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "ln": np.log,
+    "log10": np.log10,
+    "abs": np.abs,
+}
+
+
+def _compile_node(node: ast.AST) -> Calc:
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda _: value
+    if isinstance(node, ast.Name):
+        name = node.id
+
+        def variable(variables: Mapping[str, Any]) -> Any:
+            if name not in variables:
+                msg = f"Unknown variable '{name}' in calc expression."
+                raise KeyError(msg)
+            return variables[name]
+
+        return variable
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        op = _BIN_OPS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda variables: op(left(variables), right(variables))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        unary_op = _UNARY_OPS[type(node.op)]
+        operand = _compile_node(node.operand)
+        return lambda variables: unary_op(operand(variables))
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in _FUNCTIONS
+        and len(node.args) == 1
+        and not node.keywords
+    ):
+        fn = _FUNCTIONS[node.func.id]
+        arg = _compile_node(node.args[0])
+        return lambda variables: fn(arg(variables))
+    msg = f"Unsupported calc expression element: {ast.dump(node)}"
+    raise ValueError(msg)
+
+
+@lru_cache(maxsize=128)
+def compile_calc(expr: str) -> Calc:
+    """Compile expr into a function of a mapping from (lower case) variable names to numbers or arrays."""
+    tree = ast.parse(expr.strip().lower().replace("^", "**"), mode="eval")
+    return _compile_node(tree)
+
+
+def calc_variables(calc: Mapping[str, Any], **arrays: np.ndarray) -> dict[str, Any]:
+    """The variables of a 'calc' config object (all but the 'f(...)' expressions) plus arrays, by lower case name."""
+    variables: dict[str, Any] = {
+        name.lower(): value for name, value in calc.items() if not name.startswith("f(") and value is not None
+    }
+    variables.update({name.lower(): array for name, array in arrays.items()})
+    return variables
@@ -0,0 +1,73 @@
+"""Batched, concurrent and cached closestValueAt lookups on a grid.capnp:Grid capability."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+
+type CellKey = tuple[float, float]
+type GridValue = tuple[str, float | int | None]
+"""The union field of a grid.capnp:Grid.Value and its value (None for 'no')."""
+
+
+def grid_value_tuple(grid_value: Any) -> GridValue:
+    which = grid_value.which()
+    return which, None if which == "no" else getattr(grid_value, which)
+
+
+class GridLookup:
+    """Looks up the closest grid values of coordinates.
+
+    Coordinates are snapped to cell keys by rounding lat/lon to cache_decimals decimals.
+    The values of the last cache_size keys are cached. All uncached keys of a batch are requested
+    at the same time, with at most max_concurrent requests in flight.
+    """
+
+    def __init__(self, grid: Any, max_concurrent: int = 8, cache_size: int = 10000, cache_decimals: int = 5):
+        self.grid = grid
+        self.cache_size = cache_size
+        self.cache_decimals = cache_decimals
+        self.hits = 0
+        self.misses = 0
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._cache: OrderedDict[CellKey, GridValue] = OrderedDict()
+
+    def key(self, lat: float, lon: float) -> CellKey:
+        return round(lat, self.cache_decimals), round(lon, self.cache_decimals)
+
+    async def _request(self, lat: float, lon: float) -> GridValue:
+        async with self._semaphore:
+            res = await self.grid.closestValueAt({"lat": lat, "lon": lon})
+        return grid_value_tuple(res.val)
+
+    async def lookup(self, coords: Sequence[tuple[float, float]]) -> list[GridValue]:
+        """The grid values at the (lat, lon) coordinates, in order."""
+        keys = [self.key(lat, lon) for lat, lon in coords]
+        found: dict[CellKey, GridValue] = {}
+        missing: dict[CellKey, tuple[float, float]] = {}
+        for key, coord in zip(keys, coords, strict=True):
+            if key in found or key in missing:
+                continue
+            if (value := self._cache.get(key)) is not None:
+                self._cache.move_to_end(key)
+                found[key] = value
+            else:
+                missing[key] = coord
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            values = await asyncio.gather(*(self._request(lat, lon) for lat, lon in missing.values()))
+            for key, value in zip(missing, values, strict=True):
+                found[key] = value
+                self._remember(key, value)
+        return [found[key] for key in keys]
+
+    def _remember(self, key: CellKey, value: GridValue) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = value
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
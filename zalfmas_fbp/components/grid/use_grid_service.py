@@ -14,18 +14,21 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
 import logging
+import math
 from pathlib import Path
 from typing import Any
 
+import numpy as np
 from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
 from mas.schema.geo import geo_capnp
 from mas.schema.grid import grid_capnp
-from pymep.realParser import eval as mep_eval
 from zalfmas_common import common
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+from zalfmas_fbp.components.grid.common.calc import calc_variables, compile_calc
+from zalfmas_fbp.components.grid.common.lookup import GridLookup, GridValue
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -85,10 +88,77 @@ METADATA = meta.Component(
             type="object",
             desc="If 'f(gv)' has a value, define an simple arithmetic expression named 'f(gv)', which can use 'gv' (grid value) and possible other variables defined in the 'calc' object.",
         ),
+        "batch_size": meta.ConfigEntry(
+            value=1,
+            type="int",
+            desc="""Number of coordinates looked up together. The uncached ones are requested concurrently.
+            A batch is also processed at the end of a substream and of the input.""",
+        ),
+        "max_concurrent_requests": meta.ConfigEntry(
+            value=8,
+            type="int",
+            desc="Maximum number of closestValueAt requests in flight.",
+        ),
+        "cache_size": meta.ConfigEntry(
+            value=10000,
+            type="int",
+            desc="Number of grid values cached by coordinate (least recently used are dropped). 0 disables the cache.",
+        ),
+        "cache_decimals": meta.ConfigEntry(
+            value=5,
+            type="int",
+            desc="Lat/lon are rounded to this number of decimals to build the cache key.",
+        ),
     },
 )
 
 
+def _grid_value_struct(which: str, value: float | int | None) -> Any:
+    return grid_capnp.Grid.Value.new_message(**{which: True if which == "no" else value})
+
+
+def _maybe_as_common_value(which: str, value: float | int | None, as_common_value: bool) -> Any:
+    if as_common_value:
+        if which == "f":
+            return common_capnp.Value.new_message(f64=value)
+        if which == "i":
+            return common_capnp.Value.new_message(i64=value)
+        if which == "ui":
+            return common_capnp.Value.new_message(ui64=value)
+    return _grid_value_struct(which, value)
+
+
+INT_RANGES = {"i": (-(2**63), 2**63 - 1), "ui": (0, 2**64 - 1)}
+
+
+def _calc_result(which: str, res: float) -> GridValue:
+    if which == "no":
+        return which, None
+    if which == "f":
+        return which, float(res)
+    low, high = INT_RANGES[which]
+    if not math.isfinite(res) or not low <= res <= high:
+        logger.warning(
+            "%s: calc result %s is no valid '%s' grid value, sending no value", Path(__file__).name, res, which
+        )
+        return "no", None
+    return which, int(res)
+
+
+def apply_calc(values: list[GridValue], calc: dict[str, Any]) -> list[GridValue]:
+    """Apply the 'f(gv)' expression of calc to all values at once. No-data values stay unchanged.
+
+    Integer results which are not finite or out of the range of the grid's value type become no-data values.
+    """
+    expr = calc.get("f(gv)")
+    if not expr:
+        return values
+    gv = np.array([np.nan if which == "no" else value for which, value in values], dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        results = np.broadcast_to(compile_calc(expr)(calc_variables(calc, gv=gv)), gv.shape).tolist()
+    return [_calc_result(which, res) for (which, _), res in zip(values, results, strict=True)]
+
+
 async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
     pc = await p.PortConnector.create_from_port_infos_reader(
         port_infos_reader_sr,
@@ -97,75 +167,72 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
     )
     await p.update_config_from_port(config, pc.in_ports["conf"])
 
-    service = None
+    grid = None
     if pc.in_ports["service"]:
-        service = (
-            service_cap.cast_as(grid_capnp.Service)
+        grid = (
+            service_cap.cast_as(grid_capnp.Grid)
             if (service_cap := await pc.read_or_connect("service")) is not None
             else None
         )
-        if not service:
+        if not grid:
             logger.error("%s No grid service could be received or connected to.", Path(__file__).name)
             return
 
+    lookup = GridLookup(
+        grid,
+        max_concurrent=int(config.get("max_concurrent_requests", 8)),
+        cache_size=int(config.get("cache_size", 10000)),
+        cache_decimals=int(config.get("cache_decimals", 5)),
+    )
+    batch_size = max(1, int(config.get("batch_size") or 1))
+    to_attr = config.get("to_attr")
+    as_common_value = config.get("as_common_value", False)
+    calc = config.get("calc") or {}
+    # input IPs and their coordinates, waiting to be looked up together
+    batch: list[tuple[Any, tuple[float, float]]] = []
+
+    async def write_batch():
+        values = apply_calc(await lookup.lookup([coord for _, coord in batch]), calc)
+        for (in_ip, _), (which, value) in zip(batch, values, strict=True):
+            out_val = _maybe_as_common_value(which, value, as_common_value)
+            out_ip = fbp_capnp.IP.new_message()
+            if not to_attr:
+                out_ip.content = out_val
+            # copy old attributes and potentially add new one
+            common.copy_and_set_fbp_attrs(in_ip, out_ip, **({to_attr: out_val} if to_attr else {}))
+            await pc.out_ports["out"].write(value=out_ip)
+        batch.clear()
+
     try:
-        while pc.in_ports["in"] and pc.out_ports["out"] and service:
-            in_msg = pc.in_ports["in"].read().wait()
+        while pc.in_ports["in"] and pc.out_ports["out"] and grid:
+            in_msg = await pc.in_ports["in"].read()
             if in_msg.which() == "done":
                 pc.in_ports["in"] = None
                 continue
 
             in_ip = in_msg.value.as_struct(fbp_capnp.IP)
+            if in_ip.type != "standard":
+                # substream boundaries end a batch and are forwarded unchanged
+                await write_batch()
+                await pc.out_ports["out"].write(value=in_ip)
+                continue
+
             attr = common.get_fbp_attr(in_ip, config["from_attr"])
             if attr:
                 coord = attr.as_struct(geo_capnp.LatLonCoord)
             else:
                 coord = in_ip.content.as_struct(geo_capnp.LatLonCoord)
+            batch.append((in_ip, (coord.lat, coord.lon)))
+            if len(batch) >= batch_size:
+                await write_batch()
 
-            grid_val = (await service.closestValueAt(coord)).val
-
-            def maybe_as_common_value(grid_value):
-                if config.get("as_common_value", False):
-                    if grid_value.which() == "f":
-                        return common_capnp.Value.new_message(f64=grid_value.f)
-                    if grid_value.which() == "i":
-                        return common_capnp.Value.new_message(i64=grid_value.i)
-                    if grid_value.which() == "ui":
-                        return common_capnp.Value.new_message(ui64=grid_value.ui)
-                return grid_value
-
-            def update_val(expr, var_name, grid_value):
-                if grid_value.which() == "f":
-                    grid_value.f = mep_eval(expr, {var_name, float(grid_value.f)})
-                elif grid_value.which() == "i":
-                    grid_value.i = int(mep_eval(expr, {var_name, int(grid_value.i)}))
-                elif grid_value.which() == "ui":
-                    grid_value.ui = int(mep_eval(expr, {var_name, int(grid_value.ui)}))
-                return grid_value
-
-            out_ip = fbp_capnp.IP.new_message()
-
-            new_attrs = {}
-            is_valid_to_attr = "to_attr" in config and len(config["to_attr"]) > 0
-            calc = config.get("calc", {})
-
-            # update attr
-            if is_valid_to_attr:
-                calc_val = update_val(calc.get("f(gv)", {}), calc.copy().pop("f(gv)"), grid_val)
-                new_attrs[config["to_attr"]] = maybe_as_common_value(calc_val)
-
-            # send via content
-            if not is_valid_to_attr:
-                calc_val = update_val(calc.get("f(gv)", {}), calc.copy().pop("f(gv)"), grid_val)
-                out_ip.content = maybe_as_common_value(calc_val)
-
-            # copy old attributes and potentially add new one
-            common.copy_and_set_fbp_attrs(in_ip, out_ip, **new_attrs)
-            await pc.out_ports["out"].write(value=out_ip)
+        if batch and pc.out_ports["out"]:
+            await write_batch()
 
     except Exception:
         logger.exception("%s Exception", Path(__file__).name)
 
+    logger.info("%s: grid value cache hits: %d misses: %d", Path(__file__).name, lookup.hits, lookup.misses)
     await pc.close_out_ports()
     logger.info("%s: process finished", Path(__file__).name)
 
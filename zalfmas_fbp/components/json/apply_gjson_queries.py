@@ -14,15 +14,17 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 from __future__ import annotations
 
-import json
 import logging
-from typing import Any
+import re
+from functools import lru_cache
+from typing import Any, Literal
 
 import gjson
-from mas.schema.fbp import fbp_capnp
 from pydantic import Field
 from zalfmas_common import common
 
+from zalfmas_fbp.components.json.common import codec
+from zalfmas_fbp.components.json.common.json_path import MISSING, PATH_CACHE_SIZE, JsonPath, compile_path
 from zalfmas_fbp.run import metadata as meta
 from zalfmas_fbp.run import process
 from zalfmas_fbp.run.logging_config import configure_logging
@@ -31,7 +33,7 @@ logger = logging.getLogger(__name__)
 configure_logging()
 
 
-class ApplyGJsonQueriesConfig(process.ProcessConfig):
+class ApplyGJsonQueriesConfig(codec.EncodingConfig):
     queries: list[str] = Field(
         default_factory=list,
         description="GJSON queries applied sequentially. Query i+1 runs on the result of query i.",
@@ -78,13 +80,95 @@ METADATA = meta.Component(
 )
 
 
+# plain field/index paths like "a.b.0.c", which are evaluated directly instead of by gjson
+_SIMPLE_QUERY = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_-]*(?:\.[A-Za-z0-9_][A-Za-z0-9_-]*)*")
+
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def _simple_query_path(query: str) -> JsonPath | None:
+    return compile_path(query, ".") if _SIMPLE_QUERY.fullmatch(query) else None
+
+
 def _apply_queries(value: Any, queries: list[str]) -> Any:
     result: Any = value
     for query in queries:
-        result = gjson.get(result, query)
+        json_path = _simple_query_path(query)
+        if json_path is None or (query_result := json_path.get(result)) is MISSING:
+            # gjson also resolves numeric object keys and raises its own errors for unresolvable paths
+            query_result = gjson.get(result, query)
+        result = query_result
     return result
 
 
+class _QueryPlan:
+    """The configured queries, with consecutive plain path queries fused into one compiled path.
+
+    A fused path is resolved in one traversal. If it can't be resolved, its queries are applied one
+    after the other, as without fusing.
+    """
+
+    def __init__(self, queries: list[str]):
+        self._steps: list[tuple[JsonPath | None, list[str]]] = []
+        for query in queries:
+            json_path = _simple_query_path(query)
+            if json_path is not None and self._steps and (last := self._steps[-1])[0] is not None:
+                self._steps[-1] = (JsonPath((*last[0].parts, *json_path.parts)), [*last[1], query])
+            else:
+                self._steps.append((json_path, [query]))
+
+    def apply(self, value: Any) -> Any:
+        for json_path, queries in self._steps:
+            if json_path is None or (result := json_path.get(value)) is MISSING:
+                result = _apply_queries(value, queries)
+            value = result
+        return value
+
+
+class _SubstreamMerger:
+    """Merges the results of a substream while they arrive, like _merge_substream_payloads.
+
+    For JSON output, the results are kept JSON encoded and spliced into the output text, instead of
+    keeping the decoded results in memory. Object results are also merged into one object right away,
+    which is sent if the substream only has object results.
+    """
+
+    def __init__(self, encoding: codec.Encoding):
+        self._encoding = encoding
+        self._kind: Literal["dict", "list", "mixed"] | None = None
+        self._merged: dict[str, Any] = {}
+        self._encoded: list[bytes] = []
+        self._payloads: list[Any] = []
+
+    def add(self, payload: Any) -> None:
+        if self._encoding == "msgpack":
+            self._payloads.append(payload)
+            return
+
+        is_dict = isinstance(payload, dict)
+        if self._kind is None:
+            self._kind = "dict" if is_dict else "list" if isinstance(payload, list) else "mixed"
+        elif (self._kind == "dict" and not is_dict) or (self._kind == "list" and not isinstance(payload, list)):
+            self._kind = "mixed"
+            self._merged = {}
+
+        if self._kind == "dict":
+            self._merged.update(payload)
+        self._encoded.append(codec.dumps_bytes(payload))
+
+    def write_ip(self, attributes: Any) -> Any:
+        if self._encoding == "msgpack":
+            return codec.new_ip(_merge_substream_payloads(self._payloads), encoding="msgpack", attributes=attributes)
+        if self._kind is None:
+            return codec.new_ip(None, attributes=attributes)
+        if self._kind == "dict":
+            return codec.new_ip(self._merged, attributes=attributes)
+        if self._kind == "list":
+            items = [body for encoded in self._encoded if (body := encoded[1:-1].strip())]
+        else:
+            items = self._encoded
+        return codec.json_text_ip((b"[" + b",".join(items) + b"]").decode(), attributes=attributes)
+
+
 def _merge_substream_payloads(payloads: list[Any]) -> Any:
     if len(payloads) == 0:
         return None
@@ -112,8 +196,11 @@ class ApplyGJsonQueries(process.Process[ApplyGJsonQueriesConfig]):
     ):
         super().__init__(metadata=metadata, con_man=con_man)
 
+    async def _write_merged_result(self, merger: _SubstreamMerger, attrs: Any) -> bool:
+        return await self.write_out("out", merger.write_ip(attrs))
+
     async def _write_json_result(self, payload: Any, attrs: Any) -> bool:
-        out_ip = fbp_capnp.IP.new_message(content=json.dumps(payload), attributes=attrs)
+        out_ip = codec.new_ip(payload, encoding=self.config.out_encoding, attributes=attrs)
         return await self.write_out("out", out_ip)
 
     async def run(self):
@@ -123,15 +210,15 @@ class ApplyGJsonQueries(process.Process[ApplyGJsonQueriesConfig]):
 
         in_first_level_substream = False
         nested_level = 0
-        substream_payloads: list[Any] = []
+        plan = _QueryPlan(self.config.queries)
+        merger = _SubstreamMerger(self.config.out_encoding)
         substream_attrs = None
 
         while True:
             in_msg = await self.read_in("in")
             if in_msg is None:
                 if self.config.merge_substream_results and in_first_level_substream:
-                    merged = _merge_substream_payloads(substream_payloads)
-                    if not await self._write_json_result(merged, substream_attrs or []):
+                    if not await self._write_merged_result(merger, substream_attrs or []):
                         logger.info("%s process finished", self.name)
                         return
                 break
@@ -141,7 +228,7 @@ class ApplyGJsonQueries(process.Process[ApplyGJsonQueriesConfig]):
                     if not in_first_level_substream:
                         in_first_level_substream = True
                         nested_level = 1
-                        substream_payloads = []
+                        merger = _SubstreamMerger(self.config.out_encoding)
                         substream_attrs = None
                     else:
                         nested_level += 1
@@ -156,12 +243,11 @@ class ApplyGJsonQueries(process.Process[ApplyGJsonQueriesConfig]):
                     if in_first_level_substream:
                         nested_level -= 1
                         if nested_level == 0:
-                            merged = _merge_substream_payloads(substream_payloads)
-                            if not await self._write_json_result(merged, substream_attrs or []):
+                            if not await self._write_merged_result(merger, substream_attrs or []):
                                 logger.info("%s process finished", self.name)
                                 return
                             in_first_level_substream = False
-                            substream_payloads = []
+                            merger = _SubstreamMerger(self.config.out_encoding)
                             substream_attrs = None
                 else:
                     if not await self.write_out("out", in_msg):
@@ -170,16 +256,16 @@ class ApplyGJsonQueries(process.Process[ApplyGJsonQueriesConfig]):
                 continue
 
             try:
-                parsed = json.loads(in_msg.content.as_text())
-                result = _apply_queries(parsed, self.config.queries)
-            except (json.JSONDecodeError, TypeError, ValueError) as exc:
+                parsed = codec.decode_ip_content(in_msg)
+                result = plan.apply(parsed)
+            except (TypeError, ValueError) as exc:
                 logger.warning("%s failed to apply GJSON queries: %s", self.name, exc)
                 continue
 
             if self.config.merge_substream_results and in_first_level_substream:
                 if substream_attrs is None:
                     substream_attrs = in_msg.attributes
-                substream_payloads.append(result)
+                merger.add(result)
                 continue
 
             if not await self._write_json_result(result, in_msg.attributes):
@@ -0,0 +1,177 @@
+"""JSON/MessagePack codec shared by the JSON and MONICA components.
+
+orjson (JSON) and msgspec (JSON and MessagePack) are used if they are installed, otherwise
+JSON falls back to the standard library. The fast encoders write NaN and Infinity as null, so values
+containing them are encoded by the standard library, which keeps NaN/Infinity as it always did. The content type of an IP is carried in
+`sysAttributes.contentType`. Text content without a content type is treated as JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from typing import TYPE_CHECKING, Any, Literal
+
+import numpy as np
+from mas.schema.common import common_capnp
+from mas.schema.fbp import fbp_capnp
+from pydantic import Field, field_validator
+
+from zalfmas_fbp.run import process
+
+if TYPE_CHECKING:
+    from mas.schema.fbp.fbp_capnp.types.builders import IPBuilder
+    from mas.schema.fbp.fbp_capnp.types.readers import IPReader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+type Encoding = Literal["json", "msgpack"]
+
+MSGPACK_CONTENT_TYPE = "application/vnd.msgpack"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _fast_dumps(value: Any) -> bytes:
+        return orjson.dumps(value, option=_ORJSON_OPTIONS)
+
+    _fast_loads = orjson.loads
+    _FAST_ENCODE_ERRORS: tuple[type[Exception], ...] = (TypeError,)
+
+elif msgspec is not None:
+    _fast_dumps = msgspec.json.Encoder().encode
+    _fast_loads = msgspec.json.Decoder().decode
+    _FAST_ENCODE_ERRORS = (TypeError, msgspec.EncodeError)
+
+else:
+    _fast_dumps = None
+    _fast_loads = None
+    _FAST_ENCODE_ERRORS = ()
+
+
+def _has_non_finite(value: Any) -> bool:
+    if isinstance(value, float | np.floating):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(_has_non_finite(v) for v in value.values())
+    if isinstance(value, list | tuple):
+        return any(_has_non_finite(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind == "f" and not bool(np.isfinite(value).all())
+    return False
+
+
+def _stdlib_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray | np.generic):
+        return value.tolist()
+    msg = f"Object of type {type(value).__name__} is not JSON serializable"
+    raise TypeError(msg)
+
+
+def dumps_bytes(value: Any) -> bytes:
+    if _fast_dumps is not None:
+        try:
+            data = _fast_dumps(value)
+        except _FAST_ENCODE_ERRORS:
+            # e.g. integers beyond 64 bit, which only the standard library can serialize
+            pass
+        else:
+            # NaN/Infinity became null, only then the value has to be searched for them
+            if b"null" not in data or not _has_non_finite(value):
+                return data
+    return json.dumps(value, default=_stdlib_default).encode()
+
+
+def dumps(value: Any) -> str:
+    return dumps_bytes(value).decode()
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    """Decode JSON. Malformed input raises json.JSONDecodeError, like the standard library."""
+    if _fast_loads is not None:
+        try:
+            return _fast_loads(data)
+        except ValueError:
+            # the fast decoders reject NaN/Infinity, which the standard library accepts
+            pass
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def dumps_msgpack(value: Any) -> bytes:
+    if msgspec is None:
+        msg = "MessagePack encoding requires the optional 'msgspec' package."
+        raise ValueError(msg)
+    return msgspec.msgpack.encode(value)
+
+
+def loads_msgpack(data: bytes | bytearray | memoryview) -> Any:
+    if msgspec is None:
+        msg = "MessagePack decoding requires the optional 'msgspec' package."
+        raise ValueError(msg)
+    return msgspec.msgpack.decode(data)
+
+
+class EncodingConfig(process.ProcessConfig):
+    out_encoding: Literal["json", "msgpack"] = Field(
+        "json",
+        description="Encoding of outgoing messages: 'json' text or a 'msgpack' blob (requires msgspec).",
+    )
+
+    @field_validator("out_encoding")
+    @classmethod
+    def _check_encoding_available(cls, encoding: Encoding) -> Encoding:
+        if encoding == "msgpack" and msgspec is None:
+            msg = "out_encoding 'msgpack' requires the optional 'msgspec' package."
+            raise ValueError(msg)
+        return encoding
+
+
+def encoding_of_content_type(content_type: str | None) -> Encoding:
+    return "msgpack" if content_type == MSGPACK_CONTENT_TYPE else "json"
+
+
+def ip_content_payload(ip: IPBuilder | IPReader) -> tuple[str | bytes, Encoding]:
+    """Copy the encoded content out of ip, e.g. to decode it later in another thread."""
+    if (encoding := encoding_of_content_type(process.ip_content_type(ip))) == "msgpack":
+        return bytes(ip.content.as_struct(common_capnp.Blob).data), encoding
+    return ip.content.as_text(), encoding
+
+
+def decode_payload(payload: str | bytes, encoding: Encoding) -> Any:
+    if encoding == "msgpack":
+        return loads_msgpack(payload if isinstance(payload, bytes) else payload.encode())
+    return loads(payload)
+
+
+def decode_ip_content(ip: IPBuilder | IPReader) -> Any:
+    """Decode the content of ip according to its content type."""
+    return decode_payload(*ip_content_payload(ip))
+
+
+def new_ip(value: Any, *, encoding: Encoding = "json", attributes: Any = None) -> IPBuilder:
+    """Create an IP with value encoded as JSON text or as MessagePack blob."""
+    if encoding != "msgpack":
+        return json_text_ip(dumps(value), attributes=attributes)
+    out_ip = fbp_capnp.IP.new_message(
+        content=common_capnp.Blob.new_message(contentType=MSGPACK_CONTENT_TYPE, data=dumps_msgpack(value)),
+        sysAttributes={"contentType": MSGPACK_CONTENT_TYPE},
+    )
+    if attributes is not None:
+        out_ip.attributes = attributes
+    return out_ip
+
+
+def json_text_ip(text: str, *, attributes: Any = None) -> IPBuilder:
+    """Create an IP with already encoded JSON text."""
+    out_ip = fbp_capnp.IP.new_message(content=text)
+    if attributes is not None:
+        out_ip.attributes = attributes
+    return out_ip
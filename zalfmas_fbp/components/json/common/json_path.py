@@ -0,0 +1,184 @@
+"""Compiled, cached path expressions into decoded JSON values.
+
+A path like "data/0/results" is split by a separator into object keys and list indices
+(integers, negative ones count from the end). Only paths compiled with wildcards=True treat
+a "*" segment as matching all items of a list or all values of an object, otherwise it is the
+object key "*".
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator
+from functools import lru_cache
+from typing import Any
+
+WILDCARD = "*"
+PATH_CACHE_SIZE = 1024
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+MISSING: Any = _Missing()
+"""Returned by JsonPath.get if the path can't be resolved."""
+
+
+type PathPart = str | int
+
+
+def split_path(path: str, separator: str) -> tuple[PathPart, ...]:
+    if separator == "":
+        return (path,)
+
+    parts: list[PathPart] = []
+    for part in path.split(separator):
+        if part == "":
+            continue
+        parts.append(int(part) if part.lstrip("-").isdigit() else part)
+    return tuple(parts)
+
+
+def _lenient_step(part: PathPart) -> Callable[[Any], Any]:
+    if isinstance(part, int):
+
+        def get_index(current: Any) -> Any:
+            if isinstance(current, list) and -len(current) <= part < len(current):
+                return current[part]
+            return MISSING
+
+        return get_index
+
+    def get_key(current: Any) -> Any:
+        if isinstance(current, dict):
+            return current.get(part, MISSING)
+        return MISSING
+
+    return get_key
+
+
+def _strict_get(current: Any, part: PathPart) -> Any:
+    if isinstance(part, int):
+        if not isinstance(current, list):
+            msg = f"Expected list at path segment '{part}', got {type(current).__name__}"
+            raise TypeError(msg)
+        if -len(current) <= part < len(current):
+            return current[part]
+        msg = f"list index {part} out of bounds"
+        raise IndexError(msg)
+
+    if not isinstance(current, dict) or part not in current:
+        msg = f"Path segment '{part}' not found"
+        raise KeyError(msg)
+    return current[part]
+
+
+def _children(current: Any) -> list[tuple[PathPart, Any]]:
+    if isinstance(current, list):
+        return list(enumerate(current))
+    if isinstance(current, dict):
+        return list(current.items())
+    return []
+
+
+class JsonPath:
+    """A compiled path expression. Use `compile_path` to get a cached instance."""
+
+    __slots__ = ("_getter", "_steps", "has_wildcard", "parts")
+
+    def __init__(self, parts: tuple[PathPart, ...], wildcards: bool = False):
+        self.parts = parts
+        self.has_wildcard = wildcards and WILDCARD in parts
+        self._steps = tuple(_lenient_step(part) for part in parts)
+        self._getter = self._build_getter()
+
+    def __repr__(self) -> str:
+        return f"JsonPath({self.parts!r})"
+
+    def _build_getter(self) -> Callable[[Any], Any]:
+        if self.has_wildcard:
+            return self._get_wildcard
+
+        steps = self._steps
+        if len(steps) == 0:
+            return lambda value: value
+        if len(steps) == 1:
+            return steps[0]
+
+        def get(value: Any) -> Any:
+            for step in steps:
+                value = step(value)
+                if value is MISSING:
+                    return MISSING
+            return value
+
+        return get
+
+    def _get_wildcard(self, value: Any) -> Any:
+        matches = [value]
+        for part, step in zip(self.parts, self._steps, strict=True):
+            if part == WILDCARD:
+                matches = [child for current in matches for _, child in _children(current)]
+            else:
+                matches = [child for current in matches if (child := step(current)) is not MISSING]
+        return matches
+
+    def get(self, value: Any) -> Any:
+        """Resolve the path in value, returning MISSING if it can't be resolved.
+
+        Paths with wildcards return the list of all resolvable matches.
+        """
+        return self._getter(value)
+
+    def get_strict(self, value: Any) -> Any:
+        """Resolve the path in value, raising KeyError, IndexError or TypeError if it can't be resolved."""
+        if self.has_wildcard:
+            msg = "get_strict does not support wildcard paths, use get or update."
+            raise ValueError(msg)
+        for part in self.parts:
+            value = _strict_get(value, part)
+        return value
+
+    def set(self, value: Any, new_value: Any) -> Any:
+        """Replace the existing value at the path in value and return the (new) root."""
+        return self.update(value, lambda _: new_value)
+
+    def update(self, value: Any, fn: Callable[[Any], Any]) -> Any:
+        """Replace every value matching the path by fn(value) and return the (new) root.
+
+        Without wildcards the path has to exist, like for get_strict. All matches are resolved and
+        all new values computed before anything is written, so value is unchanged if this raises.
+        """
+        if len(self.parts) == 0:
+            return fn(value)
+        targets = list(self._targets(value, 0))
+        new_values = [fn(parent[key]) for parent, key in targets]
+        for (parent, key), new_value in zip(targets, new_values, strict=True):
+            parent[key] = new_value
+        return value
+
+    def _targets(self, current: Any, i: int) -> Iterator[tuple[Any, PathPart]]:
+        """The (parent, key) pairs of the values matching the path from segment i on."""
+        part = self.parts[i]
+        last = i == len(self.parts) - 1
+        if self.has_wildcard and part == WILDCARD:
+            for key, child in _children(current):
+                if last:
+                    yield current, key
+                else:
+                    yield from self._targets(child, i + 1)
+            return
+        child = _strict_get(current, part)
+        if last:
+            yield current, part
+        else:
+            yield from self._targets(child, i + 1)
+
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def compile_path(path: str, separator: str = "/", wildcards: bool = False) -> JsonPath:
+    """Compile a path expression. Compiled paths are cached by expression, separator and wildcards."""
+    return JsonPath(split_path(path, separator), wildcards)
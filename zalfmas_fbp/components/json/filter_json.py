@@ -14,14 +14,14 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 from __future__ import annotations
 
-import json
 import logging
 from typing import Any
 
-from mas.schema.fbp import fbp_capnp
 from pydantic import Field
 from zalfmas_common import common
 
+from zalfmas_fbp.components.json.common import codec
+from zalfmas_fbp.components.json.common.json_path import MISSING, JsonPath, compile_path
 from zalfmas_fbp.run import metadata as meta
 from zalfmas_fbp.run import process
 from zalfmas_fbp.run.logging_config import configure_logging
@@ -29,10 +29,8 @@ from zalfmas_fbp.run.logging_config import configure_logging
 logger = logging.getLogger(__name__)
 configure_logging()
 
-_MISSING = object()
 
-
-class FilterJsonConfig(process.ProcessConfig):
+class FilterJsonConfig(codec.EncodingConfig):
     traversal_path: str | None = Field(
         None,
         description=(
@@ -48,7 +46,8 @@ class FilterJsonConfig(process.ProcessConfig):
         default_factory=list,
         description=(
             "List of paths to keep from each filtered item. Supports nested paths and list indices "
-            "(e.g. ['DATE', 'stats/CWAD', '0/value']). Optional aliases can be provided as "
+            "(e.g. ['DATE', 'stats/CWAD', '0/value']). A '*' segment selects all list items or object values "
+            "as a list. Optional aliases can be provided as "
             "'alias=path' (e.g. 'date=DATE')."
         ),
     )
@@ -101,38 +100,7 @@ METADATA = meta.Component(
 )
 
 
-def _split_path(path: str, separator: str) -> list[str | int]:
-    if separator == "":
-        return [path]
-
-    parts: list[str | int] = []
-    for part in path.split(separator):
-        if part == "":
-            continue
-        if part.lstrip("-").isdigit():
-            parts.append(int(part))
-        else:
-            parts.append(part)
-    return parts
-
-
-def _resolve_path(value: Any, parts: list[str | int]) -> Any:
-    current = value
-    for part in parts:
-        if isinstance(part, int):
-            if isinstance(current, list) and -len(current) <= part < len(current):
-                current = current[part]
-                continue
-            return _MISSING
-
-        if isinstance(current, dict) and part in current:
-            current = current[part]
-            continue
-        return _MISSING
-    return current
-
-
-def _parse_filter_path(entry: str, separator: str) -> tuple[str, list[str | int]]:
+def _parse_filter_path(entry: str, separator: str) -> tuple[str, JsonPath]:
     alias: str | None = None
     path = entry
     if "=" in entry:
@@ -140,28 +108,28 @@ def _parse_filter_path(entry: str, separator: str) -> tuple[str, list[str | int]
         alias = alias.strip() or None
         path = path.strip()
 
-    parts = _split_path(path, separator)
+    json_path = compile_path(path, separator)
     if alias is None:
-        alias = str(parts[-1]) if len(parts) > 0 else "value"
-    return alias, parts
+        alias = str(json_path.parts[-1]) if len(json_path.parts) > 0 else "value"
+    return alias, json_path
 
 
-def _project_item(value: Any, filters: list[tuple[str, list[str | int]]], values_only: bool) -> Any:
+def _project_item(value: Any, filters: list[tuple[str, JsonPath]], values_only: bool) -> Any:
     if len(filters) == 0:
         return value
 
     if values_only:
         out_values: list[Any] = []
-        for _, parts in filters:
-            selected = _resolve_path(value, parts)
-            if selected is not _MISSING:
+        for _, json_path in filters:
+            selected = json_path.get(value)
+            if selected is not MISSING:
                 out_values.append(selected)
         return out_values
 
     out_dict: dict[str, Any] = {}
-    for alias, parts in filters:
-        selected = _resolve_path(value, parts)
-        if selected is not _MISSING:
+    for alias, json_path in filters:
+        selected = json_path.get(value)
+        if selected is not MISSING:
             out_dict[alias] = selected
     return out_dict
 
@@ -172,7 +140,7 @@ def _should_apply_to_object_values(value: dict[str, Any]) -> bool:
 
 def _apply_filter(
     value: Any,
-    filters: list[tuple[str, list[str | int]]],
+    filters: list[tuple[str, JsonPath]],
     values_only: bool,
     flatten_values_only_lists: bool,
 ) -> Any:
@@ -193,10 +161,7 @@ def _apply_filter(
 
     if isinstance(value, dict):
         if _should_apply_to_object_values(value):
-            return {
-                k: _apply_filter(v, filters, values_only, flatten_values_only_lists)
-                for k, v in value.items()
-            }
+            return {k: _apply_filter(v, filters, values_only, flatten_values_only_lists) for k, v in value.items()}
         return _project_item(value, filters, values_only)
 
     return value
@@ -229,18 +194,18 @@ class FilterJson(process.Process[FilterJsonConfig]):
                 continue
 
             try:
-                input_json = json.loads(in_msg.content.as_text())
-            except json.JSONDecodeError as exc:
+                input_json = codec.decode_ip_content(in_msg)
+            except ValueError as exc:
                 logger.warning("%s received invalid JSON input: %s", self.name, exc)
                 continue
 
             try:
                 leaf = (
-                    _resolve_path(input_json, _split_path(self.config.traversal_path, self.config.path_separator))
+                    compile_path(self.config.traversal_path, self.config.path_separator).get(input_json)
                     if self.config.traversal_path
                     else input_json
                 )
-                if leaf is _MISSING:
+                if leaf is MISSING:
                     logger.warning(
                         "%s could not resolve traversal path '%s'. Sending null.",
                         self.name,
@@ -258,7 +223,7 @@ class FilterJson(process.Process[FilterJsonConfig]):
                 logger.warning("%s failed to filter input JSON: %s", self.name, exc)
                 filtered_json = None
 
-            out_ip = fbp_capnp.IP.new_message(content=json.dumps(filtered_json), attributes=in_msg.attributes)
+            out_ip = codec.new_ip(filtered_json, encoding=self.config.out_encoding, attributes=in_msg.attributes)
             if not await self.write_out("out", out_ip):
                 logger.info("%s process finished", self.name)
                 return
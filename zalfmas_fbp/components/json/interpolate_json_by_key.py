@@ -14,26 +14,30 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 from __future__ import annotations
 
-import json
 import logging
+from collections.abc import Sequence
 from datetime import date, datetime
+from functools import lru_cache
 from typing import Any, Literal
 
-from mas.schema.fbp import fbp_capnp
+import numpy as np
 from pydantic import Field
 from zalfmas_common import common
 
+from zalfmas_fbp.components.json.common import codec
+from zalfmas_fbp.components.json.common.json_path import MISSING, compile_path
 from zalfmas_fbp.run import metadata as meta
 from zalfmas_fbp.run import process
 from zalfmas_fbp.run.logging_config import configure_logging
 
 logger = logging.getLogger(__name__)
 configure_logging()
-_MISSING = object()
 _ALL_GROUP = "__all__"
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+X_VALUE_CACHE_SIZE = 65536
 
 
-class InterpolateJsonByKeyConfig(process.ProcessConfig):
+class InterpolateJsonByKeyConfig(codec.EncodingConfig):
     traversal_path: str | None = Field(
         None,
         description="Optional path from input root to list leaf that should be processed.",
@@ -58,11 +62,18 @@ class InterpolateJsonByKeyConfig(process.ProcessConfig):
         default_factory=list,
         description="Query x values at which interpolated y values are calculated.",
     )
+    mode: Literal["linear", "step", "nearest"] = Field(
+        "linear",
+        description=(
+            "How to calculate y between observed points: linear -> linear interpolation, "
+            "step -> y of the last observed x <= inter_x, nearest -> y of the nearest observed x (lower one on ties)."
+        ),
+    )
     extrapolation: Literal["null", "clamp", "linear"] = Field(
         "null",
         description=(
             "How to handle inter_x outside the observed x-range: "
-            "null -> y is null, clamp -> boundary y, linear -> linearly extrapolate."
+            "null -> y is null, clamp -> boundary y, linear -> linearly extrapolate (like clamp for mode step/nearest)."
         ),
     )
     on_error: Literal["keep_original", "null", "drop_message"] = Field(
@@ -104,37 +115,6 @@ METADATA = meta.Component(
 )
 
 
-def _split_path(path: str, separator: str) -> list[str | int]:
-    if separator == "":
-        return [path]
-
-    parts: list[str | int] = []
-    for part in path.split(separator):
-        if part == "":
-            continue
-        if part.lstrip("-").isdigit():
-            parts.append(int(part))
-        else:
-            parts.append(part)
-    return parts
-
-
-def _resolve_path(value: Any, parts: list[str | int]) -> Any:
-    current = value
-    for part in parts:
-        if isinstance(part, int):
-            if isinstance(current, list) and -len(current) <= part < len(current):
-                current = current[part]
-                continue
-            return _MISSING
-
-        if isinstance(current, dict) and part in current:
-            current = current[part]
-            continue
-        return _MISSING
-    return current
-
-
 def _to_x_numeric(value: Any) -> tuple[float, Literal["number", "date"]]:
     if isinstance(value, bool):
         msg = "bool is not supported as x value"
@@ -142,28 +122,34 @@ def _to_x_numeric(value: Any) -> tuple[float, Literal["number", "date"]]:
     if isinstance(value, (int, float)):
         return float(value), "number"
     if isinstance(value, str):
-        text = value.strip()
-        if text.endswith("Z"):
-            text = f"{text[:-1]}+00:00"
-
-        try:
-            return float(text), "number"
-        except ValueError:
-            pass
-
-        try:
-            return float(datetime.fromisoformat(text).date().toordinal()), "date"
-        except ValueError:
-            try:
-                return float(date.fromisoformat(text).toordinal()), "date"
-            except ValueError as exc:
-                msg = f"Invalid x value '{value}'. Supported: number or ISO date."
-                raise ValueError(msg) from exc
+        return _str_to_x_numeric(value)
 
     msg = f"Unsupported x value type: {type(value).__name__}"
     raise TypeError(msg)
 
 
+@lru_cache(maxsize=X_VALUE_CACHE_SIZE)
+def _str_to_x_numeric(value: str) -> tuple[float, Literal["number", "date"]]:
+    """Parse a number or an ISO date (as days since 1970-01-01). Cached, as daily series repeat their dates."""
+    text = value.strip()
+    if text.endswith("Z"):
+        text = f"{text[:-1]}+00:00"
+
+    try:
+        return float(text), "number"
+    except ValueError:
+        pass
+
+    try:
+        return float(datetime.fromisoformat(text).date().toordinal() - _EPOCH_ORDINAL), "date"
+    except ValueError:
+        try:
+            return float(date.fromisoformat(text).toordinal() - _EPOCH_ORDINAL), "date"
+        except ValueError as exc:
+            msg = f"Invalid x value '{value}'. Supported: number or ISO date."
+            raise ValueError(msg) from exc
+
+
 def _to_y_numeric(value: Any) -> float:
     if isinstance(value, bool):
         msg = "bool is not supported as y value"
@@ -176,65 +162,82 @@ def _to_y_numeric(value: Any) -> float:
     raise TypeError(msg)
 
 
-def _compress_points(points: list[tuple[float, float]]) -> list[tuple[float, float]]:
-    dedup: dict[float, float] = {}
-    for x_val, y_val in points:
-        dedup[x_val] = y_val
-    return sorted(dedup.items(), key=lambda p: p[0])
+class _MixedXTypesError(ValueError):
+    pass
 
 
-def _linear_interpolate(
-    points: list[tuple[float, float]],
-    x_query: float,
-    extrapolation: Literal["null", "clamp", "linear"],
-) -> float | None:
-    if len(points) == 0:
-        return None
+class _Series:
+    """Observed points of one group as sorted numpy arrays, answering batches of queries."""
 
-    if x_query <= points[0][0]:
-        if x_query == points[0][0]:
-            return points[0][1]
-        if extrapolation == "null":
-            return None
-        if extrapolation == "clamp":
-            return points[0][1]
-        if len(points) < 2:
-            return points[0][1]
-        x0, y0 = points[0]
-        x1, y1 = points[1]
-        return y0 if x1 == x0 else y0 + ((y1 - y0) * (x_query - x0) / (x1 - x0))
-
-    if x_query >= points[-1][0]:
-        if x_query == points[-1][0]:
-            return points[-1][1]
+    __slots__ = ("x", "x_type", "y")
+
+    def __init__(self, raw_x: Sequence[Any], raw_y: Sequence[Any]):
+        x_type: Literal["number", "date"] | None = None
+        x = np.empty(len(raw_x), dtype=np.float64)
+        for i, raw in enumerate(raw_x):
+            x[i], value_type = _to_x_numeric(raw)
+            if x_type is not None and value_type != x_type:
+                msg = "Mixed x value types in group."
+                raise _MixedXTypesError(msg)
+            x_type = value_type
+        y = np.fromiter((_to_y_numeric(raw) for raw in raw_y), dtype=np.float64, count=len(raw_y))
+
+        # sort by x, keeping the last observed y for duplicate x values
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+        last_of_run = np.append(x[1:] != x[:-1], True) if len(x) > 0 else np.empty(0, dtype=bool)
+        self.x = x[last_of_run]
+        self.y = y[last_of_run]
+        self.x_type = x_type or "number"
+
+    def interpolate(
+        self,
+        x_query: np.ndarray,
+        mode: Literal["linear", "step", "nearest"],
+        extrapolation: Literal["null", "clamp", "linear"],
+    ) -> list[float | None]:
+        x, y = self.x, self.y
+        if len(x) == 0:
+            return [None] * len(x_query)
+
+        if mode == "linear":
+            # np.interp clamps outside of the observed range
+            y_query = np.interp(x_query, x, y)
+        elif mode == "step":
+            y_query = y[np.clip(np.searchsorted(x, x_query, side="right") - 1, 0, len(x) - 1)]
+        else:
+            right = np.clip(np.searchsorted(x, x_query), 0, len(x) - 1)
+            left = np.clip(right - 1, 0, len(x) - 1)
+            y_query = y[np.where(x_query - x[left] <= x[right] - x_query, left, right)]
+
+        below = x_query < x[0]
+        above = x_query > x[-1]
+        if extrapolation == "linear" and mode == "linear" and len(x) > 1:
+            y_query = np.where(below, _extrapolate(x[0], y[0], x[1], y[1], x_query), y_query)
+            y_query = np.where(above, _extrapolate(x[-2], y[-2], x[-1], y[-1], x_query), y_query)
+
+        result: list[float | None] = y_query.tolist()
         if extrapolation == "null":
-            return None
-        if extrapolation == "clamp":
-            return points[-1][1]
-        if len(points) < 2:
-            return points[-1][1]
-        x0, y0 = points[-2]
-        x1, y1 = points[-1]
-        return y1 if x1 == x0 else y0 + ((y1 - y0) * (x_query - x0) / (x1 - x0))
-
-    for i in range(1, len(points)):
-        x0, y0 = points[i - 1]
-        x1, y1 = points[i]
-        if x0 <= x_query <= x1:
-            if x_query == x0:
-                return y0
-            if x_query == x1:
-                return y1
-            if x1 == x0:
-                return y1
-            return y0 + ((y1 - y0) * (x_query - x0) / (x1 - x0))
-
-    return None
+            for i in np.flatnonzero(below | above).tolist():
+                result[i] = None
+        return result
+
+
+def _extrapolate(x0: float, y0: float, x1: float, y1: float, x_query: np.ndarray) -> np.ndarray:
+    if x1 == x0:
+        return np.full_like(x_query, y0)
+    return y0 + ((y1 - y0) * (x_query - x0) / (x1 - x0))
+
+
+@lru_cache(maxsize=8)
+def _query_points(inter_x: tuple[int | float | str, ...]) -> tuple[np.ndarray, tuple[str, ...]]:
+    converted = [_to_x_numeric(x) for x in inter_x]
+    return np.array([x for x, _ in converted], dtype=np.float64), tuple(x_type for _, x_type in converted)
 
 
 def _extract_leaf_as_list(data: Any, traversal_path: str | None, path_separator: str) -> list[Any]:
-    leaf = _resolve_path(data, _split_path(traversal_path, path_separator)) if traversal_path else data
-    if leaf is _MISSING:
+    leaf = compile_path(traversal_path, path_separator).get(data) if traversal_path else data
+    if leaf is MISSING:
         msg = f"Traversal path '{traversal_path}' could not be resolved."
         raise KeyError(msg)
     if not isinstance(leaf, list):
@@ -248,65 +251,61 @@ def _group_points(
     group_key: str | None,
     x_key: str,
     y_key: str,
-) -> tuple[dict[Any, list[tuple[float, float]]], dict[Any, Literal["number", "date"]]]:
-    grouped_points: dict[Any, list[tuple[float, float]]] = {}
-    group_x_types: dict[Any, Literal["number", "date"]] = {}
+) -> dict[Any, _Series]:
+    grouped_x: dict[Any, list[Any]] = {}
+    grouped_y: dict[Any, list[Any]] = {}
 
     for item in items:
         if not isinstance(item, dict):
             continue
-        if x_key not in item or y_key not in item:
-            continue
-        if item[x_key] is None or item[y_key] is None:
+        x_val = item.get(x_key)
+        y_val = item.get(y_key)
+        if x_val is None or y_val is None:
             continue
 
         if group_key is None:
             group_val = _ALL_GROUP
-        elif group_key in item and item[group_key] is not None:
-            group_val = item[group_key]
-        else:
+        elif (group_val := item.get(group_key)) is None:
             continue
 
-        x_num, x_type = _to_x_numeric(item[x_key])
-        y_num = _to_y_numeric(item[y_key])
+        grouped_x.setdefault(group_val, []).append(x_val)
+        grouped_y.setdefault(group_val, []).append(y_val)
 
-        if group_val in group_x_types and group_x_types[group_val] != x_type:
+    grouped_series: dict[Any, _Series] = {}
+    for group_val, raw_x in grouped_x.items():
+        try:
+            grouped_series[group_val] = _Series(raw_x, grouped_y[group_val])
+        except _MixedXTypesError as exc:
             msg = f"Mixed x value types in group '{group_val}'."
-            raise ValueError(msg)
-        group_x_types[group_val] = x_type
-        grouped_points.setdefault(group_val, []).append((x_num, y_num))
-
-    for group_val, points in grouped_points.items():
-        grouped_points[group_val] = _compress_points(points)
-
-    return grouped_points, group_x_types
+            raise ValueError(msg) from exc
+    return grouped_series
 
 
 def _interpolate_grouped(
-    grouped_points: dict[Any, list[tuple[float, float]]],
-    group_x_types: dict[Any, Literal["number", "date"]],
+    grouped_series: dict[Any, _Series],
     inter_x: list[int | float | str],
     group_key: str | None,
     x_key: str,
     y_key: str,
+    mode: Literal["linear", "step", "nearest"],
     extrapolation: Literal["null", "clamp", "linear"],
 ) -> list[dict[str, Any]]:
     output: list[dict[str, Any]] = []
-    if len(grouped_points) == 0:
+    if len(grouped_series) == 0:
         return output
 
-    for group_val, points in grouped_points.items():
-        x_type = group_x_types[group_val]
-        for x_query_raw in inter_x:
-            x_query, query_type = _to_x_numeric(x_query_raw)
-            if query_type != x_type:
-                msg = f"inter_x type mismatch for group '{group_val}'. Expected {x_type}, got {query_type}."
+    x_query, query_types = _query_points(tuple(inter_x))
+    for group_val, series in grouped_series.items():
+        for query_type in query_types:
+            if query_type != series.x_type:
+                msg = f"inter_x type mismatch for group '{group_val}'. Expected {series.x_type}, got {query_type}."
                 raise ValueError(msg)
 
-            y_interp = _linear_interpolate(points, x_query, extrapolation)
+        y_interp = series.interpolate(x_query, mode, extrapolation)
+        for x_query_raw, y_val in zip(inter_x, y_interp, strict=True):
             row: dict[str, Any] = {
                 x_key: x_query_raw,
-                y_key: y_interp,
+                y_key: y_val,
             }
             if group_key is not None:
                 row[group_key] = group_val
@@ -316,19 +315,19 @@ def _interpolate_grouped(
 
 def _transform(data: Any, cfg: InterpolateJsonByKeyConfig) -> list[dict[str, Any]]:
     leaf_list = _extract_leaf_as_list(data, cfg.traversal_path, cfg.path_separator)
-    grouped_points, group_x_types = _group_points(
+    grouped_series = _group_points(
         leaf_list,
         cfg.group_key,
         cfg.x_key,
         cfg.y_key,
     )
     return _interpolate_grouped(
-        grouped_points,
-        group_x_types,
+        grouped_series,
         cfg.inter_x,
         cfg.group_key,
         cfg.x_key,
         cfg.y_key,
+        cfg.mode,
         cfg.extrapolation,
     )
 
@@ -358,8 +357,8 @@ class InterpolateJsonByKey(process.Process[InterpolateJsonByKeyConfig]):
                 continue
 
             try:
-                in_data = json.loads(in_msg.content.as_text())
-            except json.JSONDecodeError as exc:
+                in_data = codec.decode_ip_content(in_msg)
+            except ValueError as exc:
                 logger.warning("%s received invalid JSON input: %s", self.name, exc)
                 if self.config.on_error == "drop_message":
                     continue
@@ -373,7 +372,7 @@ class InterpolateJsonByKey(process.Process[InterpolateJsonByKeyConfig]):
                         continue
                     out_data = None if self.config.on_error == "null" else in_data
 
-            out_ip = fbp_capnp.IP.new_message(content=json.dumps(out_data), attributes=in_msg.attributes)
+            out_ip = codec.new_ip(out_data, encoding=self.config.out_encoding, attributes=in_msg.attributes)
             if not await self.write_out("out", out_ip):
                 logger.info("%s process finished", self.name)
                 return
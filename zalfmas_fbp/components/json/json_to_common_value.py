@@ -14,16 +14,18 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 from __future__ import annotations
 
-import json
 import logging
 import math
 from typing import Any, Literal
 
+import numpy as np
 from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
 from pydantic import Field
 from zalfmas_common import common
 
+from zalfmas_fbp.components.json.common import codec
+from zalfmas_fbp.components.json.common.json_path import MISSING, compile_path
 from zalfmas_fbp.run import metadata as meta
 from zalfmas_fbp.run import process
 from zalfmas_fbp.run.logging_config import configure_logging
@@ -32,7 +34,6 @@ from zalfmas_fbp.run.process.config.config_codec import config_value_from_python
 logger = logging.getLogger(__name__)
 configure_logging()
 
-_MISSING = object()
 
 _INT_RANGES: dict[str, tuple[int, int]] = {
     "i8": (-128, 127),
@@ -106,6 +107,14 @@ class JsonToCommonValueConfig(process.ProcessConfig):
         True,
         description="Skip message on conversion errors.",
     )
+    cache_type_hints: bool = Field(
+        False,
+        description=(
+            "Remember the Value type selected for each list position (path) in the document and try it first "
+            "for the next messages, skipping the type inspection while it still fits. A remembered type might be "
+            "larger than the smallest fitting one."
+        ),
+    )
 
 
 METADATA = meta.Component(
@@ -141,36 +150,6 @@ METADATA = meta.Component(
 )
 
 
-def _split_path(path: str, separator: str) -> list[str | int]:
-    if separator == "":
-        return [path]
-
-    parts: list[str | int] = []
-    for part in path.split(separator):
-        if part == "":
-            continue
-        if part.lstrip("-").isdigit():
-            parts.append(int(part))
-        else:
-            parts.append(part)
-    return parts
-
-
-def _resolve_path(value: Any, parts: list[str | int]) -> Any:
-    current = value
-    for part in parts:
-        if isinstance(part, int):
-            if isinstance(current, list) and -len(current) <= part < len(current):
-                current = current[part]
-                continue
-            return _MISSING
-        if isinstance(current, dict) and part in current:
-            current = current[part]
-            continue
-        return _MISSING
-    return current
-
-
 def _value_fields() -> set[str]:
     try:
         return set(common_capnp.Value.schema.fieldnames)
@@ -398,35 +377,42 @@ def _coerce_list_for_field(values: list[Any], list_field: str) -> list[Any]:
     return [_coerce_scalar_for_field(v, scalar_field) for v in values]
 
 
-def _replace_sentinels_recursive(
+def _replace_sentinels(
     value: Any,
     null_sentinel: Any,
     nan_sentinel: Any,
 ) -> tuple[Any, bool, bool]:
+    """Replace JSON null and NaN by the sentinels. Containers are changed in place, iteratively."""
     null_used = False
     nan_used = False
 
     def replace(v: Any) -> Any:
         nonlocal null_used, nan_used
-        if isinstance(v, dict):
-            return {str(k): replace(item) for k, item in v.items()}
-        if isinstance(v, list):
-            return [replace(item) for item in v]
         if v is None:
             if null_sentinel is None:
                 msg = "JSON null encountered but null_sentinel is not configured"
                 raise ValueError(msg)
             null_used = True
             return null_sentinel
-        if _is_json_nan(v):
-            if nan_sentinel is not None:
-                nan_used = True
-                return nan_sentinel
-            # Keep NaN if target type supports float.
-            return v
+        if nan_sentinel is not None and _is_json_nan(v):
+            nan_used = True
+            return nan_sentinel
+        # Keep NaN if target type supports float.
         return v
 
-    return replace(value), null_used, nan_used
+    if not isinstance(value, (dict, list)):
+        return replace(value), null_used, nan_used
+
+    stack: list[dict[str, Any] | list[Any]] = [value]
+    while stack:
+        container = stack.pop()
+        items = container.items() if isinstance(container, dict) else enumerate(container)
+        for key, item in items:
+            if isinstance(item, (dict, list)):
+                stack.append(item)
+            elif item is None or (nan_sentinel is not None and _is_json_nan(item)):
+                container[key] = replace(item)  # pyright: ignore[reportArgumentType, reportCallIssue]
+    return value, null_used, nan_used
 
 
 def _create_value_message(field: str, value: Any) -> common_capnp.types.builders.ValueBuilder:
@@ -443,14 +429,158 @@ def _sentinel_value_for_selected_type(
     return _create_value_message(scalar_type, coerced)
 
 
+# integer list candidates in the order _determine_list_field tries them
+_SMALLEST_INT_CANDIDATES = ("i8", "i16", "i32", "i64", "ui8", "ui16", "ui32", "ui64")
+_LARGEST_INT_CANDIDATES = ("ui64", "i64", "ui32", "i32", "ui16", "i16", "ui8", "i8")
+# floats beyond this can't be compared exactly with integers
+_MAX_EXACT_FLOAT_INT = 2**53
+
+
+def _numeric_array(values: list[Any]) -> np.ndarray | None:
+    """Return values as numpy array, if they are all int/float (no bool) and can be checked exactly."""
+    if len(values) == 0:
+        return None
+    types = set(map(type, values))
+    if not types <= {int, float}:
+        return None
+    try:
+        arr = np.asarray(values, dtype=np.float64 if float in types else np.int64)
+    except OverflowError:
+        return None
+    if int in types and float in types and np.abs(arr).max() > _MAX_EXACT_FLOAT_INT:
+        return None
+    return arr
+
+
+def _numeric_array_fits(arr: np.ndarray, field: str) -> bool:
+    if field in _INT_RANGES:
+        if arr.dtype.kind == "f" and not bool(np.all(np.isfinite(arr) & (arr == np.trunc(arr)))):
+            return False
+        min_val, max_val = _INT_RANGES[field]
+        return min_val <= int(arr.min()) and int(arr.max()) <= max_val
+    if field in _FLOAT_MAX:
+        finite = arr[np.isfinite(arr)] if arr.dtype.kind == "f" else arr
+        return len(finite) == 0 or float(np.abs(finite).max()) <= _FLOAT_MAX[field]
+    return False
+
+
+def _numeric_array_values(arr: np.ndarray, field: str) -> list[Any]:
+    return arr.astype(np.int64 if field in _INT_RANGES else np.float64).tolist()
+
+
+def _select_list_field(
+    values: list[Any], fields: set[str], smallest: bool, hint: str | None = None
+) -> tuple[str, list[Any]]:
+    """Select the list field for a list of scalars and return it with the coerced values.
+
+    Lists of numbers are checked vectorized. Raises TypeError if no list field fits.
+    """
+    arr = _numeric_array(values)
+    if arr is None:
+        # a numeric hint would coerce e.g. number strings, which aren't numbers without the hint
+        if hint is not None and hint[1:] not in _INT_RANGES | _FLOAT_MAX:
+            try:
+                return hint, _coerce_list_for_field(values, hint)
+            except (TypeError, ValueError):
+                pass
+        list_field = _determine_list_field(values, fields, smallest)
+        return list_field, _coerce_list_for_field(values, list_field)
+
+    if hint is not None and hint[1:] in _INT_RANGES | _FLOAT_MAX and _numeric_array_fits(arr, hint[1:]):
+        return hint, _numeric_array_values(arr, hint[1:])
+    int_candidates = _SMALLEST_INT_CANDIDATES if smallest else _LARGEST_INT_CANDIDATES
+    float_candidates = ("f32", "f64") if smallest else ("f64", "f32")
+    for candidate in (*int_candidates, *float_candidates):
+        if f"l{candidate}" in fields and _numeric_array_fits(arr, candidate):
+            return f"l{candidate}", _numeric_array_values(arr, candidate)
+
+    msg = f"List contains mixed incompatible types: {set(map(_kind_of_scalar, values))}"
+    raise TypeError(msg)
+
+
+class _ValueBuilder:
+    """Builds (nested) Values iteratively into preallocated capnp lists, without Python recursion."""
+
+    def __init__(self, cfg: JsonToCommonValueConfig, fields: set[str], type_hints: dict[tuple, str] | None = None):
+        self._cfg = cfg
+        self._fields = fields
+        # selected list field per path (object keys, '#' for list items), if type hints are used
+        self._type_hints = type_hints
+
+    def build(self, value: Any) -> tuple[common_capnp.types.builders.ValueBuilder, str]:
+        msg = common_capnp.Value.new_message()
+        return msg, self.fill(msg, value)
+
+    def fill(self, root: Any, value: Any, path: tuple = ()) -> str:
+        """Set value (automatically typed) into the Value builder root and return the selected field of root."""
+        root_field = ""
+        stack: list[tuple[Any, Any, tuple]] = [(root, value, path)]
+        while stack:
+            builder, item, item_path = stack.pop()
+            field = self._fill_one(builder, item, item_path, stack)
+            if builder is root:
+                root_field = field
+        return root_field
+
+    def _fill_one(self, builder: Any, value: Any, path: tuple, stack: list[tuple[Any, Any, tuple]]) -> str:
+        if not self._cfg.auto_select_type:
+            msg = "No usable requested_type and auto_select_type is disabled."
+            raise ValueError(msg)
+
+        if isinstance(value, dict):
+            if "lpair" not in self._fields:
+                msg = "common_capnp.Value has no 'lpair' field in current schema."
+                raise ValueError(msg)
+            pairs = builder.init("lpair", len(value))
+            for pair, (key, item) in zip(pairs, value.items(), strict=True):
+                pair.fst = str(key)
+                child_path = (*path, key) if self._type_hints is not None else path
+                stack.append((pair.snd.as_struct(common_capnp.Value), item, child_path))
+            return "lpair"
+
+        if isinstance(value, list):
+            hint = self._type_hints.get(path) if self._type_hints is not None else None
+            try:
+                list_field, coerced = _select_list_field(
+                    value, self._fields, self._cfg.optimize_smallest_type, None if hint == "lv" else hint
+                )
+                if list_field not in self._fields:
+                    msg = f"Selected list field '{list_field}' not available in schema."
+                    raise ValueError(msg)
+            except TypeError:
+                if "lv" not in self._fields:
+                    raise
+                self.fill_lv(builder, value, path, stack)
+                list_field = "lv"
+            else:
+                setattr(builder, list_field, coerced)
+            if self._type_hints is not None:
+                self._type_hints[path] = list_field
+            return list_field
+
+        field = _determine_scalar_field(value, self._fields, self._cfg.optimize_smallest_type)
+        if field not in self._fields:
+            msg = f"Selected scalar field '{field}' not available in schema."
+            raise ValueError(msg)
+        setattr(builder, field, _coerce_scalar_for_field(value, field))
+        return field
+
+    def fill_lv(self, builder: Any, values: list[Any], path: tuple, stack: list[tuple[Any, Any, tuple]]) -> None:
+        items = builder.init("lv", len(values))
+        item_path = (*path, "#") if self._type_hints is not None else path
+        stack.extend((items[i], item, item_path) for i, item in enumerate(values))
+
+
 def _build_value_auto(
     value: Any,
     cfg: JsonToCommonValueConfig,
     fields: set[str],
     *,
     use_requested_type: bool,
+    type_hints: dict[tuple, str] | None = None,
 ) -> tuple[common_capnp.types.builders.ValueBuilder, str]:
     requested = cfg.requested_type if use_requested_type and cfg.requested_type != "auto" else None
+    builder = _ValueBuilder(cfg, fields, type_hints)
 
     if isinstance(value, dict):
         if requested is not None and requested != "lpair":
@@ -464,11 +594,7 @@ def _build_value_auto(
         if "lpair" not in fields:
             msg = "common_capnp.Value has no 'lpair' field in current schema."
             raise ValueError(msg)
-        pairs = []
-        for key, item in value.items():
-            child_value, _ = _build_value_auto(item, cfg, fields, use_requested_type=False)
-            pairs.append(common_capnp.Pair.new_message(fst=str(key), snd=child_value))
-        return _create_value_message("lpair", pairs), "lpair"
+        return builder.build(value)
 
     is_list = isinstance(value, list)
     if requested:
@@ -481,11 +607,20 @@ def _build_value_auto(
             try:
                 if is_list:
                     if requested == "lv":
-                        lv_items = [_build_value_auto(item, cfg, fields, use_requested_type=False)[0] for item in value]
-                        msg = _create_value_message("lv", lv_items)
+                        msg = common_capnp.Value.new_message()
+                        stack: list[tuple[Any, Any, tuple]] = []
+                        builder.fill_lv(msg, value, (), stack)
+                        for item_builder, item, item_path in stack:
+                            builder.fill(item_builder, item, item_path)
                     elif not requested.startswith("l"):
                         msg = f"Requested scalar type '{requested}' cannot hold list input."
                         raise ValueError(msg)
+                    elif (
+                        requested[1:] in _INT_RANGES | _FLOAT_MAX
+                        and (arr := _numeric_array(value)) is not None
+                        and _numeric_array_fits(arr, requested[1:])
+                    ):
+                        msg = _create_value_message(requested, _numeric_array_values(arr, requested[1:]))
                     else:
                         coerced_list = _coerce_list_for_field(value, requested)
                         msg = _create_value_message(requested, coerced_list)
@@ -508,35 +643,19 @@ def _build_value_auto(
         msg = "No usable requested_type and auto_select_type is disabled."
         raise ValueError(msg)
 
-    if is_list:
-        try:
-            selected_field = _determine_list_field(value, fields, cfg.optimize_smallest_type)
-            if selected_field not in fields:
-                msg = f"Selected list field '{selected_field}' not available in schema."
-                raise ValueError(msg)
-            coerced_list = _coerce_list_for_field(value, selected_field)
-            return _create_value_message(selected_field, coerced_list), selected_field
-        except TypeError:
-            if "lv" not in fields:
-                raise
-            lv_items = [_build_value_auto(item, cfg, fields, use_requested_type=False)[0] for item in value]
-            return _create_value_message("lv", lv_items), "lv"
-
-    selected_field = _determine_scalar_field(value, fields, cfg.optimize_smallest_type)
-    if selected_field not in fields:
-        msg = f"Selected scalar field '{selected_field}' not available in schema."
-        raise ValueError(msg)
-    coerced_scalar = _coerce_scalar_for_field(value, selected_field)
-    return _create_value_message(selected_field, coerced_scalar), selected_field
+    return builder.build(value)
 
 
 def _build_value(
     value: Any,
     cfg: JsonToCommonValueConfig,
     fields: set[str],
+    type_hints: dict[tuple, str] | None = None,
 ) -> tuple[common_capnp.types.builders.ValueBuilder, str, dict[str, common_capnp.types.builders.ValueBuilder]]:
-    normalized, null_used, nan_used = _replace_sentinels_recursive(value, cfg.null_sentinel, cfg.nan_sentinel)
-    value_msg, selected_field = _build_value_auto(normalized, cfg, fields, use_requested_type=True)
+    normalized, null_used, nan_used = _replace_sentinels(value, cfg.null_sentinel, cfg.nan_sentinel)
+    value_msg, selected_field = _build_value_auto(
+        normalized, cfg, fields, use_requested_type=True, type_hints=type_hints
+    )
     sentinel_attrs: dict[str, common_capnp.types.builders.ValueBuilder] = {}
     if null_used:
         sentinel_attrs[cfg.null_sentinel_attr] = _sentinel_value_for_selected_type(selected_field, cfg.null_sentinel)
@@ -559,6 +678,7 @@ class JsonToCommonValue(process.Process[JsonToCommonValueConfig]):
             logger.info("%s updated config from conf port", self.name)
 
         fields = _value_fields()
+        type_hints: dict[tuple, str] | None = {} if self.config.cache_type_hints else None
 
         while True:
             in_msg = await self.read_in("in")
@@ -572,17 +692,15 @@ class JsonToCommonValue(process.Process[JsonToCommonValueConfig]):
                 continue
 
             try:
-                payload = json.loads(in_msg.content.as_text())
+                payload = codec.decode_ip_content(in_msg)
                 if self.config.traversal_path:
-                    payload = _resolve_path(
-                        payload, _split_path(self.config.traversal_path, self.config.path_separator)
-                    )
-                    if payload is _MISSING:
+                    payload = compile_path(self.config.traversal_path, self.config.path_separator).get(payload)
+                    if payload is MISSING:
                         msg = f"Could not resolve traversal_path '{self.config.traversal_path}'."
                         raise KeyError(msg)
 
-                value_msg, _selected_type, sentinel_attrs = _build_value(payload, self.config, fields)
-            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as exc:
+                value_msg, _selected_type, sentinel_attrs = _build_value(payload, self.config, fields, type_hints)
+            except (KeyError, TypeError, ValueError) as exc:
                 logger.warning("%s could not convert JSON to common_capnp.Value: %s", self.name, exc)
                 if self.config.skip_on_error:
                     continue
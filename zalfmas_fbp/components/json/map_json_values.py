@@ -14,15 +14,15 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 from __future__ import annotations
 
-import json
 import logging
 from datetime import date, datetime
 from typing import Any, Literal
 
-from mas.schema.fbp import fbp_capnp
 from pydantic import BaseModel, Field
 from zalfmas_common import common
 
+from zalfmas_fbp.components.json.common import codec
+from zalfmas_fbp.components.json.common.json_path import compile_path
 from zalfmas_fbp.run import metadata as meta
 from zalfmas_fbp.run import process
 from zalfmas_fbp.run.logging_config import configure_logging
@@ -50,7 +50,8 @@ class TransformOperation(BaseModel):
     ] = Field(description="Transformation operation to apply.")
     path: str | None = Field(
         None,
-        description="Optional path in current mapped item to transform. If omitted, transform item itself.",
+        description="""Optional path in current mapped item to transform. If omitted, transform item itself.
+        A '*' segment transforms all list items or object values.""",
     )
     value: int | float | str | None = Field(
         None,
@@ -62,11 +63,16 @@ class TransformOperation(BaseModel):
     )
 
 
-class MapJsonValuesConfig(process.ProcessConfig):
+class MapJsonValuesConfig(codec.EncodingConfig):
     path_separator: str = Field(
         "/",
         description="Separator used in operation paths.",
     )
+    path_wildcards: bool = Field(
+        False,
+        description="""If true, a '*' segment in operation paths matches all items of a list or all values of an
+        object, otherwise it is the object key '*'.""",
+    )
     operations: list[TransformOperation] = Field(
         default_factory=list,
         description=(
@@ -120,75 +126,6 @@ METADATA = meta.Component(
 )
 
 
-def _split_path(path: str, separator: str) -> list[str | int]:
-    if separator == "":
-        return [path]
-
-    parts: list[str | int] = []
-    for part in path.split(separator):
-        if part == "":
-            continue
-        if part.lstrip("-").isdigit():
-            parts.append(int(part))
-        else:
-            parts.append(part)
-    return parts
-
-
-def _get_list_item(value: list[Any], index: int) -> Any:
-    if -len(value) <= index < len(value):
-        return value[index]
-    msg = f"list index {index} out of bounds"
-    raise IndexError(msg)
-
-
-def _set_list_item(value: list[Any], index: int, item: Any) -> None:
-    if -len(value) <= index < len(value):
-        value[index] = item
-        return
-    msg = f"list index {index} out of bounds"
-    raise IndexError(msg)
-
-
-def _get_at_path(value: Any, parts: list[str | int]) -> Any:
-    current = value
-    for part in parts:
-        if isinstance(part, int):
-            if not isinstance(current, list):
-                msg = f"Expected list at path segment '{part}', got {type(current).__name__}"
-                raise TypeError(msg)
-            current = _get_list_item(current, part)
-            continue
-
-        if not isinstance(current, dict) or part not in current:
-            msg = f"Path segment '{part}' not found"
-            raise KeyError(msg)
-        current = current[part]
-    return current
-
-
-def _set_at_path(value: Any, parts: list[str | int], new_value: Any) -> Any:
-    if len(parts) == 0:
-        return new_value
-
-    parent = _get_at_path(value, parts[:-1]) if len(parts) > 1 else value
-    last = parts[-1]
-    if isinstance(last, int):
-        if not isinstance(parent, list):
-            msg = f"Expected list at path segment '{last}', got {type(parent).__name__}"
-            raise TypeError(msg)
-        _set_list_item(parent, last, new_value)
-    else:
-        if not isinstance(parent, dict):
-            msg = f"Expected object for key '{last}', got {type(parent).__name__}"
-            raise TypeError(msg)
-        if last not in parent:
-            msg = f"Path segment '{last}' not found"
-            raise KeyError(msg)
-        parent[last] = new_value
-    return value
-
-
 def _to_number(value: Any) -> float:
     if isinstance(value, bool):
         msg = "bool is not supported as number input"
@@ -286,6 +223,7 @@ def _apply_operations_to_item(
     operations: list[TransformOperation],
     path_separator: str,
     max_abs_exponent: int,
+    path_wildcards: bool = False,
 ) -> Any:
     current_item = item
     for operation in operations:
@@ -293,10 +231,10 @@ def _apply_operations_to_item(
             current_item = _apply_scalar_op(current_item, operation, max_abs_exponent)
             continue
 
-        path_parts = _split_path(operation.path, path_separator)
-        value_at_path = _get_at_path(current_item, path_parts)
-        transformed_value = _apply_scalar_op(value_at_path, operation, max_abs_exponent)
-        current_item = _set_at_path(current_item, path_parts, transformed_value)
+        current_item = compile_path(operation.path, path_separator, path_wildcards).update(
+            current_item,
+            lambda value, operation=operation: _apply_scalar_op(value, operation, max_abs_exponent),
+        )
     return current_item
 
 
@@ -305,15 +243,19 @@ def _map_json(
     operations: list[TransformOperation],
     path_separator: str,
     max_abs_exponent: int,
+    path_wildcards: bool = False,
 ) -> Any:
     if isinstance(data, list):
-        return [_apply_operations_to_item(item, operations, path_separator, max_abs_exponent) for item in data]
+        return [
+            _apply_operations_to_item(item, operations, path_separator, max_abs_exponent, path_wildcards)
+            for item in data
+        ]
     if isinstance(data, dict):
         return {
-            key: _apply_operations_to_item(value, operations, path_separator, max_abs_exponent)
+            key: _apply_operations_to_item(value, operations, path_separator, max_abs_exponent, path_wildcards)
             for key, value in data.items()
         }
-    return _apply_operations_to_item(data, operations, path_separator, max_abs_exponent)
+    return _apply_operations_to_item(data, operations, path_separator, max_abs_exponent, path_wildcards)
 
 
 class MapJsonValues(process.Process[MapJsonValuesConfig]):
@@ -341,8 +283,8 @@ class MapJsonValues(process.Process[MapJsonValuesConfig]):
                 continue
 
             try:
-                input_data = json.loads(in_msg.content.as_text())
-            except json.JSONDecodeError as exc:
+                input_data = codec.decode_ip_content(in_msg)
+            except ValueError as exc:
                 logger.warning("%s received invalid JSON input: %s", self.name, exc)
                 if self.config.on_error == "drop_message":
                     continue
@@ -354,6 +296,7 @@ class MapJsonValues(process.Process[MapJsonValuesConfig]):
                         self.config.operations,
                         self.config.path_separator,
                         self.config.max_abs_exponent,
+                        self.config.path_wildcards,
                     )
                 except (TypeError, ValueError, KeyError, IndexError, ZeroDivisionError) as exc:
                     logger.warning("%s failed to transform input JSON: %s", self.name, exc)
@@ -361,7 +304,7 @@ class MapJsonValues(process.Process[MapJsonValuesConfig]):
                         continue
                     transformed = None if self.config.on_error == "null" else input_data
 
-            out_ip = fbp_capnp.IP.new_message(content=json.dumps(transformed), attributes=in_msg.attributes)
+            out_ip = codec.new_ip(transformed, encoding=self.config.out_encoding, attributes=in_msg.attributes)
             if not await self.write_out("out", out_ip):
                 logger.info("%s process finished", self.name)
                 return
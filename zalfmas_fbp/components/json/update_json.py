@@ -13,25 +13,26 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-import json
 import logging
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, override
 
 import capnp
 from mas.schema.common import common_capnp
-from mas.schema.fbp import fbp_capnp
 from pydantic import Field
 from zalfmas_common import common
 
 import zalfmas_fbp.run.ports as p
 import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.json.common import codec
+from zalfmas_fbp.components.json.common.json_path import PATH_CACHE_SIZE
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
 
 
-class Config(process.ProcessConfig):
+class Config(codec.EncodingConfig):
     types: dict[str, str] = Field(
         {"@setup": "@0xa4b1a2ad9a77fdc7 = model/monica/sim_setup.capnp:Setup"},
         description="Define the loadable type the attribute being referenced has.",
@@ -158,7 +159,7 @@ def read_attr_value(
                     and ((sub_access_len > (1 + i) and v[1 + i + 1] != "value") or sub_access_len > i)
                 ):
                     is_json = True
-                    attr_val = json.loads(attr_val.value)
+                    attr_val = codec.loads(attr_val.value)
 
                 # is array index
                 if isinstance(field_name, int):
@@ -193,12 +194,15 @@ def read_dict_value(py_dict: dict[str, Any], v: list) -> tuple[Any, bool]:
 
 
 def split_into_parts(str_value: str, split_token: str = "/", create_int_indizes=False):
+    return list(_split_into_parts(str_value, split_token, create_int_indizes))
+
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def _split_into_parts(str_value: str, split_token: str, create_int_indizes: bool) -> tuple[str | int, ...]:
     parts = str_value.split(split_token)
     if create_int_indizes:
-        for k in range(len(parts)):
-            if parts[k].isdigit():
-                parts[k] = int(parts[k])
-    return parts
+        return tuple(int(part) if part.isdigit() else part for part in parts)
+    return tuple(parts)
 
 
 class UpdateJson(process.Process[Config]):
@@ -349,7 +353,7 @@ class UpdateJson(process.Process[Config]):
 
                 # read the 'in' message attrs
                 attrs = {kv.key: kv.value for kv in in_ip.attributes}
-                j_content = json.loads(in_ip.content.as_text())
+                j_content = codec.decode_ip_content(in_ip)
 
                 # update attrs potially with ones from 'attrs' port
                 # but only once per substream
@@ -382,8 +386,9 @@ class UpdateJson(process.Process[Config]):
                             e,
                         )
 
-                out_ip = fbp_capnp.IP.new_message(
-                    content=json.dumps(j_content),
+                out_ip = codec.new_ip(
+                    j_content,
+                    encoding=self.config.out_encoding,
                     attributes=in_ip.attributes,  # list([{"key": k, "value": v} for k, v in attrs.items()]),  # pyright: ignore
                 )
                 await self.write_out("out", out_ip)
@@ -21,11 +21,12 @@ from mas.schema.fbp import fbp_capnp
 from mas.schema.geo import geo_capnp
 from mas.schema.management import management_capnp as mgmt_capnp
 from pyproj import CRS
-from zalfmas_common import common, geo
+from zalfmas_common import common
 from zalfmas_services.management import ilr_sowing_harvest_dates as ilr
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+from zalfmas_fbp.components.geo.common.reproject import transform_coord
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -97,7 +98,7 @@ async def run_component(port_infos_reader_sr: str, config: dict):
             harvest_time = common.get_fbp_attr(in_ip, config["harvest_time_attr"]).as_text()
             crop_id = common.get_fbp_attr(in_ip, config["crop_id_attr"]).as_text()
 
-            utm = geo.transform_from_to_geo_coord(latlon, "utm32n")
+            utm = transform_coord(latlon, "utm32n")
             ilr_interpolate = ilr_seed_harvest_data[crop_id]["interpolate"]
             seed_harvest_cs = ilr_interpolate(utm.r, utm.h) if ilr_interpolate else None
 
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from zalfmas_common.model import monica_io
+
+type EnvPath = tuple[str | int, ...]
+
+ENV_TEMPLATE_CACHE_SIZE = 16
+
+# same separators as json.dumps, so a rendered env is byte-identical to dumping the merged dict
+_ITEM_SEPARATOR = ", "
+_KEY_SEPARATOR = ": "
+
+
+class _Overlay:
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class EnvTemplate:
+    """Immutable MONICA env template.
+
+    Per-IP values are never written into the template. They are passed to `render` as overlays
+    (path -> value) and spliced between the JSON fragments of the untouched parts, which are
+    serialized only once per template.
+    """
+
+    def __init__(self, env: dict[str, Any]):
+        self._env = env
+        self._fragments: dict[EnvPath, str] = {}
+
+    def get(self, path: EnvPath) -> Any:
+        """Read a value of the template. The returned value must not be modified."""
+        current: Any = self._env
+        for part in path:
+            current = current[part]
+        return current
+
+    def render(self, overlays: Mapping[EnvPath, Any]) -> str:
+        """Serialize the template with the overlays applied, without modifying the template."""
+        tree: dict[str | int, Any] = {}
+        for path, value in overlays.items():
+            if len(path) == 0:
+                msg = "An overlay path must not be empty."
+                raise ValueError(msg)
+            if any(path[:i] in overlays for i in range(1, len(path))):
+                msg = f"Overlay path {path} is nested below another overlay."
+                raise ValueError(msg)
+            node = tree
+            for part in path[:-1]:
+                node = node.setdefault(part, {})
+            node[path[-1]] = _Overlay(value)
+        return self._render(self._env, (), tree)
+
+    def _fragment(self, path: EnvPath, value: Any) -> str:
+        fragment = self._fragments.get(path)
+        if fragment is None:
+            fragment = self._fragments[path] = json.dumps(value)
+        return fragment
+
+    def _render_child(self, value: Any, path: EnvPath, sub_tree: Any) -> str:
+        if sub_tree is None:
+            return self._fragment(path, value)
+        if isinstance(sub_tree, _Overlay):
+            return json.dumps(sub_tree.value)
+        return self._render(value, path, sub_tree)
+
+    def _render(self, value: Any, path: EnvPath, tree: dict[str | int, Any]) -> str:
+        if isinstance(value, dict):
+            items = [
+                f"{json.dumps(key)}{_KEY_SEPARATOR}{self._render_child(child, (*path, key), tree.get(key))}"
+                for key, child in value.items()
+            ]
+            for key, sub_tree in tree.items():
+                if key in value:
+                    continue
+                if not isinstance(sub_tree, _Overlay):
+                    msg = f"Path segment '{key}' not found below {path}"
+                    raise KeyError(msg)
+                items.append(f"{json.dumps(key)}{_KEY_SEPARATOR}{json.dumps(sub_tree.value)}")
+            return "{" + _ITEM_SEPARATOR.join(items) + "}"
+
+        if isinstance(value, list):
+            for key in tree:
+                if not isinstance(key, int) or not 0 <= key < len(value):
+                    msg = f"List index {key} out of bounds below {path}"
+                    raise IndexError(msg)
+            items = [self._render_child(child, (*path, i), tree.get(i)) for i, child in enumerate(value)]
+            return "[" + _ITEM_SEPARATOR.join(items) + "]"
+
+        msg = f"Cannot apply overlays below atomic value at {path}"
+        raise TypeError(msg)
+
+
+def load_env_template(sim_json_path: str, crop_json_path: str, site_json_path: str, crop_id: str) -> EnvTemplate:
+    """Return the env template for the given files, re-reading them only if their modification time changed."""
+    return _load_env_template(
+        sim_json_path,
+        Path(sim_json_path).stat().st_mtime_ns,
+        crop_json_path,
+        Path(crop_json_path).stat().st_mtime_ns,
+        site_json_path,
+        Path(site_json_path).stat().st_mtime_ns,
+        crop_id,
+    )
+
+
+@lru_cache(maxsize=ENV_TEMPLATE_CACHE_SIZE)
+def _load_env_template(
+    sim_json_path: str,
+    _sim_mtime: int,
+    crop_json_path: str,
+    _crop_mtime: int,
+    site_json_path: str,
+    _site_mtime: int,
+    crop_id: str,
+) -> EnvTemplate:
+    with Path(sim_json_path).open() as _:
+        sim_json = json.load(_)
+
+    with Path(site_json_path).open() as _:
+        site_json = json.load(_)
+
+    with Path(crop_json_path).open() as _:
+        crop_json = json.load(_)
+
+    # set the current crop used for this run id
+    crop_json["cropRotation"][2] = crop_id
+
+    # create environment template from json templates
+    env = monica_io.create_env_json_from_json_config(
+        {"crop": crop_json, "site": site_json, "sim": sim_json, "climate": ""},
+    )
+    env["csvViaHeaderOptions"] = sim_json["climate.csv-options"]
+    return EnvTemplate(env)
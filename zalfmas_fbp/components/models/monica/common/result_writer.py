@@ -0,0 +1,209 @@
+"""Pooled writer for MONICA results as CSV or Parquet files.
+
+A writer is not thread-safe. It is meant to be used from a single (formatting) thread.
+"""
+
+from __future__ import annotations
+
+import csv
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Literal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from zalfmas_common.model import monica_io
+
+type OutputFormat = Literal["csv", "parquet"]
+
+
+@dataclass
+class Section:
+    """One output section of a MONICA result, e.g. the daily or the crop values."""
+
+    orig_spec: str
+    header_rows: list[list[str]]
+    rows: list[list[Any]]
+
+    @property
+    def key(self) -> tuple:
+        return self.orig_spec, tuple(tuple(row) for row in self.header_rows)
+
+
+def result_sections(result: dict[str, Any]) -> list[Section]:
+    """Format the sections of a MONICA JSON result into header and value rows."""
+    sections = []
+    for data_ in result.get("data", []):
+        results = data_.get("results", [])
+        output_ids = data_.get("outputIds", [])
+        if len(results) > 0:
+            header_rows = monica_io.write_output_header_rows(
+                output_ids,
+                include_header_row=True,
+                include_units_row=True,
+                include_time_agg=False,
+            )
+            if isinstance(results[0], dict):
+                rows = monica_io.write_output_obj(output_ids, results)
+            else:
+                rows = monica_io.write_output(output_ids, results)
+        else:
+            header_rows, rows = [], []
+        sections.append(Section(data_.get("origSpec", "").replace('"', ""), header_rows, rows))
+    return sections
+
+
+@dataclass
+class _CsvFile:
+    file: IO[str]
+    writer: Any
+    written_sections: set[tuple] = field(default_factory=set)
+
+
+@dataclass
+class _ParquetFile:
+    path: Path
+    writers: dict[int, pq.ParquetWriter] = field(default_factory=dict)
+
+
+class PooledResultWriter:
+    """Write MONICA results to files, keeping up to max_open_files buffered files open.
+
+    The least recently used file is closed if the pool is full. If a file of this run is opened
+    again, it is appended to (CSV) or continued in a new part file (Parquet, '<name>.part<n>.parquet').
+    With append=False every result replaces an already written file of the same name, like
+    writing one file per result. With append=True the rows are appended and the header rows of a
+    section are only written the first time the section occurs in a file.
+    """
+
+    def __init__(
+        self,
+        output_format: OutputFormat = "csv",
+        *,
+        append: bool = False,
+        csv_delimiter: str = ",",
+        max_open_files: int = 64,
+        flush_bytes: int = 1 << 20,
+        flush_interval: float = 5.0,
+    ):
+        self._format = output_format
+        self._append = append
+        self._csv_delimiter = csv_delimiter
+        self._max_open_files = max(1, max_open_files)
+        self._flush_bytes = max(1, flush_bytes)
+        self._flush_interval = flush_interval
+        self._open: OrderedDict[Path, _CsvFile | _ParquetFile] = OrderedDict()
+        # files written during this run and how often they were reopened
+        self._opened_count: dict[Path, int] = {}
+        self._csv_sections: dict[Path, set[tuple]] = {}
+        self._last_flush = time.monotonic()
+
+    def write(self, path: Path, sections: list[Section]) -> None:
+        if self._format == "parquet":
+            self._write_parquet(path, sections)
+        else:
+            self._write_csv(path, sections)
+        if time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        for open_file in self._open.values():
+            if isinstance(open_file, _CsvFile):
+                open_file.file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        while self._open:
+            self._close(*self._open.popitem(last=False))
+
+    def __enter__(self) -> PooledResultWriter:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def _acquire(self, path: Path, create) -> Any:
+        open_file = self._open.get(path)
+        if open_file is not None and not self._append:
+            # a new result replaces the file
+            self._close(path, self._open.pop(path))
+            self._opened_count.pop(path, None)
+            open_file = None
+        if open_file is None:
+            while len(self._open) >= self._max_open_files:
+                self._close(*self._open.popitem(last=False))
+            reopened = path in self._opened_count and self._append
+            self._opened_count[path] = self._opened_count.get(path, -1) + 1
+            open_file = self._open[path] = create(reopened)
+        else:
+            self._open.move_to_end(path)
+        return open_file
+
+    def _close(self, path: Path, open_file: _CsvFile | _ParquetFile) -> None:
+        if isinstance(open_file, _CsvFile):
+            open_file.file.close()
+            self._csv_sections[path] = open_file.written_sections
+        else:
+            for writer in open_file.writers.values():
+                writer.close()
+
+    def _write_csv(self, path: Path, sections: list[Section]) -> None:
+        def create(reopened: bool) -> _CsvFile:
+            file = path.open("a" if reopened else "w", newline="", buffering=self._flush_bytes)
+            written_sections = self._csv_sections.pop(path, set()) if reopened else set()
+            return _CsvFile(file, csv.writer(file, delimiter=self._csv_delimiter), written_sections)
+
+        csv_file = self._acquire(path, create)
+        for section in sections:
+            if len(section.header_rows) > 0:
+                if not self._append or section.key not in csv_file.written_sections:
+                    csv_file.writer.writerow([section.orig_spec])
+                    csv_file.writer.writerows(section.header_rows)
+                    csv_file.written_sections.add(section.key)
+                csv_file.writer.writerows(section.rows)
+            if not self._append:
+                csv_file.writer.writerow([])
+
+    def _write_parquet(self, path: Path, sections: list[Section]) -> None:
+        parquet_file = self._acquire(path, lambda _: _ParquetFile(path))
+        part = self._opened_count[path]
+        for i, section in enumerate(sections):
+            if len(section.header_rows) == 0:
+                continue
+            table = section_table(section)
+            writer = parquet_file.writers.get(i)
+            if writer is None:
+                section_path = _parquet_path(path, i if len(sections) > 1 else None, part)
+                writer = parquet_file.writers[i] = pq.ParquetWriter(section_path, table.schema)
+            elif not table.schema.equals(writer.schema):
+                table = table.cast(writer.schema)
+            writer.write_table(table, row_group_size=max(1, table.num_rows))
+
+
+def _parquet_path(path: Path, section_index: int | None, part: int) -> Path:
+    stem = path.stem if section_index is None else f"{path.stem}_{section_index}"
+    if part > 0:
+        stem += f".part{part}"
+    return path.with_name(f"{stem}.parquet")
+
+
+def section_table(section: Section) -> pa.Table:
+    """Convert a section into a typed table. Units are kept as field metadata, the section spec as schema metadata."""
+    names = section.header_rows[0]
+    units = section.header_rows[1] if len(section.header_rows) > 1 else [""] * len(names)
+    fields = []
+    arrays = []
+    unique_names: dict[str, int] = {}
+    for i, (name, unit) in enumerate(zip(names, units, strict=False)):
+        # MONICA writes "" for missing values of object results
+        values = [None if (v := row[i]) == "" else v for row in section.rows]
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            array = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+        count = unique_names[name] = unique_names.get(name, 0) + 1
+        fields.append(pa.field(name if count == 1 else f"{name}_{count}", array.type, metadata={"unit": unit}))
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata={"origSpec": section.orig_spec}))
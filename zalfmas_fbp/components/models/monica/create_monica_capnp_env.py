@@ -13,11 +13,14 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-import json
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import override
+from typing import Any, override
 
+import capnp
 from mas.schema.climate import climate_capnp
 from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
@@ -28,6 +31,7 @@ from zalfmas_common import common
 
 import zalfmas_fbp.run.ports as p
 import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.json.common import codec
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -62,6 +66,21 @@ class Config(process.ProcessConfig):
         "@id",
         description="Id of current env via @ out of attribute or a UUID4 will be automatically generated.",
     )
+    batch_size: int = Field(
+        1,
+        ge=1,
+        description="""Number of 'in' IPs to collect and create envs for together. Capabilities of a batch are resolved
+        concurrently and the envs are built in a thread pool. 1 creates one env after the other.""",
+    )
+    batch_substreams: bool = Field(
+        False,
+        description="Collect each substream on 'in' completely as one batch, regardless of batch_size.",
+    )
+    build_threads: int = Field(
+        4,
+        ge=1,
+        description="Number of threads used to build the envs of a batch.",
+    )
 
 
 METADATA = meta.Component(
@@ -102,11 +121,31 @@ METADATA = meta.Component(
             contentType="@0xb7fc866ef1127f7c = model/model.capnp:Env",
             desc="An Env structure with possible attached climate/soil capabilities ready to be sent to a MONICA Cap'n Proto service or component.",
         ),
+        meta.Port(
+            name="array_out",
+            type="array",
+            contentType="@0xb7fc866ef1127f7c = model/model.capnp:Env",
+            desc="""Used if 'out' is not connected. Envs are sent to the next available of the attached outputs,
+            e.g. several MONICA instances. Bracket IPs are not forwarded on this port.""",
+        ),
     ],
     config=Config,
 )
 
 
+@dataclass
+class _EnvJob:
+    """Everything needed to create one env, collected on the event loop thread."""
+
+    attrs: dict[str, Any]
+    env_payload: str | bytes
+    env_encoding: codec.Encoding
+    timeseries: Any = None
+    climate_csv_path: str | None = None
+    soil_profile: Any = None
+    soil_json: str | None = None
+
+
 class Component(process.Process[Config]):
     def __init__(
         self,
@@ -114,6 +153,225 @@ class Component(process.Process[Config]):
         con_man: common.ConnectionManager | None = None,
     ):
         super().__init__(metadata=metadata, con_man=con_man)
+        self._caps_by_sturdy_ref: dict[str, asyncio.Future] = {}
+        # values received last on the timeseries and soil ports, used once these ports are done
+        self._port_timeseries = None
+        self._port_climate_csv_path: str | None = None
+        self._port_soil_profile = None
+        self._port_soil_json: str | None = None
+
+    async def _cast_cap_or_connect_cached(self, any_pointer, interface_type):
+        """Like cast_cap_or_connect, but sturdy refs are connected only once."""
+        try:
+            st = any_pointer.as_struct(common_capnp.StructuredText)
+            sturdy_ref = st.value if st.type == "sturdyRef" else None
+        except capnp.KjException:
+            sturdy_ref = None
+        if sturdy_ref is None:
+            return await self.cast_cap_or_connect(any_pointer, interface_type)
+
+        # the connection is stored before it is awaited, so lookups of the same sturdy ref in a batch share it
+        connecting = self._caps_by_sturdy_ref.get(sturdy_ref)
+        if connecting is None:
+            connecting = self._caps_by_sturdy_ref[sturdy_ref] = asyncio.ensure_future(
+                self.cast_cap_or_connect(any_pointer, interface_type)
+            )
+        try:
+            cap, st = await connecting
+        except Exception:
+            self._forget_sturdy_ref(sturdy_ref, connecting)
+            raise
+        if cap is None:
+            self._forget_sturdy_ref(sturdy_ref, connecting)
+        return cap, st
+
+    def _forget_sturdy_ref(self, sturdy_ref: str, connecting: asyncio.Future) -> None:
+        """Connect again next time, after the connection to sturdy_ref failed."""
+        if self._caps_by_sturdy_ref.get(sturdy_ref) is connecting:
+            del self._caps_by_sturdy_ref[sturdy_ref]
+
+    async def _read_job_inputs(self, in_ip) -> tuple[_EnvJob, Any, Any, Any, Any] | None:
+        in_attrs = {kv.key: kv.value for kv in in_ip.attributes}
+
+        # Get JSON environment from either attribute or content
+        if self.config.from_attr:
+            env_str, is_capnp = p.get_attr_val(self.config.from_attr, in_attrs, as_text=True, remove=True)
+            if not is_capnp:
+                logger.warning("%s: attribute '%s' missing. Skipping IP.", self.name, self.config.from_attr)
+                return None
+            env_payload, env_encoding = env_str, "json"
+        else:
+            env_payload, env_encoding = codec.ip_content_payload(in_ip)
+        job = _EnvJob(attrs=in_attrs, env_payload=env_payload, env_encoding=env_encoding)
+
+        timeseries_port_val = None
+        if self.in_ports["timeseries"]:
+            if (timeseries_ip := await self.read_in("timeseries")) is None:
+                self.in_ports["timeseries"] = None
+            else:
+                timeseries_port_val = timeseries_ip.content
+        timeseries_attr_val, is_capnp = p.get_attr_val(
+            self.config.timeseries_attr,
+            in_attrs,
+            remove=self.config.remove_timeseries_attr,
+        )
+        timeseries_attr_val = timeseries_attr_val if is_capnp else None
+
+        soil_port_val = None
+        if self.in_ports["soil"]:
+            if (soil_ip := await self.read_in("soil")) is None:
+                self.in_ports["soil"] = None
+            else:
+                soil_port_val = soil_ip.content
+        soil_attr_val, is_capnp = p.get_attr_val(
+            self.config.soil_attr,
+            in_attrs,
+            remove=self.config.remove_soil_attr,
+        )
+        soil_attr_val = soil_attr_val if is_capnp else None
+
+        return job, timeseries_port_val, timeseries_attr_val, soil_port_val, soil_attr_val
+
+    def _set_climate_and_soil(self, job: _EnvJob, timeseries_port, timeseries_attr, soil_port, soil_attr) -> None:
+        """Apply the resolved (capability, structured text) tuples to job. Port values take precedence,
+        then attribute values (only for this job), then the last values received on the ports."""
+        timeseries_set = False
+        if timeseries_port is not None:
+            timeseries, st = timeseries_port
+            if timeseries:
+                job.timeseries = self._port_timeseries = timeseries
+                timeseries_set = True
+            elif st and st.type == "unstructured":
+                job.climate_csv_path = self._port_climate_csv_path = st.value
+                timeseries_set = True
+        if not timeseries_set and timeseries_attr is not None:
+            timeseries, st = timeseries_attr
+            if timeseries:
+                job.timeseries = timeseries
+                timeseries_set = True
+            elif st and st.type == "unstructured":
+                job.climate_csv_path = st.value
+                timeseries_set = True
+        if not timeseries_set:
+            job.timeseries = self._port_timeseries
+            job.climate_csv_path = self._port_climate_csv_path
+
+        soil_set = False
+        if soil_port is not None:
+            soil_profile, st = soil_port
+            if soil_profile:
+                job.soil_profile = self._port_soil_profile = soil_profile
+                soil_set = True
+            elif st and st.type == "json":
+                job.soil_json = self._port_soil_json = st.value
+                soil_set = True
+        if not soil_set and soil_attr is not None:
+            soil_profile, st = soil_attr
+            if soil_profile:
+                job.soil_profile = soil_profile
+                soil_set = True
+            elif st and st.type == "json":
+                job.soil_json = st.value
+                soil_set = True
+        if not soil_set:
+            job.soil_profile = self._port_soil_profile
+            job.soil_json = self._port_soil_json
+
+    async def _prepare_jobs(self, in_ips: list) -> list[_EnvJob | None]:
+        """Read the matching climate/soil inputs in order and resolve all capabilities concurrently."""
+        inputs = [await self._read_job_inputs(in_ip) for in_ip in in_ips]
+
+        async def resolve(any_pointer, interface_type):
+            return None if any_pointer is None else await self._cast_cap_or_connect_cached(any_pointer, interface_type)
+
+        resolved = await asyncio.gather(
+            *(
+                resolve(val, interface_type)
+                for job_inputs in inputs
+                if job_inputs is not None
+                for val, interface_type in zip(
+                    job_inputs[1:],
+                    (climate_capnp.TimeSeries, climate_capnp.TimeSeries, soil_capnp.Profile, soil_capnp.Profile),
+                    strict=True,
+                )
+            ),
+        )
+
+        jobs: list[_EnvJob | None] = []
+        i = 0
+        for job_inputs in inputs:
+            if job_inputs is None:
+                jobs.append(None)
+                continue
+            job = job_inputs[0]
+            self._set_climate_and_soil(job, *resolved[i : i + 4])
+            i += 4
+            jobs.append(job)
+        return jobs
+
+    @staticmethod
+    def _build_json_env(job: _EnvJob) -> str:
+        """Decode, complete and re-encode the MONICA JSON env. Runs in a worker thread in batch mode."""
+        json_env = codec.decode_payload(job.env_payload, job.env_encoding)
+        if job.climate_csv_path is not None and job.timeseries is None:
+            json_env["pathToClimateCSV"] = job.climate_csv_path
+        if job.soil_json is not None and job.soil_profile is None:
+            json_env["params"]["siteParameters"]["SoilProfileParameters"] = codec.loads(job.soil_json)
+        return codec.dumps(json_env)
+
+    def _create_env_ip(self, job: _EnvJob, json_env_str: str):
+        capnp_env = model_capnp.Env.new_message()
+        if job.timeseries is not None:
+            capnp_env.timeSeries = job.timeseries
+        if job.soil_profile is not None:
+            capnp_env.soilProfile = job.soil_profile
+        capnp_env.rest = common_capnp.StructuredText.new_message(value=json_env_str, type="json")
+
+        out_ip = fbp_capnp.IP.new_message()
+        if self.config.to_attr is not None and len(self.config.to_attr) > 0:
+            job.attrs[self.config.to_attr] = capnp_env
+        else:
+            out_ip.content = capnp_env
+        out_ip.attributes = list([{"key": k, "value": v} for k, v in job.attrs.items()])  # pyright: ignore
+        return out_ip
+
+    async def _write(self, out_ip) -> bool:
+        if self.out_ports["out"]:
+            return await self.write_out("out", out_ip)
+        return await self.write_array_out("array_out", process.ArrayOutStrategy.NEXT_AVAILABLE, out_ip)
+
+    async def _flush(self, batch: list, executor: ThreadPoolExecutor | None) -> bool:
+        """Create and send the envs for the collected IPs. Bracket IPs keep their position in the stream,
+        but are only sent on 'out', as the envs of a substream get spread over the 'array_out' ports."""
+        jobs = await self._prepare_jobs([ip for ip in batch if ip.type == "standard"])
+        build_jobs = [job for job in jobs if job is not None]
+        if executor is None:
+            json_envs = [self._build_json_env(job) for job in build_jobs]
+        else:
+            loop = asyncio.get_running_loop()
+            json_envs = await asyncio.gather(
+                *(loop.run_in_executor(executor, self._build_json_env, job) for job in build_jobs),
+                return_exceptions=True,
+            )
+
+        jobs_it = iter(jobs)
+        json_envs_it = iter(json_envs)
+        for ip in batch:
+            if ip.type != "standard":
+                if self.out_ports["out"] and not await self.write_out("out", ip):
+                    return False
+                continue
+            if (job := next(jobs_it)) is None:
+                continue
+            if isinstance(json_env := next(json_envs_it), BaseException):
+                logger.error("%s: Couldn't create env: %s", self.name, json_env)
+                continue
+            if not await self._write(self._create_env_ip(job, json_env)):
+                return False
+        return True
+
+    def _outputs_connected(self) -> bool:
+        return bool(self.out_ports["out"]) or any(self.array_out_ports.get("array_out", []))
 
     @override
     async def run(self):
@@ -121,142 +379,49 @@ class Component(process.Process[Config]):
         if await self.update_config_from_port("conf"):
             logger.info("%s updated config from conf port", self.name)
 
-        timeseries = None
-        timeseries_path = None
-        soil_profile = None
-        soil_profile_json_array = None
-        while self.in_ports["in"] and self.out_ports["out"]:
-            try:
-                in_ip = await self.read_in("in")
-                if in_ip is None:
-                    break
-                # simply forward substream open and close brackets
-                elif in_ip.type == "openBracket":
-                    if not await self.write_out("out", in_ip):
-                        logger.info("%s: error on sending on 'out' port. Process finished.", self.name)
-                        break
-                    continue
-                elif in_ip.type == "closeBracket":
-                    if not await self.write_out("out", in_ip):
-                        logger.info("%s: error on sending on 'out' port. Process finished.", self.name)
+        batch_mode = self.config.batch_size > 1 or self.config.batch_substreams
+        executor = ThreadPoolExecutor(max_workers=self.config.build_threads) if batch_mode else None
+        batch: list = []
+        batch_env_count = 0
+        substream_depth = 0
+        try:
+            while self.in_ports["in"] and self._outputs_connected():
+                try:
+                    in_ip = await self.read_in("in")
+                    if in_ip is None:
                         break
-                    continue
-
-                in_attrs = {kv.key: kv.value for kv in in_ip.attributes}
-
-                # Get JSON environment string from either attribute or content
-                if self.config.from_attr:
-                    json_env_str, is_capnp = p.get_attr_val(
-                        self.config.from_attr,
-                        in_attrs,
-                        remove=True,
-                    )
-                    if not is_capnp:
-                        json_env_str = json_env_str.as_text()
-                else:
-                    json_env_str = in_ip.content.as_text()
-
-                json_env = json.loads(json_env_str)
-
-                capnp_env = model_capnp.Env.new_message()
-
-                # Handle climate data
-                timeseries_set = False
-                # try to get timeseries from climate port
-                if self.in_ports["timeseries"]:
-                    if (timeseries_ip := await self.read_in("timeseries")) is None:
-                        self.in_port["climate"] = None
-                    else:
-                        timeseries, st_timeseries_path = await self.cast_cap_or_connect(
-                            timeseries_ip.content, climate_capnp.TimeSeries
-                        )
-                        if timeseries:
-                            capnp_env.timeSeries = timeseries
-                            timeseries_set = True
-                        elif st_timeseries_path and st_timeseries_path.type == "unstructured":
-                            json_env["pathToClimateCSV"] = timeseries_path = st_timeseries_path.value
-                            timeseries_set = True
-
-                # try to set timeseries data from attributes
-                # but only for this out IP
-                if not timeseries_set:
-                    timeseries_val, is_capnp = p.get_attr_val(
-                        self.config.timeseries_attr,
-                        in_attrs,
-                        remove=self.config.remove_timeseries_attr,
-                    )
-                    if is_capnp:
-                        attr_timeseries, st_timeseries_path = await self.cast_cap_or_connect(
-                            timeseries_val, climate_capnp.TimeSeries
-                        )
-                        if attr_timeseries:
-                            capnp_env.timeSeries = attr_timeseries
-                        elif st_timeseries_path and st_timeseries_path.type == "unstructured":
-                            json_env["pathToClimateCSV"] = st_timeseries_path.value
-
-                # if we have a previously used timeseries from the timeseries port, use these
-                elif timeseries is not None:
-                    capnp_env.timeSeries = timeseries
-                # if we have a previously used timeseries path from the timeseries port, use these
-                elif timeseries_path is not None:
-                    json_env["pathToClimateCSV"] = timeseries_path
-
-                # Handle soil data
-                soil_set = False
-                if self.in_ports["soil"]:
-                    if (soil_ip := await self.read_in("soil")) is None:
-                        self.in_port["soil"] = None
-                    else:
-                        soil_profile, soil_st = await self.cast_cap_or_connect(soil_ip.content, soil_capnp.Profile)
-                        if soil_profile:
-                            capnp_env.soilProfile = soil_profile
-                            soil_set = True
-                        elif soil_st and soil_st.type == "json":
-                            json_env["params"]["siteParameters"]["SoilProfileParameters"] = soil_profile_json_array = (
-                                json.loads(soil_st.value)
-                            )
-                            soil_set = True
-
-                # try to set soil profile from attribute
-                # set attribute profile only for outgoing IP
-                if not soil_set:
-                    soil_val, is_capnp = p.get_attr_val(
-                        self.config.soil_attr,
-                        in_attrs,
-                        remove=self.config.remove_soil_attr,
-                    )
-                    if is_capnp:
-                        attr_soil_profile, soil_st = await self.cast_cap_or_connect(soil_val, soil_capnp.Profile)
-                        if attr_soil_profile:
-                            capnp_env.soilProfile = attr_soil_profile
-                        elif soil_st and soil_st.type == "json":
-                            json_env["params"]["siteParameters"]["SoilProfileParameters"] = json.loads(soil_st.value)
-
-                # if we have a previously used soil_profile from the soil port, use these
-                elif soil_profile is not None:
-                    capnp_env.soilProfile = soil_profile
-                # if we have a previously used timeseries path from the timeseries port, use these
-                elif soil_profile_json_array is not None:
-                    json_env["params"]["siteParameters"]["SoilProfileParameters"] = soil_profile_json_array
-
-                capnp_env.rest = common_capnp.StructuredText.new_message(
-                    value=json.dumps(json_env),
-                    type="json",
-                )
-
-                out_ip = fbp_capnp.IP.new_message()
-                if self.config.to_attr is not None and len(self.config.to_attr) > 0:
-                    in_attrs[self.config.to_attr] = capnp_env
-                else:
-                    out_ip.content = capnp_env
 
-                out_ip.attributes = list([{"key": k, "value": v} for k, v in in_attrs.items()])  # pyright: ignore
-                if not await self.write_out("out", out_ip):
-                    logger.info("%s: Could not send IP.", self.name)
-                    break
+                    batch.append(in_ip)
+                    if in_ip.type == "openBracket":
+                        substream_depth += 1
+                    elif in_ip.type == "closeBracket":
+                        substream_depth = max(substream_depth - 1, 0)
+                    else:
+                        batch_env_count += 1
+
+                    if self.config.batch_substreams and substream_depth > 0:
+                        # collect the whole (first level) substream
+                        continue
+                    substream_closed = self.config.batch_substreams and in_ip.type == "closeBracket"
+                    if batch_mode and batch_env_count < self.config.batch_size and not substream_closed:
+                        continue
+
+                    to_send, batch, batch_env_count = batch, [], 0
+                    if not await self._flush(to_send, executor):
+                        logger.info("%s: Could not send IP.", self.name)
+                        break
 
-            except Exception:
-                logger.exception("%s Exception", Path(__file__).name)
+                except Exception:
+                    logger.exception("%s Exception", Path(__file__).name)
+
+            if batch and self._outputs_connected():
+                try:
+                    await self._flush(batch, executor)
+                except Exception:
+                    logger.exception("%s Exception", Path(__file__).name)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
 
         logger.info("%s process finished", self.name)
 
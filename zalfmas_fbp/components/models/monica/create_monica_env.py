@@ -13,7 +13,6 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-import json
 import logging
 import uuid
 from pathlib import Path
@@ -28,10 +27,10 @@ from mas.schema.management import management_capnp as mgmt_capnp
 from mas.schema.model import model_capnp
 from mas.schema.model.monica import sim_setup_capnp
 from mas.schema.soil import soil_capnp
-from zalfmas_common.model import monica_io
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+from zalfmas_fbp.components.models.monica.common.env_template import EnvPath, load_env_template
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -120,40 +119,6 @@ METADATA = meta.Component(
 )
 
 
-def create_env(sim, crop, site, crop_id):
-    if not hasattr(create_env, "cache"):
-        create_env.cache = {}
-
-    scsc = (sim, crop, site, crop_id)
-
-    if scsc in create_env.cache:
-        return create_env.cache[scsc]
-
-    with Path(sim).open() as _:
-        sim_json = json.load(_)
-
-    with Path(site).open() as _:
-        site_json = json.load(_)
-    # if len(scenario) > 0 and scenario[:3].lower() == "rcp":
-    #    site_json["EnvironmentParameters"]["rcp"] = scenario
-
-    with Path(crop).open() as _:
-        crop_json = json.load(_)
-
-    # set the current crop used for this run id
-    crop_json["cropRotation"][2] = crop_id
-
-    # create environment template from json templates
-    env_template = monica_io.create_env_json_from_json_config(
-        {"crop": crop_json, "site": site_json, "sim": sim_json, "climate": ""},
-    )
-
-    env_template["csvViaHeaderOptions"] = sim_json["climate.csv-options"]
-
-    create_env.cache[scsc] = env_template
-    return env_template
-
-
 def get_value(list_or_value):
     return list_or_value[0] if isinstance(list_or_value, list) else list_or_value
 
@@ -190,42 +155,46 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
             else:
                 continue
 
-            env_template = create_env(setup.simJson, setup.cropJson, setup.siteJson, setup.cropId)
+            env_template = load_env_template(setup.simJson, setup.cropJson, setup.siteJson, setup.cropId)
+            # per IP values are collected as overlays, the (cached) template itself is never modified
+            overlays: dict[EnvPath, Any] = {}
 
-            env_template["params"]["userCropParameters"]["__enable_vernalisation_factor_fix__"] = (
-                setup.useVernalisationFix
-            )
+            overlays["params", "userCropParameters", "__enable_vernalisation_factor_fix__"] = setup.useVernalisationFix
 
             if "ilr" in config:
                 ilr, is_capnp = p.get_config_val(config, "ilr", attrs, as_struct=mgmt_capnp.ILRDates, remove=True)
                 if is_capnp:
-                    worksteps = env_template["cropRotation"][0]["worksteps"]
-                    sowing_ws = next(filter(lambda ws: ws["type"][-6:] == "Sowing", worksteps))
+                    worksteps_path = ("cropRotation", 0, "worksteps")
+                    worksteps = env_template.get(worksteps_path)
+                    sowing_ws_path = (
+                        *worksteps_path,
+                        next(i for i, ws in enumerate(worksteps) if ws["type"][-6:] == "Sowing"),
+                    )
                     if ilr._has("sowing"):
                         s = ilr.sowing
-                        sowing_ws["date"] = f"{s.year:04d}-{s.month:02d}-{s.day:02d}"
+                        overlays[*sowing_ws_path, "date"] = f"{s.year:04d}-{s.month:02d}-{s.day:02d}"
                     if ilr._has("earliestSowing"):
                         s = ilr.earliestSowing
-                        sowing_ws["earliest-date"] = f"{s.year:04d}-{s.month:02d}-{s.day:02d}"
+                        overlays[*sowing_ws_path, "earliest-date"] = f"{s.year:04d}-{s.month:02d}-{s.day:02d}"
                     if ilr._has("latestSowing"):
                         s = ilr.latestSowing
-                        sowing_ws["latest-date"] = f"{s.year:04d}-{s.month:02d}-{s.day:02d}"
+                        overlays[*sowing_ws_path, "latest-date"] = f"{s.year:04d}-{s.month:02d}-{s.day:02d}"
 
-                    harvest_ws = next(filter(lambda ws: ws["type"][-7:] == "Harvest", worksteps))
+                    harvest_ws_path = (
+                        *worksteps_path,
+                        next(i for i, ws in enumerate(worksteps) if ws["type"][-7:] == "Harvest"),
+                    )
                     if ilr._has("harvest"):
                         h = ilr.harvest
-                        harvest_ws["date"] = f"{h.year:04d}-{h.month:02d}-{h.day:02d}"
+                        overlays[*harvest_ws_path, "date"] = f"{h.year:04d}-{h.month:02d}-{h.day:02d}"
                     if ilr._has("latestHarvest"):
                         h = ilr.latestHarvest
-                        harvest_ws["latest-date"] = f"{h.year:04d}-{h.month:02d}-{h.day:02d}"
+                        overlays[*harvest_ws_path, "latest-date"] = f"{h.year:04d}-{h.month:02d}-{h.day:02d}"
 
-            env_template["params"]["userCropParameters"]["__enable_T_response_leaf_expansion__"] = (
+            overlays["params", "userCropParameters", "__enable_T_response_leaf_expansion__"] = (
                 setup.leafExtensionModifier
             )
 
-            # print("soil:", soil_profile)
-            # env_template["params"]["siteParameters"]["SoilProfileParameters"] = soil_profile.layers
-
             if setup.elevation and "dgm" in config:
                 height_nn, is_capnp = p.get_config_val(
                     config,
@@ -234,54 +203,45 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
                     as_struct=grid_capnp.Grid.Value,
                     remove=True,
                 )
-                env_template["params"]["siteParameters"]["heightNN"] = height_nn.f if is_capnp else height_nn
+                overlays["params", "siteParameters", "heightNN"] = height_nn.f if is_capnp else height_nn
 
             if setup.slope and "slope" in config:
                 slope, is_capnp = p.get_config_val(config, "slope", attrs, as_struct=grid_capnp.Grid.Value, remove=True)
-                env_template["params"]["siteParameters"]["slope"] = (slope.f if is_capnp else slope) / 100.0
+                overlays["params", "siteParameters", "slope"] = (slope.f if is_capnp else slope) / 100.0
 
             if setup.latitude:
-                env_template["params"]["siteParameters"]["Latitude"] = ll_coord.lat
+                overlays["params", "siteParameters", "Latitude"] = ll_coord.lat
 
             if setup.co2 > 0:
-                env_template["params"]["userEnvironmentParameters"]["AtmosphericCO2"] = setup.co2
+                overlays["params", "userEnvironmentParameters", "AtmosphericCO2"] = setup.co2
 
             if setup.o3 > 0:
-                env_template["params"]["userEnvironmentParameters"]["AtmosphericO3"] = setup.o3
+                overlays["params", "userEnvironmentParameters", "AtmosphericO3"] = setup.o3
 
+            crop_params_path = ("cropRotation", 0, "worksteps", 0, "crop", "cropParams")
             if setup.fieldConditionModifier:
-                env_template["cropRotation"][0]["worksteps"][0]["crop"]["cropParams"]["species"][
-                    "FieldConditionModifier"
-                ] = setup.fieldConditionModifier
+                overlays[*crop_params_path, "species", "FieldConditionModifier"] = setup.fieldConditionModifier
 
             if len(setup.stageTemperatureSum) > 0:
                 stage_ts = setup.stageTemperatureSum.split("_")
                 stage_ts = [int(temp_sum) for temp_sum in stage_ts]
-                orig_stage_ts = env_template["cropRotation"][0]["worksteps"][0]["crop"]["cropParams"]["cultivar"][
-                    "StageTemperatureSum"
-                ][0]
+                stage_ts_path = (*crop_params_path, "cultivar", "StageTemperatureSum", 0)
+                orig_stage_ts = env_template.get(stage_ts_path)
                 if len(stage_ts) != len(orig_stage_ts):
-                    stage_ts = orig_stage_ts
                     logger.warning(
                         "The provided StageTemperatureSum array is not "
                         "sufficiently long. Falling back to original StageTemperatureSum",
                     )
+                else:
+                    overlays[stage_ts_path] = stage_ts
 
-                env_template["cropRotation"][0]["worksteps"][0]["crop"]["cropParams"]["cultivar"][
-                    "StageTemperatureSum"
-                ][0] = stage_ts
-
-            env_template["params"]["simulationParameters"]["UseNMinMineralFertilisingMethod"] = setup.fertilization
-            env_template["params"]["simulationParameters"]["UseAutomaticIrrigation"] = setup.irrigation
+            overlays["params", "simulationParameters", "UseNMinMineralFertilisingMethod"] = setup.fertilization
+            overlays["params", "simulationParameters", "UseAutomaticIrrigation"] = setup.irrigation
 
-            env_template["params"]["simulationParameters"]["NitrogenResponseOn"] = setup.nitrogenResponseOn
-            env_template["params"]["simulationParameters"]["WaterDeficitResponseOn"] = setup.waterDeficitResponseOn
-            env_template["params"]["simulationParameters"]["EmergenceMoistureControlOn"] = (
-                setup.emergenceMoistureControlOn
-            )
-            env_template["params"]["simulationParameters"]["EmergenceFloodingControlOn"] = (
-                setup.emergenceFloodingControlOn
-            )
+            overlays["params", "simulationParameters", "NitrogenResponseOn"] = setup.nitrogenResponseOn
+            overlays["params", "simulationParameters", "WaterDeficitResponseOn"] = setup.waterDeficitResponseOn
+            overlays["params", "simulationParameters", "EmergenceMoistureControlOn"] = setup.emergenceMoistureControlOn
+            overlays["params", "simulationParameters", "EmergenceFloodingControlOn"] = setup.emergenceFloodingControlOn
 
             if "id" in config:
                 id_, is_capnp = p.get_config_val(config, "id", attrs, as_text=True, remove=False)
@@ -289,7 +249,7 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
                 id_ = str(uuid.uuid4())
                 attrs["id"] = id_
 
-            env_template["customId"] = {
+            overlays[("customId",)] = {
                 "setup_id": setup.runId,
                 "id": id_,
                 "crop_id": setup.cropId,
@@ -310,7 +270,7 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
                 if is_capnp:
                     capnp_env.timeSeries = timeseries
                 else:
-                    env_template["pathToClimateCSV"] = timeseries
+                    overlays[("pathToClimateCSV",)] = timeseries
 
             if "soil" in config:
                 soil_profile, is_capnp = p.get_config_val(
@@ -323,9 +283,9 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
                 if is_capnp:
                     capnp_env.soilProfile = soil_profile
                 else:
-                    env_template["params"]["siteParameters"]["SoilProfileParameters"] = soil_profile
+                    overlays["params", "siteParameters", "SoilProfileParameters"] = soil_profile
 
-            capnp_env.rest = common_capnp.StructuredText.new_message(value=json.dumps(env_template), type="json")
+            capnp_env.rest = common_capnp.StructuredText.new_message(value=env_template.render(overlays), type="json")
             out_ip = common_capnp.IP.new_message(
                 content=capnp_env,
                 attributes=list([{"key": k, "value": v} for k, v in attrs.items()]),
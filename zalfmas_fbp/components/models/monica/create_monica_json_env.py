@@ -13,7 +13,6 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-import json
 import logging
 from typing import override
 
@@ -24,12 +23,13 @@ from zalfmas_common.model import monica_io
 
 import zalfmas_fbp.run.ports as p
 import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.json.common import codec
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
 
 
-class Config(process.ProcessConfig):
+class Config(codec.EncodingConfig):
     to_attr: str | None = Field(
         None,
         description="Set output into this attribute.",
@@ -105,11 +105,11 @@ class Component(process.Process[Config]):
                         },
                     )
 
-                    out_ip = fbp_capnp.IP.new_message()
                     if self.config.to_attr is not None and len(self.config.to_attr) > 0:
-                        out_ip.attributes = [{"key": self.config.to_attr, "value": json.dumps(env_template)}]  # pyright: ignore
+                        out_ip = fbp_capnp.IP.new_message()
+                        out_ip.attributes = [{"key": self.config.to_attr, "value": codec.dumps(env_template)}]  # pyright: ignore
                     else:
-                        out_ip.content = json.dumps(env_template)
+                        out_ip = codec.new_ip(env_template, encoding=self.config.out_encoding)
                     if not await self.write_out("out", out_ip):
                         logger.info("%s: Could not send IP. Process finished.", self.name)
 
@@ -0,0 +1,262 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+import asyncio
+import io
+import logging
+import re
+from pathlib import Path
+from typing import Any, Literal, override
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from mas.schema.common import common_capnp
+from mas.schema.fbp import fbp_capnp
+from pydantic import Field
+from zalfmas_common import common
+
+import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.json.common import codec
+from zalfmas_fbp.components.json.update_json import read_attr_value, read_dict_value
+from zalfmas_fbp.components.models.monica.common.result_writer import result_sections, section_table
+from zalfmas_fbp.run import metadata as meta
+
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_CONTENT_TYPE = common_capnp.MimeTypes.applicationVndApacheParquet
+
+
+class Config(process.ProcessConfig):
+    types: dict[str, str] = Field(
+        {"@object": "@0xa4b1a2ad9a77fdc7 = model/monica/sim_setup.capnp:Setup"},
+        description="Define the loadable type the attribute being referenced has.",
+    )
+    from_attr: str | None = Field(
+        None,
+        description="Get the MONICA result from attribute 'from_attr'.",
+    )
+    metadata_columns: dict[str, str] = Field(
+        {},
+        description="""Columns added to every table, e.g. {"row": "customId/row", "run": "@object/id"}.
+        A value starting with @ refers to an attribute (its type has to be defined in 'types' for sub access),
+        otherwise it is a path into the result. Names are keys in objects and numbers indizes in lists.""",
+    )
+    batch_rows: int = Field(
+        65536,
+        ge=1,
+        description="Collect at least this number of rows per section before a table is sent or written.",
+    )
+    output: Literal["arrow_ipc", "parquet", "dataset"] = Field(
+        "arrow_ipc",
+        description="""'arrow_ipc' and 'parquet' send each table as (chunked) blob on 'out'. 'dataset' writes
+        the tables as Parquet files to 'dataset_dir/<section>/part-<n>.parquet' and sends the file paths on 'out'.""",
+    )
+    dataset_dir: str = Field(
+        "out/results/",
+        description="Root directory of the Parquet dataset, if output is 'dataset'.",
+    )
+    section_attr: str = Field(
+        "section",
+        description="Name of the attribute carrying the section name on the outgoing IPs.",
+    )
+
+
+METADATA = meta.Component(
+    category=meta.Category(
+        id="models/monica",
+        name="Models/MONICA",
+    ),
+    info=meta.Info(
+        id="3b6f0f57-0a6e-4bd4-8f38-5a4b0c2f7e21",
+        name="MONICA results to Arrow",
+        description="Convert MONICA JSON results into Arrow tables, one per output section.",
+    ),
+    type="process",
+    inPorts=[
+        meta.Port(
+            name="conf",
+            contentType="@0xed6c098b67cad454 = common/common.capnp:StructuredText[JSON | TOML]",
+        ),
+        meta.Port(
+            name="in",
+            contentType="Text (JSON)",
+            desc="Receive MONICA JSON result.",
+        ),
+    ],
+    outPorts=[
+        meta.Port(
+            name="out",
+            contentType=f"common.capnp:Blob[{ARROW_STREAM_CONTENT_TYPE} | {PARQUET_CONTENT_TYPE}] | Text",
+            desc="""Tables as chunked Arrow IPC stream or Parquet blobs with the section name attribute,
+            or the paths of the written dataset files.""",
+        ),
+    ],
+    config=Config,
+)
+
+
+def section_dir_name(orig_spec: str, index: int) -> str:
+    name = re.sub(r"[^\w.-]+", "_", orig_spec).strip("_.")
+    return name or f"section_{index}"
+
+
+class Component(process.Process[Config]):
+    def __init__(
+        self,
+        metadata: meta.Component = METADATA,
+        con_man: common.ConnectionManager | None = None,
+    ):
+        super().__init__(metadata=metadata, con_man=con_man)
+        self._section_names: dict[tuple, str] = {}
+        self._tables: dict[tuple, list[pa.Table]] = {}
+        self._rows: dict[tuple, int] = {}
+        self._parts: dict[str, int] = {}
+
+    def _metadata_values(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        """Resolve the attribute metadata columns. Result paths are resolved after decoding."""
+        values: dict[str, Any] = {}
+        for name, expr in self.config.metadata_columns.items():
+            path = [int(part) if part.isdigit() else part for part in expr.split("/")]
+            if path[0].startswith("@"):
+                value, success = read_attr_value(self.config.types, attrs, path)
+                values[name] = _column_value(value) if success else None
+            else:
+                values[name] = path
+        return values
+
+    @staticmethod
+    def _convert(jstr: str, metadata_values: dict[str, Any]) -> list[tuple[tuple, pa.Table]]:
+        result = codec.loads(jstr)
+        columns = {}
+        for name, value in metadata_values.items():
+            if isinstance(value, list):
+                value, success = read_dict_value(result, value)
+                value = _column_value(value) if success else None
+            columns[name] = value
+
+        tables = []
+        for section in result_sections(result):
+            if len(section.header_rows) == 0:
+                continue
+            table = section_table(section)
+            for i, (name, value) in enumerate(columns.items()):
+                table = table.add_column(i, name, pa.array([value] * table.num_rows))
+            tables.append((section.key, table))
+        return tables
+
+    def _section_name(self, key: tuple) -> str:
+        if (name := self._section_names.get(key)) is None:
+            name = section_dir_name(key[0], len(self._section_names))
+            if name in self._section_names.values():
+                name = f"{name}_{len(self._section_names)}"
+            self._section_names[key] = name
+        return name
+
+    def _write_dataset_part(self, name: str, table: pa.Table) -> str:
+        part = self._parts[name] = self._parts.get(name, -1) + 1
+        dir_ = Path(self.config.dataset_dir) / name
+        dir_.mkdir(parents=True, exist_ok=True)
+        path = dir_ / f"part-{part:05d}.parquet"
+        pq.write_table(table, path)
+        return str(path)
+
+    @staticmethod
+    def _table_bytes(table: pa.Table, output: str) -> bytes:
+        sink = io.BytesIO()
+        if output == "parquet":
+            pq.write_table(table, sink)
+        else:
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+        return sink.getvalue()
+
+    async def _emit(self, key: tuple) -> bool:
+        tables = self._tables.pop(key, [])
+        self._rows.pop(key, None)
+        if len(tables) == 0:
+            return True
+        table = pa.concat_tables(tables, promote_options="permissive")
+        name = self._section_name(key)
+        attributes = [{"key": self.config.section_attr, "value": name}]
+
+        if self.config.output == "dataset":
+            path = await asyncio.to_thread(self._write_dataset_part, name, table)
+            if self.out_ports["out"]:
+                return await self.write_out("out", fbp_capnp.IP.new_message(content=path, attributes=attributes))
+            return True
+
+        if not self.out_ports["out"]:
+            return False
+        data = await asyncio.to_thread(self._table_bytes, table, self.config.output)
+        content_type = PARQUET_CONTENT_TYPE if self.config.output == "parquet" else ARROW_STREAM_CONTENT_TYPE
+        out_ip = process.blob_ip(data, content_type=content_type)
+        out_ip.attributes = attributes
+        return await self.write_out_chunked("out", out_ip)
+
+    @override
+    async def run(self):
+        logger.info("%s process running", self.name)
+        if await self.update_config_from_port("conf"):
+            logger.info("%s updated config from conf port", self.name)
+
+        while self.in_ports["in"]:
+            try:
+                in_ip = await self.read_in("in")
+                if in_ip is None:
+                    self.in_ports["in"] = None
+                    continue
+                if in_ip.type != "standard":
+                    continue
+
+                attrs = {kv.key: kv.value for kv in in_ip.attributes}
+                content_attr = common.get_fbp_attr(in_ip, self.config.from_attr)
+                jstr = (
+                    content_attr.as_struct(common_capnp.StructuredText).value
+                    if content_attr
+                    else in_ip.content.as_struct(common_capnp.StructuredText).value
+                )
+
+                for key, table in await asyncio.to_thread(self._convert, jstr, self._metadata_values(attrs)):
+                    self._tables.setdefault(key, []).append(table)
+                    self._rows[key] = self._rows.get(key, 0) + table.num_rows
+                    if self._rows[key] >= self.config.batch_rows and not await self._emit(key):
+                        logger.info("%s: Could not send table.", self.name)
+                        self.in_ports["in"] = None
+                        break
+
+            except Exception:
+                logger.exception("%s Exception", Path(__file__).name)
+
+        for key in list(self._tables):
+            try:
+                if not await self._emit(key):
+                    break
+            except Exception:
+                logger.exception("%s Exception", Path(__file__).name)
+
+        logger.info("%s: process finished", self.name)
+
+
+def _column_value(value: Any) -> Any:
+    return value if value is None or isinstance(value, (bool, int, float, str)) else str(value)
+
+
+def main():
+    process.run_process_from_metadata_and_cmd_args(Component(METADATA), METADATA)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,19 +15,21 @@
 # Landscape Systems Analysis at the ZALF.
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-import csv
-import json
+import asyncio
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import override
+from typing import Any, Literal, override
 
 from mas.schema.common import common_capnp
 from pydantic import Field
 from zalfmas_common import common
-from zalfmas_common.model import monica_io
 
 import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.json.common import codec
 from zalfmas_fbp.components.json.update_json import read_attr_value, read_dict_value
+from zalfmas_fbp.components.models.monica.common.result_writer import PooledResultWriter, result_sections
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -62,6 +64,31 @@ class Config(process.ProcessConfig):
         ",",
         description="Like ','. Use this string as delimiter for csv output.",
     )
+    output_format: Literal["csv", "parquet"] = Field(
+        "csv",
+        description="""Write CSV files or Parquet files. Parquet files get the suffix '.parquet' and, if a result
+        has more than one section, the section index appended to the name, e.g. 'csv_1_0.parquet'.""",
+    )
+    append: bool = Field(
+        False,
+        description="""Append results resolving to the same file name instead of replacing the file.
+        The header rows of a section are written only once per file.""",
+    )
+    max_open_files: int = Field(
+        64,
+        ge=1,
+        description="Number of files kept open. The least recently used file is closed if more files are needed.",
+    )
+    flush_bytes: int = Field(
+        1 << 20,
+        ge=1,
+        description="Size of the write buffer per open file in bytes.",
+    )
+    flush_interval: float = Field(
+        5.0,
+        ge=0,
+        description="Flush the buffers of all open files at least every flush_interval seconds (while results arrive).",
+    )
 
 
 METADATA = meta.Component(
@@ -98,90 +125,119 @@ class Component(process.Process[Config]):
     ):
         super().__init__(metadata=metadata, con_man=con_man)
 
+    def _file_name_parts(self, attrs: dict[str, Any]) -> list[tuple[str, list | str | None]]:
+        """Split filepath_pattern into literal text and the values of the {...} expressions. Attribute
+        expressions are resolved here, as they reference capnp values. Result expressions are kept as
+        path lists, to be resolved when the result has been decoded."""
+        file_pattern = self.config.filepath_pattern
+        parts: list[tuple[str, list | str | None]] = []
+        while (i := file_pattern.find("{")) != -1 and (k := file_pattern.find("}", i + 1)) != -1 and k > i + 1:
+            path = [int(part) if part.isdigit() else part for part in file_pattern[i + 1 : k].split("/")]
+            if not path[0].startswith("@"):
+                parts.append((file_pattern[:i], path))
+            else:
+                attr_val, success = read_attr_value(self.config.types, attrs, path)
+                parts.append((file_pattern[:i], str(attr_val) if success else None))
+            file_pattern = file_pattern[k + 1 :]
+        parts.append((file_pattern, ""))
+        return parts
+
+    @staticmethod
+    def _write_result(
+        writer: PooledResultWriter,
+        dir_: Path,
+        file_name_parts: list[tuple[str, list | str | None]],
+        count: int,
+        jstr: str,
+    ) -> None:
+        """Decode, format and write one result. Runs in the formatting thread."""
+        result = codec.loads(jstr)
+        file_name = ""
+        for text, value in file_name_parts:
+            if isinstance(value, list):
+                value, success = read_dict_value(result, value)
+                value = str(value) if success else None
+            file_name += text + (str(count) if value is None else value)
+        writer.write(dir_ / file_name, result_sections(result))
+
     @override
     async def run(self):
         logger.info("%s process running", self.name)
         if await self.update_config_from_port("conf"):
             logger.info("%s updated config from conf port", self.name)
 
-        count = 0
-        while self.in_ports["in"]:
+        writer = PooledResultWriter(
+            self.config.output_format,
+            append=self.config.append,
+            csv_delimiter=self.config.csv_delimiter,
+            max_open_files=self.config.max_open_files,
+            flush_bytes=self.config.flush_bytes,
+            flush_interval=self.config.flush_interval,
+        )
+        # a single thread, so results are written in order and the writer is used by one thread only
+        executor = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_running_loop()
+        pending: deque[asyncio.Future] = deque()
+        created_dirs: set[Path] = set()
+
+        async def wait_for_oldest():
             try:
-                in_ip = await self.read_in("in")
-                if in_ip is None:
-                    self.in_ports["in"] = None
-                    continue
-
-                attrs = {kv.key: kv.value for kv in in_ip.attributes}
-                count += 1
-                out_path_attr = common.get_fbp_attr(in_ip, self.config.out_path_attr)
-                out_path = out_path_attr.as_text() if out_path_attr else self.config.path_to_out_dir
-
-                content_attr = common.get_fbp_attr(in_ip, self.config.from_attr)
-                jstr = (
-                    content_attr.as_struct(common_capnp.StructuredText).value
-                    if content_attr
-                    else in_ip.content.as_struct(common_capnp.StructuredText).value
-                )
-                result = json.loads(jstr)
-
-                dir_ = Path(out_path)
-                if not (dir_.is_dir() and dir_.exists()):
-                    try:
-                        dir_.mkdir(parents=True)
-                    except OSError:
-                        logger.exception("%s: Couldn't create dir: %s ! Exiting.", self.name, dir_)
-                        return
-
-                file_pattern = self.config.filepath_pattern
-                file_name = ""
-                while (i := file_pattern.find("{")) != -1 and (k := file_pattern.find("}", i + 1)) != -1 and k > i + 1:
-                    file_name += file_pattern[:i]
-                    expr = file_pattern[i + 1 : k]
-                    parts = expr.split("/")
-                    for j in range(len(parts)):
-                        if parts[j].isdigit():
-                            parts[j] = int(parts[j])
-                    if len(parts) > 0 and not parts[0].startswith("@"):
-                        attr_val, success = read_dict_value(result, parts)
-                    elif len(parts) > 0:
-                        attr_val, success = read_attr_value(self.config.types, attrs, parts)
-                    else:
-                        success = False
-                    file_name += str(attr_val) if success else str(count)
-                    file_pattern = file_pattern[k + 1 :]
-                file_name += file_pattern
-
-                filepath = dir_ / file_name
-                with filepath.open("w") as _:
-                    writer = csv.writer(_, delimiter=self.config.csv_delimiter)
-
-                    for data_ in result.get("data", []):
-                        results = data_.get("results", [])
-                        orig_spec = data_.get("origSpec", "")
-                        output_ids = data_.get("outputIds", [])
-
-                        if len(results) > 0:
-                            writer.writerow([orig_spec.replace('"', "")])
-                            for row in monica_io.write_output_header_rows(
-                                output_ids,
-                                include_header_row=True,
-                                include_units_row=True,
-                                include_time_agg=False,
-                            ):
-                                writer.writerow(row)
-
-                            if isinstance(results[0], dict):
-                                for row in monica_io.write_output_obj(output_ids, results):
-                                    writer.writerow(row)
-                            else:
-                                for row in monica_io.write_output(output_ids, results):
-                                    writer.writerow(row)
-
-                        writer.writerow([])
-
+                await pending.popleft()
             except Exception:
-                logger.exception("%s Exception", Path(__file__).name)
+                logger.exception("%s: Couldn't write result.", self.name)
+
+        count = 0
+        try:
+            while self.in_ports["in"]:
+                try:
+                    in_ip = await self.read_in("in")
+                    if in_ip is None:
+                        self.in_ports["in"] = None
+                        continue
+
+                    attrs = {kv.key: kv.value for kv in in_ip.attributes}
+                    count += 1
+                    out_path_attr = common.get_fbp_attr(in_ip, self.config.out_path_attr)
+                    out_path = out_path_attr.as_text() if out_path_attr else self.config.path_to_out_dir
+
+                    content_attr = common.get_fbp_attr(in_ip, self.config.from_attr)
+                    jstr = (
+                        content_attr.as_struct(common_capnp.StructuredText).value
+                        if content_attr
+                        else in_ip.content.as_struct(common_capnp.StructuredText).value
+                    )
+
+                    dir_ = Path(out_path)
+                    if dir_ not in created_dirs:
+                        try:
+                            dir_.mkdir(parents=True, exist_ok=True)
+                        except OSError:
+                            logger.exception("%s: Couldn't create dir: %s ! Exiting.", self.name, dir_)
+                            return
+                        created_dirs.add(dir_)
+
+                    pending.append(
+                        loop.run_in_executor(
+                            executor,
+                            self._write_result,
+                            writer,
+                            dir_,
+                            self._file_name_parts(attrs),
+                            count,
+                            jstr,
+                        ),
+                    )
+                    # bound the number of results waiting to be written
+                    if len(pending) > self.config.max_open_files:
+                        await wait_for_oldest()
+
+                except Exception:
+                    logger.exception("%s Exception", Path(__file__).name)
+        finally:
+            while pending:
+                await wait_for_oldest()
+            await loop.run_in_executor(executor, writer.close)
+            executor.shutdown()
 
         logger.info("%s: process finished", self.name)
 
@@ -13,10 +13,15 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
+import asyncio
+import itertools
 import json
 import logging
 import time
+from collections import defaultdict
+from collections.abc import Iterator
 from datetime import date, datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
@@ -30,7 +35,8 @@ import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
 from zalfmas_fbp.run import metadata as meta
 
-from ..geo import get_lat_lon_grid_value as shared
+from ..geo.common.mapped_grid import load_grid_mapped
+from .common.soil_profiles import SoilProfiles
 
 if TYPE_CHECKING:
     pass
@@ -70,6 +76,90 @@ METADATA = meta.Component(
 )
 
 
+@lru_cache(maxsize=16)
+def _read_text(path: str, mtime_ns: int) -> str:
+    return Path(path).read_text()
+
+
+def read_json_template(path: Path) -> dict[str, Any]:
+    """Parse the JSON file at path, which is read only again after it changed."""
+    return json.loads(_read_text(str(path), path.stat().st_mtime_ns))
+
+
+def set_crop_params(env: dict[str, Any], params: dict[str, Any]) -> None:
+    """Set the calibration params into the species or cultivar params of the sown crops of env."""
+    for cm in env["cropRotation"]:
+        for ws in cm["worksteps"]:
+            if "Sowing" not in ws["type"] or not isinstance(ws.get("crop"), dict):
+                continue
+            ps = ws["crop"]["cropParams"]
+            for pname, pval in params.items():
+                if pname in ps["species"]:
+                    ps["species"][pname] = pval
+                elif pname in ps["cultivar"]:
+                    ps["cultivar"][pname] = pval
+
+
+class EnvTemplates:
+    """The env template of a setup, built once and only again after its JSON templates changed on disk.
+
+    Every round gets a copy of the template with the round's calibration params set.
+    """
+
+    def __init__(self, path_to_repo: Path, setup: dict[str, Any], config: dict[str, Any]):
+        self._path_to_repo = path_to_repo
+        self._setup = setup
+        self._paths = [path_to_repo / setup.get(name, config[name]) for name in ("sim.json", "site.json", "crop.json")]
+        self._mtimes: tuple[int, ...] | None = None
+        self._env_json = ""
+
+    def sim_json(self) -> dict[str, Any]:
+        """The sim.json template with the start and end date of the setup."""
+        sim_json = read_json_template(self._paths[0])
+        # change start and end date according to setup
+        if self._setup["start_date"]:
+            sim_json["climate.csv-options"]["start-date"] = str(self._setup["start_date"])
+        if self._setup["end_date"]:
+            sim_json["climate.csv-options"]["end-date"] = str(self._setup["end_date"])
+        sim_json["include-file-base-path"] = str(self._path_to_repo / sim_json["include-file-base-path"])
+        return sim_json
+
+    def env_template(self, params: dict[str, Any]) -> dict[str, Any]:
+        """A copy of the env template with the calibration params set."""
+        mtimes = tuple(path.stat().st_mtime_ns for path in self._paths)
+        if mtimes != self._mtimes:
+            self._env_json = json.dumps(self._create_env_template())
+            self._mtimes = mtimes
+        env_template = json.loads(self._env_json)
+        set_crop_params(env_template, params)
+        return env_template
+
+    def _create_env_template(self) -> dict[str, Any]:
+        setup = self._setup
+        scenario = setup["scenario"]
+
+        # read template site.json
+        site_json = read_json_template(self._paths[1])
+        if len(scenario) > 0 and scenario[:3].lower() == "ssp":
+            site_json["EnvironmentParameters"]["rcp"] = f"rcp{scenario[-2:]}"
+
+        # read template crop.json
+        crop_json = read_json_template(self._paths[2])
+        # set current crop
+        for ws in crop_json["cropRotation"][0]["worksteps"]:
+            if "Sowing" in ws["type"]:
+                ws["crop"][2] = setup["crop"]
+
+        crop_json["CropParameters"]["__enable_vernalisation_factor_fix__"] = (
+            setup["use_vernalisation_fix"] if "use_vernalisation_fix" in setup else False
+        )
+
+        # create environment template from json templates
+        return monica_io.create_env_json_from_json_config(
+            {"crop": crop_json, "site": site_json, "sim": self.sim_json(), "climate": ""},
+        )
+
+
 def check_for_nill_dates(mgmt):
     for key, value in mgmt.items():
         if "date" in key and value == "Nill":
@@ -112,7 +202,6 @@ def mgmt_date_to_rel_date(mgmt_date):
 
 
 async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
-    import numpy as np
     from netCDF4 import Dataset
 
     pc = await p.PortConnector.create_from_port_infos_reader(
@@ -231,56 +320,10 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
         soil_datasets[elem] = ds
         soil_vars[elem] = ds.variables[data["var"]]
 
-    def create_soil_profile(row, col):
-        # skip first 4.5cm layer and just use 7 layers
-        layers = []
-
-        layer_depth = 8
-        # find the fill value for the soil data
-        for elem2 in soil_data.keys():
-            for i in range(8):
-                if np.ma.is_masked(soil_vars[elem2][i, row, col]):
-                    layer_depth = min(layer_depth, i)
-                    break
-        layer_depth -= 1
-
-        if layer_depth < 4:
-            return None
-
-        for i, real_depth_cm, monica_depth_m in [
-            (0, 4.5, 0),
-            (1, 9.1, 0.1),
-            (2, 16.6, 0.1),
-            (3, 28.9, 0.1),
-            (4, 49.3, 0.2),
-            (5, 82.9, 0.3),
-            (6, 138.3, 0.6),
-            (7, 229.6, 0.7),
-        ][1:]:
-            if i <= layer_depth:
-                layers.append(
-                    {
-                        "Thickness": [monica_depth_m, "m"],
-                        "SoilOrganicCarbon": [
-                            soil_vars["corg"][i, row, col] * soil_data["corg"]["conv_factor"],
-                            "%",
-                        ],
-                        "SoilBulkDensity": [
-                            soil_vars["bd"][i, row, col] * soil_data["bd"]["conv_factor"],
-                            "kg m-3",
-                        ],
-                        "Sand": [
-                            soil_vars["sand"][i, row, col] * soil_data["sand"]["conv_factor"],
-                            "fraction",
-                        ],
-                        "Clay": [
-                            soil_vars["clay"][i, row, col] * soil_data["clay"]["conv_factor"],
-                            "fraction",
-                        ],
-                    },
-                )
-        return layers
-
+    soil_profiles = SoilProfiles(
+        soil_vars,
+        {elem: data["conv_factor"] for elem, data in soil_data.items()},
+    )
     setup = None
     if len(run_setups) > 1 and run_setups[0] not in setups:
         logger.error("More than one setup given or given setup not in list of setups.")
@@ -290,50 +333,18 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
         setup = setups[setup_id]
     assert setup is not None
 
-    region = setup["region"] if "region" in setup else config["region"]
-    coords = []
-    params = {}
+    config_region = setup["region"] if "region" in setup else config["region"]
+    env_templates = EnvTemplates(Path(config["path_to_repo"]), setup, config)
 
-    start_component_time = time.perf_counter()
-    # as long as we get parameters, we create the envs
-    while pc.out_ports["env"] and pc.in_ports["params"] and (pc.in_ports["coords"] or pc.in_ports["region"]):
-        sent_env_count = 0
-        try:
-            if pc.in_ports["region"]:
-                msg = pc.in_ports["region"].read().wait()
-                if msg.which() == "done":
-                    pc.in_ports["region"] = None
-                else:
-                    region_ip = msg.value.as_struct(fbp_capnp.IP)
-                    region = region_ip.content.as_text()
-
-            # read the coordinates
-            if pc.in_ports["coords"]:
-                msg = pc.in_ports["coords"].read().wait()
-                if msg.which() == "done":
-                    pc.in_ports["coords"] = None
-                else:
-                    coords_ip = msg.value.as_struct(fbp_capnp.IP)
-                    coords = json.loads(coords_ip.content.as_text())
-
-            # read the parameters to be calibrated
-            if pc.in_ports["params"]:
-                msg = pc.in_ports["params"].read().wait()
-                if msg.which() == "done":
-                    pc.in_ports["params"] = None
-                    continue
-                params_ip = msg.value.as_struct(fbp_capnp.IP)
-                params = json.loads(params_ip.content.as_text())
-        except Exception:
-            logger.exception("%s Exception", Path(__file__).name)
-            continue
-
-        start_setup_time = time.perf_counter()
+    def round_envs(region: str, coords: list, params: dict) -> Iterator[str | dict]:
+        """Yield the serialized envs of a round and finally the env template for the round's last message.
 
+        Runs in a worker thread, the envs of a round are built one after the other.
+        """
+        env_count = 0
         gcm = setup["gcm"]
         scenario = setup["scenario"]
         ensmem = setup["ensmem"]
-        crop = setup["crop"]
 
         if setup["region"] == "nigeria":
             planting = setup["planting"].lower()
@@ -347,69 +358,32 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
         else:
             planting = nitrogen = management = None
 
-        eco_data = shared.load_grid_cached(
+        eco_data = load_grid_mapped(
             paths["path-to-data-dir"]
             + "/agro_ecological_regions_nigeria/agro-eco-regions_0.038deg_4326_wgs84_nigeria.asc",
             int,
         )
-        crop_mask_data = shared.load_grid_cached(
+        crop_mask_data = load_grid_mapped(
             paths["path-to-data-dir"] + f"/{setup['crop']}-mask_0.083deg_4326_wgs84_africa.asc.gz",
             int,
         )
-        planting_data = shared.load_grid_cached(
+        planting_data = load_grid_mapped(
             paths["path-to-data-dir"] + f"/{setup['crop']}-planting-doy_0.5deg_4326_wgs84_africa.asc",
             int,
         )
-        harvest_data = shared.load_grid_cached(
+        harvest_data = load_grid_mapped(
             paths["path-to-data-dir"] + f"/{setup['crop']}-harvest-doy_0.5deg_4326_wgs84_africa.asc",
             int,
         )
-        height_data = shared.load_grid_cached(paths["path-to-data-dir"] + "/../" + setup["path_to_dem_asc_grid"], float)
-        slope_data = shared.load_grid_cached(
+        height_data = load_grid_mapped(paths["path-to-data-dir"] + "/../" + setup["path_to_dem_asc_grid"], float)
+        slope_data = load_grid_mapped(
             paths["path-to-data-dir"] + "/../" + setup["path_to_slope_asc_grid"],
             float,
         )
 
-        # read template sim.json
-        with (Path(config["path_to_repo"]) / setup.get("sim.json", config["sim.json"])).open() as _:
-            sim_json = json.load(_)
-        # change start and end date according to setup
-        if setup["start_date"]:
-            sim_json["climate.csv-options"]["start-date"] = str(setup["start_date"])
-        if setup["end_date"]:
-            sim_json["climate.csv-options"]["end-date"] = str(setup["end_date"])
-        sim_json["include-file-base-path"] = str(Path(config["path_to_repo"]) / sim_json["include-file-base-path"])
-
-        # read template site.json
-        with (Path(config["path_to_repo"]) / setup.get("site.json", config["site.json"])).open() as _:
-            site_json = json.load(_)
-
-        if len(scenario) > 0 and scenario[:3].lower() == "ssp":
-            site_json["EnvironmentParameters"]["rcp"] = f"rcp{scenario[-2:]}"
-
-        # read template crop.json
-        with (Path(config["path_to_repo"]) / setup.get("crop.json", config["crop.json"])).open() as _:
-            crop_json = json.load(_)
-            # set current crop
-            for ws in crop_json["cropRotation"][0]["worksteps"]:
-                if "Sowing" in ws["type"]:
-                    ws["crop"][2] = crop
-            # set value of calibration params
-            ps = crop_json["crops"][crop]["cropParams"]
-            for pname, pval in params.items():
-                if pname in ps["species"]:
-                    ps["species"][pname] = pval
-                elif pname in ps["cultivar"]:
-                    ps["cultivar"][pname] = pval
-
-        crop_json["CropParameters"]["__enable_vernalisation_factor_fix__"] = (
-            setup["use_vernalisation_fix"] if "use_vernalisation_fix" in setup else False
-        )
-
-        # create environment template from json templates
-        env_template = monica_io.create_env_json_from_json_config(
-            {"crop": crop_json, "site": site_json, "sim": sim_json, "climate": ""},
-        )
+        sim_json = env_templates.sim_json()
+        # the env template is only built again if its JSON templates changed
+        env_template = env_templates.env_template(params)
 
         c_lon_0 = -179.75
         c_lat_0 = +89.25
@@ -418,6 +392,11 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
         s_lat_0 = region_to_lat_lon_bounds["earth"][config["resolution"]]["tl"]["lat"]
         s_lon_0 = region_to_lat_lon_bounds["earth"][config["resolution"]]["tl"]["lon"]
 
+        # read the soil of all cells at once
+        soil_profiles.profiles(
+            [(int((s_lat_0 - lat) / s_resolution), int((lon - s_lon_0) / s_resolution)) for lat, lon, _ in coords]
+        )
+
         for lat, lon, country_id in coords:
             c_col = int((lon - c_lon_0) / c_resolution)
             c_row = int((c_lat_0 - lat) / c_resolution)
@@ -429,41 +408,41 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
             mgmt = None
             aer = None
             if region == "nigeria":
-                aer = eco_data["value"](lat, lon, False)
+                aer = eco_data.value(lat, lon)
                 if aer and aer > 0 and aer in management:
                     mgmt = management[aer]
             else:
                 mgmt = {}
-                planting_doy = planting_data["value"](lat, lon, False)
+                planting_doy = planting_data.value(lat, lon)
                 if planting_doy:
                     d = date(2023, 1, 1) + timedelta(days=planting_doy - 1)
                     mgmt["Sowing date"] = f"0000-{d.month:02}-{d.day:02}"
-                harvest_doy = harvest_data["value"](lat, lon, False)
+                harvest_doy = harvest_data.value(lat, lon)
                 if harvest_doy:
                     d = date(2023, 1, 1) + timedelta(days=harvest_doy - 1)
                     mgmt["Harvest date"] = f"0000-{d.month:02}-{d.day:02}"
 
             valid_mgmt = False
-            if mgmt and shared.check_for_nill_dates(mgmt) and len(mgmt) > 1:
+            if mgmt and check_for_nill_dates(mgmt) and len(mgmt) > 1:
                 valid_mgmt = True
                 for ws in env_template["cropRotation"][0]["worksteps"]:
                     if ws["type"] == "Sowing" and "Sowing date" in mgmt:
-                        ws["date"] = shared.mgmt_date_to_rel_date(mgmt["Sowing date"])
+                        ws["date"] = mgmt_date_to_rel_date(mgmt["Sowing date"])
                         if "Planting density" in mgmt:
                             ws["PlantDensity"] = [
                                 float(mgmt["Planting density"]),
                                 "plants/m2",
                             ]
                     elif ws["type"] == "Harvest" and "Harvest date" in mgmt:
-                        ws["date"] = shared.mgmt_date_to_rel_date(mgmt["Harvest date"])
+                        ws["date"] = mgmt_date_to_rel_date(mgmt["Harvest date"])
                     elif ws["type"] == "AutomaticHarvest" and "Harvest date" in mgmt:
-                        ws["latest-date"] = shared.mgmt_date_to_rel_date(mgmt["Harvest date"])
+                        ws["latest-date"] = mgmt_date_to_rel_date(mgmt["Harvest date"])
                     elif ws["type"] == "Tillage" and "Tillage date" in mgmt:
-                        ws["date"] = shared.mgmt_date_to_rel_date(mgmt["Tillage date"])
+                        ws["date"] = mgmt_date_to_rel_date(mgmt["Tillage date"])
                     elif ws["type"] == "MineralFertilization" and mgmt[:2] == "N " and mgmt[-5:] == " date":
                         app_no = int(ws["application"])
                         app_str = str(app_no) + ["st", "nd", "rd", "th"][app_no - 1]
-                        ws["date"] = shared.mgmt_date_to_rel_date(mgmt[f"N {app_str} date"])
+                        ws["date"] = mgmt_date_to_rel_date(mgmt[f"N {app_str} date"])
                         ws["amount"] = [
                             float(mgmt[f"N {app_str} application (kg/ha)"]),
                             "kg",
@@ -473,19 +452,19 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
             if not mgmt or not valid_mgmt:
                 continue
 
-            crop_mask_value = crop_mask_data["value"](lat, lon, False)
+            crop_mask_value = crop_mask_data.value(lat, lon)
             if not crop_mask_value or crop_mask_value == 0:
                 continue
 
-            height_nn = height_data["value"](lat, lon, False)
+            height_nn = height_data.value(lat, lon)
             if not height_nn:
                 continue
 
-            slope = slope_data["value"](lat, lon, False)
+            slope = slope_data.value(lat, lon)
             if not slope:
                 slope = 0
 
-            soil_profile = create_soil_profile(s_row, s_col)
+            soil_profile = soil_profiles.profile(s_row, s_col)
             if not soil_profile or len(soil_profile) == 0:
                 continue
 
@@ -548,56 +527,146 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
             env_template["customId"] = {
                 "lat": lat,
                 "lon": lon,
-                "env_id": sent_env_count + 1,
+                "env_id": env_count + 1,
                 "nodata": False,
                 "country_id": country_id,
             }
 
+            yield json.dumps(env_template)
+            env_count += 1
+
+        yield env_template
+
+    # rounds (region, coords, params) read from the in ports, waiting to be built
+    rounds: asyncio.Queue[tuple[int, str, list, dict] | None] = asyncio.Queue(
+        maxsize=max(1, int(config.get("max_queued_rounds", 2)))
+    )
+    # built envs, or the template of a round's last message, waiting to be sent
+    envs: asyncio.Queue[tuple[int, str | dict] | None] = asyncio.Queue(
+        maxsize=max(1, int(config.get("max_queued_envs", 1000)))
+    )
+    build_chunk_size = max(1, int(config.get("build_chunk_size", 100)))
+    # number of built, but not yet sent envs per round
+    in_flight: dict[int, int] = {}
+    round_start_times: dict[int, float] = {}
+
+    async def read_rounds():
+        region = config_region
+        coords = []
+        params = {}
+        round_no = 0
+        while pc.in_ports["params"] and (pc.in_ports["coords"] or pc.in_ports["region"]):
             try:
-                await pc.out_ports["env"].write(
-                    value=fbp_capnp.IP.new_message(
-                        content=model_capnp.Env.new_message(
-                            rest=common_capnp.StructuredText.new_message(
-                                value=json.dumps(env_template),
-                                structure={"json": None},
-                            ),
-                        ),
-                    ),
-                )
+                if pc.in_ports["region"]:
+                    msg = await pc.in_ports["region"].read()
+                    if msg.which() == "done":
+                        pc.in_ports["region"] = None
+                    else:
+                        region_ip = msg.value.as_struct(fbp_capnp.IP)
+                        region = region_ip.content.as_text()
+
+                # read the coordinates
+                if pc.in_ports["coords"]:
+                    msg = await pc.in_ports["coords"].read()
+                    if msg.which() == "done":
+                        pc.in_ports["coords"] = None
+                    else:
+                        coords_ip = msg.value.as_struct(fbp_capnp.IP)
+                        coords = json.loads(coords_ip.content.as_text())
+
+                # read the parameters to be calibrated
+                if pc.in_ports["params"]:
+                    msg = await pc.in_ports["params"].read()
+                    if msg.which() == "done":
+                        pc.in_ports["params"] = None
+                        continue
+                    params_ip = msg.value.as_struct(fbp_capnp.IP)
+                    params = json.loads(params_ip.content.as_text())
             except Exception:
                 logger.exception("%s Exception", Path(__file__).name)
                 continue
 
-            sent_env_count += 1
-
-        # send a last message will be just forwarded by monica to signify last
-        if env_template:
-            env_template["pathToClimateCSV"] = ""
-            env_template["customId"] = {
-                "no_of_sent_envs": sent_env_count,
-                "nodata": True,
-            }
+            round_no += 1
+            await rounds.put((round_no, region, coords, params))
+        await rounds.put(None)
+
+    async def build_envs():
+        while (next_round := await rounds.get()) is not None:
+            round_no, region, coords, params = next_round
+            round_start_times[round_no] = time.perf_counter()
+            in_flight[round_no] = 0
+            built = round_envs(region, coords, params)
+            round_ended = False
             try:
-                await pc.out_ports["env"].write(
-                    value=fbp_capnp.IP.new_message(
-                        content=model_capnp.Env.new_message(
-                            rest=common_capnp.StructuredText.new_message(
-                                value=json.dumps(env_template),
-                                structure={"json": None},
-                            ),
-                        ),
-                    ),
-                )
+                while chunk := await asyncio.to_thread(list, itertools.islice(built, build_chunk_size)):
+                    for env in chunk:
+                        if isinstance(env, str):
+                            in_flight[round_no] += 1
+                        else:
+                            round_ended = True
+                        await envs.put((round_no, env))
             except Exception:
                 logger.exception("%s Exception", Path(__file__).name)
+                if not round_ended:
+                    # still send the round's last message with the envs sent so far, else the consumer waits forever
+                    await envs.put((round_no, {}))
+        await envs.put(None)
+
+    async def write_env(env_json: str) -> bool:
+        try:
+            await pc.out_ports["env"].write(
+                value=fbp_capnp.IP.new_message(
+                    content=model_capnp.Env.new_message(
+                        rest=common_capnp.StructuredText.new_message(
+                            value=env_json,
+                            structure={"json": None},
+                        ),
+                    ),
+                ),
+            )
+        except Exception:
+            logger.exception("%s Exception", Path(__file__).name)
+            return False
+        return True
+
+    async def write_envs():
+        sent_env_counts: dict[int, int] = defaultdict(int)
+        while pc.out_ports["env"] and (item := await envs.get()) is not None:
+            round_no, env = item
+            if isinstance(env, str):
+                in_flight[round_no] -= 1
+                if await write_env(env):
+                    sent_env_counts[round_no] += 1
                 continue
 
-        stop_setup_time = time.perf_counter()
-        print_str = f"{Path(__file__).name}: {datetime.now()} Sending {sent_env_count} envs took {stop_setup_time - start_setup_time} seconds\n"
-        logger.info("%s", print_str.rstrip())
-        with path_to_out_file.open("a") as _:
-            _.write(print_str)
+            # send a last message will be just forwarded by monica to signify last
+            sent_env_count = sent_env_counts.pop(round_no, 0)
+            env["pathToClimateCSV"] = ""
+            env["customId"] = {
+                "no_of_sent_envs": sent_env_count,
+                "nodata": True,
+            }
+            await write_env(json.dumps(env))
+            del in_flight[round_no]
 
+            stop_setup_time = time.perf_counter()
+            start_setup_time = round_start_times.pop(round_no)
+            print_str = f"{Path(__file__).name}: {datetime.now()} Sending {sent_env_count} envs took {stop_setup_time - start_setup_time} seconds\n"
+            logger.info("%s", print_str.rstrip())
+            with path_to_out_file.open("a") as _:
+                _.write(print_str)
+
+    start_component_time = time.perf_counter()
+    # reading new parameter sets, building envs and sending them overlap
+    reader = asyncio.create_task(read_rounds())
+    builder = asyncio.create_task(build_envs())
+    await write_envs()
+    for task in (reader, builder):
+        task.cancel()
+    await asyncio.gather(reader, builder, return_exceptions=True)
+    for round_no, unsent in in_flight.items():
+        if unsent > 0:
+            logger.warning("%s: %d envs of round %d were not sent", Path(__file__).name, unsent, round_no)
     stop_component_time = time.perf_counter()
     print_str = f"{Path(__file__).name}: {datetime.now()} Running component took {stop_component_time - start_component_time} seconds\n"
     logger.info("%s", print_str.rstrip())
@@ -620,6 +689,9 @@ default_config = {
     "path_to_out": "out/",
     "run-setups": "[1]",
     "resolution": "5min",  # 30sec,
+    "max_queued_rounds": 2,  # parameter rounds read ahead while the current round is built
+    "max_queued_envs": 1000,  # built envs waiting to be sent
+    "build_chunk_size": 100,  # envs built per worker thread call
     "port:conf": "[TOML string] -> component configuration",
     "port:coords": None,  # [lat,lon,country_id] :string json serialized array of array
     "port:region": None,  # africa | nigeria | earth :string
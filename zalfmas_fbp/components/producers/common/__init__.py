@@ -0,0 +1 @@
+"""Shared helpers for producer components."""
@@ -0,0 +1,94 @@
+"""MONICA soil profiles from layered global soil netCDF variables (layer, row, col).
+
+Instead of reading every layer of every cell separately, the bounding window of all requested cells
+is read with one slice per variable, and the profiles of all cells are built from these arrays.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+import numpy as np
+
+# (netCDF layer index, real depth [cm], MONICA layer thickness [m]), the first 4.5cm layer is skipped
+LAYERS = [
+    (1, 9.1, 0.1),
+    (2, 16.6, 0.1),
+    (3, 28.9, 0.1),
+    (4, 49.3, 0.2),
+    (5, 82.9, 0.3),
+    (6, 138.3, 0.6),
+    (7, 229.6, 0.7),
+]
+NO_OF_LAYERS = 8
+MIN_LAYER_DEPTH = 4
+# maximum number of cells per variable read at once
+MAX_WINDOW_CELLS = 1 << 20
+
+type Cell = tuple[int, int]
+
+
+class SoilProfiles:
+    """Builds and caches the soil profiles of (row, col) cells.
+
+    soil_vars maps the elements sand, clay, corg and bd to their netCDF variables,
+    conv_factors maps them to the factor converting the stored values to MONICA units.
+    """
+
+    def __init__(self, soil_vars: Mapping[str, Any], conv_factors: Mapping[str, float]):
+        self.soil_vars = soil_vars
+        self.conv_factors = conv_factors
+        self._cache: dict[Cell, list[dict[str, Any]] | None] = {}
+
+    def profile(self, row: int, col: int) -> list[dict[str, Any]] | None:
+        return self.profiles([(row, col)])[row, col]
+
+    def profiles(self, cells: Sequence[Cell]) -> dict[Cell, list[dict[str, Any]] | None]:
+        """The soil profiles (or None if the soil is too shallow) of the cells."""
+        missing = sorted({cell for cell in cells if cell not in self._cache})
+        if missing:
+            cols = [col for _, col in missing]
+            col_0 = min(cols)
+            width = max(cols) - col_0 + 1
+            max_rows = max(1, MAX_WINDOW_CELLS // width)
+            band: list[Cell] = []
+            for cell in missing:
+                if band and cell[0] - band[0][0] >= max_rows:
+                    self._read_window(band, col_0, width)
+                    band = []
+                band.append(cell)
+            self._read_window(band, col_0, width)
+        return {cell: self._cache[cell] for cell in cells}
+
+    def _read_window(self, cells: list[Cell], col_0: int, width: int) -> None:
+        row_0 = cells[0][0]
+        rows = np.array([row for row, _ in cells]) - row_0
+        cols = np.array([col for _, col in cells]) - col_0
+        height = int(rows.max()) + 1
+
+        values: dict[str, np.ndarray] = {}
+        # index of the first masked layer of each cell, over all elements
+        first_masked = np.full(len(cells), NO_OF_LAYERS)
+        for elem, var in self.soil_vars.items():
+            window = np.ma.asarray(var[:NO_OF_LAYERS, row_0 : row_0 + height, col_0 : col_0 + width])
+            mask = np.ma.getmaskarray(window)[:, rows, cols]
+            first_masked = np.minimum(first_masked, np.where(mask.any(axis=0), mask.argmax(axis=0), NO_OF_LAYERS))
+            values[elem] = (np.ma.getdata(window)[:, rows, cols] * self.conv_factors[elem]).T.tolist()
+
+        layer_depths = (first_masked - 1).tolist()
+        for i, (cell, layer_depth) in enumerate(zip(cells, layer_depths, strict=True)):
+            if layer_depth < MIN_LAYER_DEPTH:
+                self._cache[cell] = None
+                continue
+            self._cache[cell] = [
+                {
+                    "Thickness": [monica_depth_m, "m"],
+                    "SoilOrganicCarbon": [values["corg"][i][layer], "%"],
+                    "SoilBulkDensity": [values["bd"][i][layer], "kg m-3"],
+                    "Sand": [values["sand"][i][layer], "fraction"],
+                    "Clay": [values["clay"][i][layer], "fraction"],
+                }
+                for layer, _, monica_depth_m in LAYERS
+                if layer <= layer_depth
+            ]
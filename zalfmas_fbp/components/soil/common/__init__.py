@@ -0,0 +1 @@
+"""Shared helpers for soil components."""
@@ -0,0 +1,179 @@
+"""Concurrent and cached closestProfilesAt lookups on a soil.capnp:Service capability.
+
+Coordinates are mapped to the soil raster cell they fall into, so all coordinates within one cell share
+a single request. A failing request is logged and yields no profile, the other requests are not affected.
+Profiles are kept in an LRU of capabilities and optionally persisted as serialized soil.capnp:ProfileData
+in a SQLite file, which is served by a local soil.capnp:Profile on later runs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import sqlite3
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import capnp
+from mas.schema.soil import soil_capnp
+from zalfmas_common import common
+
+logger = logging.getLogger(__name__)
+
+type CellKey = tuple[float, float] | tuple[int, int]
+
+
+class CachedProfile(soil_capnp.Profile.Server, common.Identifiable):
+    """A soil profile served from its serialized data. It has no restorer, so it can't be saved."""
+
+    def __init__(self, data: bytes, lat: float, lon: float, id: str | None = None):
+        common.Identifiable.__init__(self, id=id, name=f"soil profile at {lat}/{lon}")
+        self._data = soil_capnp.ProfileData.from_bytes_packed(data)
+        self._lat = lat
+        self._lon = lon
+
+    async def data(self, _context, **kwargs):  # data @0 () -> ProfileData;
+        _context.results.layers = self._data.layers
+        _context.results.percentageOfArea = self._data.percentageOfArea
+
+    async def geoLocation(self, _context, **kwargs):  # geoLocation @1 () -> Geo.LatLonCoord;
+        _context.results.lat = self._lat
+        _context.results.lon = self._lon
+
+    async def save(self, _context, **kwargs):  # save @0 () -> (sturdyRef :Text, unsaveSR :Text);
+        msg = "A soil profile served from the local profile cache can't be saved."
+        raise capnp.KjException(msg)
+
+
+class SoilProfileFetcher:
+    """Fetches the closest soil profile of coordinates.
+
+    With a cell_size (in degrees) the cache key is the index of the raster cell containing the coordinate,
+    counted from cell_origin (lat, lon of a corner of any raster cell), otherwise lat/lon rounded to
+    cache_decimals decimals. The profiles of the last cache_size keys are cached.
+    All uncached keys of a batch are requested at the same time, with at most max_concurrent requests in flight.
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        query: dict[str, Any],
+        max_concurrent: int = 8,
+        cache_size: int = 10000,
+        cell_size: float | None = None,
+        cell_origin: tuple[float, float] = (0.0, 0.0),
+        cache_decimals: int = 5,
+        cache_path: str | Path | None = None,
+    ):
+        self.service = service
+        self.query = query
+        self.cache_size = cache_size
+        self.cell_size = cell_size
+        self.cell_origin = cell_origin
+        self.cache_decimals = cache_decimals
+        self.hits = 0
+        self.misses = 0
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._cache: OrderedDict[CellKey, Any] = OrderedDict()
+        # the same cell has different profiles for different queries
+        self._query_key = "{}|{}|{}".format(
+            ",".join(map(str, query.get("mandatory", []))),
+            ",".join(map(str, query.get("optional", []))),
+            bool(query.get("onlyRawData", False)),
+        )
+        self._db: sqlite3.Connection | None = None
+        if cache_path is not None:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(cache_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS profiles "
+                "(key TEXT PRIMARY KEY, data BLOB NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def key(self, lat: float, lon: float) -> CellKey:
+        if self.cell_size:
+            return (
+                math.floor((lat - self.cell_origin[0]) / self.cell_size),
+                math.floor((lon - self.cell_origin[1]) / self.cell_size),
+            )
+        return round(lat, self.cache_decimals), round(lon, self.cache_decimals)
+
+    def _db_key(self, key: CellKey) -> str:
+        return f"{self._query_key}|{key[0]}|{key[1]}"
+
+    def _load(self, key: CellKey) -> Any | None:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT data, lat, lon FROM profiles WHERE key = ?",
+            (self._db_key(key),),
+        ).fetchone()
+        return None if row is None else soil_capnp.Profile._new_client(CachedProfile(*row, id=self._db_key(key)))
+
+    async def _store(self, key: CellKey, profile: Any) -> None:
+        data, loc = await asyncio.gather(profile.data(), profile.geoLocation())
+        profile_data = soil_capnp.ProfileData.new_message(layers=data.layers, percentageOfArea=data.percentageOfArea)
+        self._db.execute(
+            "INSERT OR REPLACE INTO profiles (key, data, lat, lon) VALUES (?, ?, ?, ?)",
+            (self._db_key(key), profile_data.to_bytes_packed(), loc.lat, loc.lon),
+        )
+
+    async def _request(self, key: CellKey, lat: float, lon: float) -> Any | None:
+        async with self._semaphore:
+            profiles = (await self.service.closestProfilesAt({"lat": lat, "lon": lon}, self.query)).profiles
+            profile = profiles[0] if len(profiles) > 0 else None
+            if profile is not None and self._db is not None:
+                await self._store(key, profile)
+        return profile
+
+    async def fetch(self, coords: Sequence[tuple[float, float]]) -> list[Any | None]:
+        """The closest soil profile (or None) at the (lat, lon) coordinates, in order."""
+        keys = [self.key(lat, lon) for lat, lon in coords]
+        found: dict[CellKey, Any | None] = {}
+        missing: dict[CellKey, tuple[float, float]] = {}
+        for key, coord in zip(keys, coords, strict=True):
+            if key in found or key in missing:
+                continue
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                found[key] = self._cache[key]
+            elif (profile := self._load(key)) is not None:
+                found[key] = profile
+                self._remember(key, profile)
+            else:
+                missing[key] = coord
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            profiles = await asyncio.gather(
+                *(self._request(key, lat, lon) for key, (lat, lon) in missing.items()),
+                return_exceptions=True,
+            )
+            for (key, (lat, lon)), profile in zip(missing.items(), profiles, strict=True):
+                if isinstance(profile, Exception):
+                    # not remembered, so the next coordinate in this cell tries again
+                    logger.error("Requesting soil profile at %s/%s failed: %s", lat, lon, profile)
+                    found[key] = None
+                    continue
+                found[key] = profile
+                self._remember(key, profile)
+            if self._db is not None:
+                self._db.commit()
+        return [found[key] for key in keys]
+
+    def _remember(self, key: CellKey, profile: Any | None) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = profile
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -24,6 +24,7 @@ from zalfmas_common import common
 
 import zalfmas_fbp.run.components as c
 import zalfmas_fbp.run.ports as p
+from zalfmas_fbp.components.soil.common.profiles import SoilProfileFetcher
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -58,8 +59,8 @@ METADATA = meta.Component(
     outPorts=[
         meta.Port(
             name="out",
-            contentType="grid.capnp:Grid.Value",
-            desc="value at requested location",
+            contentType="soil.capnp:Profile",
+            desc="closest soil profile at requested location",
         ),
     ],
     defaultConfig={
@@ -116,6 +117,44 @@ METADATA = meta.Component(
             type="bool",
             desc="Just return data which are physically available from the data source. If false, data can be generated from the raw data to allow more params to be available mandatory",
         ),
+        "batch_size": meta.ConfigEntry(
+            value=1,
+            type="int",
+            desc="Number of coordinates collected before their profiles are requested together.",
+        ),
+        "max_concurrent_requests": meta.ConfigEntry(
+            value=8,
+            type="int",
+            desc="Maximum number of profile requests in flight at the same time.",
+        ),
+        "cell_size": meta.ConfigEntry(
+            value=None,
+            type="float",
+            desc="Cell size of the soil raster in degrees. Coordinates within one cell share a cached profile. "
+            "The cells are aligned to 'cell_origin'. If not set, coordinates are rounded to 'cache_decimals' decimals.",
+        ),
+        "cell_origin": meta.ConfigEntry(
+            value=[0.0, 0.0],
+            type="[float, float]",
+            desc="[lat, lon] of a corner of any cell of the soil raster (e.g. yllcorner, xllcorner of an ASCII grid). "
+            "Only used with 'cell_size'.",
+        ),
+        "cache_decimals": meta.ConfigEntry(
+            value=5,
+            type="int",
+            desc="Lat/lon are rounded to this number of decimals to build the cache key if no 'cell_size' is set.",
+        ),
+        "cache_size": meta.ConfigEntry(
+            value=10000,
+            type="int",
+            desc="Number of profiles cached by cell (least recently used are dropped). 0 disables the cache.",
+        ),
+        "cache_path": meta.ConfigEntry(
+            value=None,
+            type="string",
+            desc="Optional SQLite file to persist fetched profiles in, to reuse them in later runs. "
+            "Profiles served from this file support data, geoLocation and info, but can't be saved (sturdy refs).",
+        ),
     },
 )
 
@@ -139,42 +178,70 @@ async def run_component(port_infos_reader_sr: str, config: dict[str, Any]):
             logger.error("%s No soil service could be received or connected to.", Path(__file__).name)
             return
 
-    mandatory = config["mandatory"]
-    optional = config["optional"]
-    while pc.in_ports["latlon"] and pc.out_ports["out"] and service:
-        try:
-            in_msg = await pc.in_ports["latlon"].read()
-            if in_msg.which() == "done":
-                pc.in_ports["latlon"] = None
-                continue
-
-            in_ip = in_msg.value.as_struct(fbp_capnp.IP)
-            attr = common.get_fbp_attr(in_ip, config["from_attr"])
-            if attr:
-                coord = attr.as_struct(geo_capnp.LatLonCoord)
-            else:
-                coord = in_ip.content.as_struct(geo_capnp.LatLonCoord)
-
-            profiles = await service.profilesAt(
-                coord,
-                {"mandatory": mandatory, "optional": optional, "onlyRawData": config["only_raw_data"]},
-            ).profiles
-            if len(profiles) > 0:
-                profile = profiles[0]
+    fetcher = SoilProfileFetcher(
+        service,
+        {"mandatory": config["mandatory"], "optional": config["optional"], "onlyRawData": config["only_raw_data"]},
+        max_concurrent=int(config.get("max_concurrent_requests", 8)),
+        cache_size=int(config.get("cache_size", 10000)),
+        cell_size=config.get("cell_size"),
+        cell_origin=tuple(config.get("cell_origin") or (0.0, 0.0)),
+        cache_decimals=int(config.get("cache_decimals", 5)),
+        cache_path=config.get("cache_path"),
+    )
+    batch_size = max(1, int(config.get("batch_size") or 1))
+    to_attr = config.get("to_attr")
+    # input IPs and their coordinates, waiting to be fetched together
+    batch: list[tuple[Any, tuple[float, float]]] = []
 
+    async def write_batch():
+        try:
+            profiles = await fetcher.fetch([coord for _, coord in batch])
+            for (in_ip, _), profile in zip(batch, profiles, strict=True):
+                if profile is None:
+                    continue
                 out_ip = fbp_capnp.IP.new_message()
-                if not config["to_attr"]:
+                if not to_attr:
                     out_ip.content = profile
-                common.copy_and_set_fbp_attrs(
-                    in_ip,
-                    out_ip,
-                    **({config["to_attr"]: profile} if config["to_attr"] else {}),
-                )
+                common.copy_and_set_fbp_attrs(in_ip, out_ip, **({to_attr: profile} if to_attr else {}))
                 await pc.out_ports["out"].write(value=out_ip)
-
         except Exception:
             logger.exception("%s Exception", Path(__file__).name)
-
+        finally:
+            batch.clear()
+
+    try:
+        while pc.in_ports["latlon"] and pc.out_ports["out"] and service:
+            try:
+                in_msg = await pc.in_ports["latlon"].read()
+                if in_msg.which() == "done":
+                    pc.in_ports["latlon"] = None
+                    continue
+
+                in_ip = in_msg.value.as_struct(fbp_capnp.IP)
+                if in_ip.type != "standard":
+                    # substream boundaries end a batch and are forwarded unchanged
+                    await write_batch()
+                    await pc.out_ports["out"].write(value=in_ip)
+                    continue
+
+                attr = common.get_fbp_attr(in_ip, config["from_attr"])
+                if attr:
+                    coord = attr.as_struct(geo_capnp.LatLonCoord)
+                else:
+                    coord = in_ip.content.as_struct(geo_capnp.LatLonCoord)
+                batch.append((in_ip, (coord.lat, coord.lon)))
+                if len(batch) >= batch_size:
+                    await write_batch()
+
+            except Exception:
+                logger.exception("%s Exception", Path(__file__).name)
+
+        if batch and pc.out_ports["out"]:
+            await write_batch()
+    finally:
+        fetcher.close()
+
+    logger.info("%s: soil profile cache hits: %d misses: %d", Path(__file__).name, fetcher.hits, fetcher.misses)
     await pc.close_out_ports()
     logger.info("%s: process finished", Path(__file__).name)
 
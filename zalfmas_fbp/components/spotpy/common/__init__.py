@@ -0,0 +1 @@
+"""Shared helpers for spotpy components."""
@@ -0,0 +1,63 @@
+"""Conversion of float lists in IPs to numpy arrays, with sentinel values replaced by NaN.
+
+Besides a common.capnp:Value.lf64 list, the values can be sent as compact binary payload: a common.capnp:Blob
+of little-endian float64 values with content type FLOAT64_CONTENT_TYPE, which is read without any per-value work.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from mas.schema.common import common_capnp
+
+from zalfmas_fbp.run import process
+
+if TYPE_CHECKING:
+    from mas.schema.fbp.fbp_capnp.types.builders import IPBuilder
+    from mas.schema.fbp.fbp_capnp.types.readers import IPReader
+
+FLOAT64_CONTENT_TYPE = "application/x-float64-le"
+SENTINEL_ATTRS = ("null_sentinel", "nan_sentinel")
+
+
+def lf64_to_numpy(lf64: Sequence[float]) -> np.ndarray:
+    """Read a capnp float list in one pass. pycapnp lists don't expose a buffer, so this is the fastest way."""
+    return np.fromiter(lf64, dtype=np.float64, count=len(lf64))
+
+
+def replace_sentinels(values: np.ndarray, sentinels: Iterable[float]) -> np.ndarray:
+    """Return values with all sentinel values replaced by NaN."""
+    sentinels = list(sentinels)
+    if len(sentinels) == 0:
+        return values
+    return np.where(np.isin(values, sentinels), np.nan, values)
+
+
+def sentinels_from_attributes(attributes: Iterable[Any], names: Iterable[str] = SENTINEL_ATTRS) -> list[float]:
+    """The common.capnp:Value.f64 values of the sentinel attributes."""
+    names = set(names)
+    sentinels = []
+    for attr in attributes:
+        if attr.key not in names:
+            continue
+        value = attr.value.as_struct(common_capnp.Value)
+        if value.which() == "f64":
+            sentinels.append(value.f64)
+    return sentinels
+
+
+def float64_blob_ip(values: Iterable[float]) -> IPBuilder:
+    """Create an IP with values as compact binary payload."""
+    data = np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype="<f8")
+    return process.blob_ip(data.tobytes(), content_type=FLOAT64_CONTENT_TYPE)
+
+
+def ip_to_numpy(ip: IPBuilder | IPReader, sentinels: Iterable[float] = ()) -> np.ndarray:
+    """Read the float values of ip, a common.capnp:Value.lf64 or a FLOAT64_CONTENT_TYPE blob."""
+    if process.ip_content_type(ip) == FLOAT64_CONTENT_TYPE:
+        values = np.frombuffer(ip.content.as_struct(common_capnp.Blob).data, dtype="<f8").astype(np.float64)
+    else:
+        values = lf64_to_numpy(ip.content.as_struct(common_capnp.Value).lf64)
+    return replace_sentinels(values, sentinels)
@@ -0,0 +1,162 @@
+"""Block-buffered spotpy result databases stored as Parquet or as memory-mappable binary file.
+
+A database is a drop-in for spotpy's datawriters (save/finalize/getdata). The results are collected
+row by row into a preallocated numpy block, which is written out as a whole once it is full.
+The columns are named like in spotpy's csv database: like1.., par<name>.., simulation_0.., chain.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Literal
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+type DbFormat = Literal["csv", "parquet", "memmap"]
+
+BLOCK_ROWS = 1024
+
+
+def db_paths(dbname: str | Path, db_format: DbFormat) -> list[Path]:
+    """The files a database named dbname consists of."""
+    if db_format == "parquet":
+        return [Path(f"{dbname}.parquet")]
+    if db_format == "memmap":
+        return [Path(f"{dbname}.bin"), Path(f"{dbname}.json")]
+    return [Path(f"{dbname}.csv")]
+
+
+def _length(value: Any) -> int:
+    if value is None:
+        return 0
+    return int(np.size(value))
+
+
+class BufferedResultDb:
+    """A spotpy datawriter buffering results in numpy blocks of block_rows rows."""
+
+    def __init__(
+        self,
+        dbname: str | Path,
+        parnames: list[str],
+        db_format: Literal["parquet", "memmap"] = "parquet",
+        block_rows: int = BLOCK_ROWS,
+        db_precision: type[np.floating] = np.float32,
+        save_sim: bool = True,
+    ):
+        self.dbname = str(dbname)
+        self.parnames = list(parnames)
+        self.db_format = db_format
+        self.block_rows = block_rows
+        self.db_precision = np.dtype(db_precision)
+        self.save_sim = save_sim
+        self.columns: list[str] = []
+        self._block: np.ndarray | None = None
+        self._rows = 0
+        self._slices: tuple[slice, slice, slice] | None = None
+        self._parquet_writer: pq.ParquetWriter | None = None
+        self._bin_file: BinaryIO | None = None
+
+    def _init_block(self, like: Any, simulations: Any) -> None:
+        n_like = _length(like)
+        n_par = len(self.parnames)
+        n_sim = _length(simulations) if self.save_sim else 0
+        self.columns = [
+            *(f"like{i + 1}" for i in range(n_like)),
+            *(f"par{name}" for name in self.parnames),
+            *(f"simulation_{i}" for i in range(n_sim)),
+            "chain",
+        ]
+        self._slices = (
+            slice(0, n_like),
+            slice(n_like, n_like + n_par),
+            slice(n_like + n_par, n_like + n_par + n_sim),
+        )
+        self._block = np.empty((self.block_rows, len(self.columns)), dtype=self.db_precision)
+
+    def save(self, objectivefunction: Any, parameterlist: Any, simulations: Any = None, chains: int = 1) -> None:
+        if self._block is None:
+            self._init_block(objectivefunction, simulations)
+        like_slice, par_slice, sim_slice = self._slices
+        row = self._block[self._rows]
+        row[like_slice] = np.ravel(objectivefunction)
+        row[par_slice] = np.ravel(parameterlist)
+        if sim_slice.stop > sim_slice.start:
+            row[sim_slice] = np.ravel(simulations)
+        row[-1] = chains
+        self._rows += 1
+        if self._rows == self.block_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows."""
+        if self._block is None or self._rows == 0:
+            return
+        rows = self._block[: self._rows]
+        if self.db_format == "parquet":
+            self._write_parquet(rows)
+        else:
+            self._write_memmap(rows)
+        self._rows = 0
+
+    def _write_parquet(self, rows: np.ndarray) -> None:
+        table = pa.Table.from_arrays([pa.array(rows[:, i]) for i in range(rows.shape[1])], names=self.columns)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(f"{self.dbname}.parquet", table.schema)
+        self._parquet_writer.write_table(table)
+
+    def _write_memmap(self, rows: np.ndarray) -> None:
+        if self._bin_file is None:
+            bin_path, header_path = db_paths(self.dbname, "memmap")
+            header_path.write_text(json.dumps({"columns": self.columns, "dtype": self.db_precision.str}))
+            self._bin_file = bin_path.open("wb")
+        self._bin_file.write(np.ascontiguousarray(rows).tobytes())
+
+    def finalize(self) -> None:
+        self.flush()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._bin_file is not None:
+            self._bin_file.close()
+            self._bin_file = None
+
+    def getdata(self) -> np.ndarray:
+        self.flush()
+        if self._bin_file is not None:
+            self._bin_file.flush()
+        return load_results(self.dbname, self.db_format)
+
+
+def install_result_db(sampler: Any, result_db: BufferedResultDb) -> None:
+    """Make a spotpy sampler write its results to result_db instead of creating its own datawriter."""
+    sampler.datawriter = result_db
+    sampler.dbinit = False
+
+
+def load_results(dbname: str | Path, db_format: DbFormat = "parquet") -> np.ndarray:
+    """Load the results of a database as structured array, like spotpy.analyser.load_csv_results.
+
+    The memmap format is memory mapped read-only, so only the accessed columns are read from disk.
+    """
+    if db_format == "csv":
+        import spotpy
+
+        return spotpy.analyser.load_csv_results(str(dbname))
+
+    if db_format == "memmap":
+        bin_path, header_path = db_paths(dbname, "memmap")
+        header = json.loads(header_path.read_text())
+        dtype = np.dtype([(name, header["dtype"]) for name in header["columns"]])
+        if bin_path.stat().st_size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(bin_path, dtype=dtype, mode="r")
+
+    table = pq.read_table(f"{dbname}.parquet")
+    return np.rec.fromarrays(
+        [column.to_numpy() for column in table.columns],
+        names=table.column_names,
+    ).view(np.ndarray)
@@ -0,0 +1,97 @@
+"""Cache of simulation results by parameter vector, in memory (LRU) and optionally persisted in a SQLite file.
+
+The persisted results survive the calibration run, so a restarted calibration reuses them.
+Keys are the parameter vector rounded to a number of decimals plus a context hash, which has to
+change whenever the simulation results of the same parameters would change (observations, flow config).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+
+
+def context_hash(*parts: bytes | str) -> str:
+    """Hash of everything the simulation results depend on besides the parameter vector."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode() if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class SimulationCache:
+    """Thread-safe two-tier cache of simulated value arrays."""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        path: str | Path | None = None,
+        decimals: int = 10,
+        context: str = "",
+    ):
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.context = context
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS sims (key TEXT PRIMARY KEY, sim_values BLOB NOT NULL)")
+            self._db.commit()
+
+    def key(self, vector: Iterable[float]) -> str:
+        rounded = np.round(np.asarray(vector, dtype=np.float64), self.decimals) + 0.0  # + 0.0 turns -0.0 into 0.0
+        return context_hash(self.context, rounded.tobytes())
+
+    def get(self, vector: Iterable[float]) -> np.ndarray | None:
+        key = self.key(vector)
+        with self._lock:
+            if (sim_values := self._memory.get(key)) is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return sim_values
+            if self._db is not None:
+                row = self._db.execute("SELECT sim_values FROM sims WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    sim_values = np.frombuffer(row[0], dtype=np.float64)
+                    self._remember(key, sim_values)
+                    self.hits += 1
+                    return sim_values
+            self.misses += 1
+            return None
+
+    def put(self, vector: Iterable[float], sim_values: np.ndarray) -> None:
+        key = self.key(vector)
+        sim_values = np.asarray(sim_values, dtype=np.float64)
+        with self._lock:
+            self._remember(key, sim_values)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sims (key, sim_values) VALUES (?, ?)", (key, sim_values.tobytes())
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, sim_values: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+        self._memory[key] = sim_values
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,114 @@
+"""Calibration traces: the objective function values and parameters of all runs, stored as small Parquet file.
+
+While sampling, a TraceWriter rewrites the trace file every few runs, so the trace of a running or aborted
+calibration is readable up to the last written run.
+
+Plots are rendered from trace files with matplotlib's non-interactive Agg backend. matplotlib is only
+imported for rendering, so calibration processes don't load it.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+TRACE_COLUMN_PREFIXES = ("like", "par", "chain")
+
+
+def write_trace(results: np.ndarray, path: str | Path) -> Path:
+    """Write the objective function and parameter columns of spotpy results to a Parquet file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    names = [name for name in results.dtype.names or () if name.startswith(TRACE_COLUMN_PREFIXES)]
+    table = pa.table({name: np.asarray(results[name]) for name in names})
+    pq.write_table(table, path)
+    return path
+
+
+class TraceWriter:
+    """Collects the objective function values and parameters of runs and writes them as trace file.
+
+    The file is replaced atomically every block_rows runs and on close, so it is always a complete trace.
+    """
+
+    def __init__(self, path: str | Path, parnames: list[str], block_rows: int = 100):
+        self.path = Path(path)
+        self.parnames = list(parnames)
+        self.block_rows = max(1, block_rows)
+        self._rows: list[np.ndarray] = []
+        self._columns: list[str] | None = None
+        self._unwritten = 0
+
+    def save(self, objectivefunction: Any, parameterlist: Any, chains: int = 1) -> None:
+        like = np.ravel(objectivefunction).astype(np.float64)
+        if self._columns is None:
+            self._columns = [
+                *(f"like{i + 1}" for i in range(len(like))),
+                *(f"par{name}" for name in self.parnames),
+                "chain",
+            ]
+        self._rows.append(np.concatenate([like, np.ravel(parameterlist).astype(np.float64), [chains]]))
+        self._unwritten += 1
+        if self._unwritten >= self.block_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._columns is None or self._unwritten == 0:
+            return
+        rows = np.vstack(self._rows)
+        table = pa.table({name: rows[:, i] for i, name in enumerate(self._columns)})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        pq.write_table(table, tmp_path)
+        tmp_path.replace(self.path)
+        self._unwritten = 0
+
+    def close(self) -> Path:
+        self.flush()
+        return self.path
+
+
+def install_trace(sampler: Any, trace_writer: TraceWriter) -> None:
+    """Make a spotpy sampler add every run it saves to trace_writer as well."""
+    save = sampler.save
+
+    def save_and_trace(like: Any, randompar: Any, simulations: Any, chains: int = 1) -> None:
+        save(like, randompar, simulations, chains=chains)
+        trace_writer.save(like, randompar, chains)
+
+    sampler.save = save_and_trace
+
+
+def read_trace(path: str | Path, columns: list[str] | None = None) -> pa.Table:
+    return pq.read_table(path, columns=columns)
+
+
+def render_trace_plot(
+    trace_path: str | Path,
+    png_path: str | Path,
+    column: str = "like1",
+    ylabel: str = "RMSE",
+    dpi: int = 150,
+) -> Path:
+    """Render the objective function trace of a trace file as PNG."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    values = read_trace(trace_path, columns=[column]).column(column).to_numpy()
+    png_path = Path(png_path)
+    png_path.parent.mkdir(parents=True, exist_ok=True)
+    fig = plt.figure(figsize=(9, 6))
+    try:
+        plt.plot(values, "r+")
+        plt.ylabel(ylabel)
+        plt.xlabel("Iteration")
+        fig.savefig(png_path, dpi=dpi)
+    finally:
+        plt.close(fig)
+    return png_path
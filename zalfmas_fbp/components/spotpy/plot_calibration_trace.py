@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import override
+
+from mas.schema.fbp import fbp_capnp
+from pydantic import Field
+from zalfmas_common import common
+
+import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.spotpy.common.trace import render_trace_plot
+from zalfmas_fbp.run import metadata as meta
+
+logger = logging.getLogger(__name__)
+
+
+class Config(process.ProcessConfig):
+    path_to_out_folder: str | None = Field(
+        None,
+        description="folder to write the plots to. If None, the plot is written next to the trace file.",
+    )
+    column: str = Field("like1", description="trace column to plot")
+    ylabel: str = Field("RMSE", description="label of the y axis")
+    dpi: int = Field(150, description="resolution of the plot")
+
+
+METADATA = meta.Component(
+    category=meta.Category(
+        id="spotpy",
+        name="Spotpy",
+    ),
+    info=meta.Info(
+        id="decbca0f-a66e-4d02-809e-11f4cbaa6f11",
+        name="plot calibration trace",
+        description="Render the objective function trace written by the spotpy calibration component as PNG.",
+    ),
+    type="process",
+    inPorts=[
+        meta.Port(
+            name="conf",
+            contentType="@0xed6c098b67cad454 = common/common.capnp:StructuredText[JSON | TOML]",
+        ),
+        meta.Port(
+            name="trace",
+            contentType="Text",
+            desc="path to a calibration trace Parquet file",
+        ),
+    ],
+    outPorts=[
+        meta.Port(
+            name="out",
+            contentType="Text",
+            desc="path to the rendered PNG file",
+        ),
+    ],
+    config=Config,
+)
+
+
+class Component(process.Process[Config]):
+    def __init__(
+        self,
+        metadata: meta.Component = METADATA,
+        con_man: common.ConnectionManager | None = None,
+    ):
+        super().__init__(metadata=metadata, con_man=con_man)
+
+    @override
+    async def run(self):
+        logger.info("%s process running", self.name)
+        if await self.update_config_from_port("conf"):
+            logger.info("%s updated config from conf port", self.name)
+
+        while self.in_ports["trace"]:
+            try:
+                trace_ip = await self.read_in("trace")
+                if trace_ip is None:
+                    self.in_ports["trace"] = None
+                    continue
+
+                trace_path = Path(trace_ip.content.as_text())
+                out_dir = Path(self.config.path_to_out_folder) if self.config.path_to_out_folder else trace_path.parent
+                # rendering is blocking, so keep it off the event loop
+                png_path = await asyncio.to_thread(
+                    render_trace_plot,
+                    trace_path,
+                    out_dir / trace_path.with_suffix(".png").name,
+                    column=self.config.column,
+                    ylabel=self.config.ylabel,
+                    dpi=self.config.dpi,
+                )
+                if self.out_ports["out"]:
+                    await self.write_out(
+                        "out", fbp_capnp.IP.new_message(content=str(png_path), attributes=trace_ip.attributes)
+                    )
+
+            except Exception:
+                logger.exception("%s Exception", Path(__file__).name)
+
+        logger.info("%s: process finished", self.name)
+
+
+def main():
+    process.run_process_from_metadata_and_cmd_args(Component(METADATA), METADATA)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,27 +13,43 @@
 #
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
+from __future__ import annotations
+
 import asyncio
 import io
+import itertools
 import json
 import logging
 import tempfile
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Literal, Protocol, override
 
-import matplotlib.pyplot as plt
 import numpy as np
 import spotpy
 from mas.schema.common import common_capnp
 from mas.schema.fbp import fbp_capnp
-from numpy import ndarray
 from pydantic import Field
 from zalfmas_common import common
 
-from zalfmas_fbp.run.ports import get_attr_val
 import zalfmas_fbp.run.process as process
+from zalfmas_fbp.components.spotpy.common.float_values import (
+    ip_to_numpy,
+    lf64_to_numpy,
+    replace_sentinels,
+    sentinels_from_attributes,
+)
+from zalfmas_fbp.components.spotpy.common.result_db import (
+    BLOCK_ROWS,
+    BufferedResultDb,
+    DbFormat,
+    install_result_db,
+)
+from zalfmas_fbp.components.spotpy.common.sim_cache import SimulationCache, context_hash
+from zalfmas_fbp.components.spotpy.common.trace import TraceWriter, install_trace
 from zalfmas_fbp.run import metadata as meta
 
 logger = logging.getLogger(__name__)
@@ -75,6 +91,57 @@ class Config(process.ProcessConfig):
         If None, then a temporary directory will be created.""",
     )
     algorithm: SpotpyAlgorithm = Field("SCE-UA", description="""SPOTPY algorithm to use""")
+    db_format: DbFormat = Field(
+        "csv",
+        description="""Format of the calibration database: spotpy's 'csv', or 'parquet' or 'memmap' (a raw binary file
+        plus a JSON header), which buffer the results in blocks of 'db_block_rows' rows and write them at once.
+        Use zalfmas_fbp.components.spotpy.common.result_db.load_results to read them.""",
+    )
+    db_block_rows: int = Field(
+        BLOCK_ROWS, ge=1, description="""Number of results buffered before writing them for 'parquet' and 'memmap'."""
+    )
+    trace_block_rows: int = Field(
+        100,
+        ge=1,
+        description="""The trace file is rewritten every 'trace_block_rows' runs while sampling, so the trace of a
+        running or aborted calibration can be read.""",
+    )
+    sim_cache_size: int = Field(
+        0,
+        ge=0,
+        description="""Number of simulation results kept in memory by parameter vector to skip simulations of
+        parameter vectors evaluated before. 0 disables the in-memory cache.""",
+    )
+    sim_cache_path: str | None = Field(
+        None,
+        description="""If set, path to a SQLite file persisting the simulation results by parameter vector,
+        so a restarted calibration can reuse the results of earlier runs.""",
+    )
+    sim_cache_decimals: int = Field(
+        10, description="""Number of decimals parameter values are rounded to for caching."""
+    )
+    sim_cache_namespace: str = Field(
+        "",
+        description="""Part of the cache key. Change it if the simulation results for the same parameters and observations
+        change, e.g. because the model setup of the flow changed.""",
+    )
+    max_in_flight: int = Field(
+        1,
+        ge=1,
+        description="""Maximum number of parameter sets sent out on 'sampled_params' and awaiting their simulated values.
+        If > 1, each parameter set gets an id attribute (see 'sim_id_attr') and the simulated values are matched
+        to their parameter set by this attribute, so the downstream components have to pass it through.""",
+    )
+    sim_id_attr: str = Field(
+        "sim_id",
+        description="""Name of the attribute carrying the id of a parameter set if 'max_in_flight' > 1.""",
+    )
+    ordered_results: bool = Field(
+        True,
+        description="""If true and 'max_in_flight' > 1, hand simulation results back to the algorithm in the order
+        the parameter sets were sampled. Otherwise in the order they arrive, which keeps more simulations busy
+        but changes the order of runs for algorithms depending on it.""",
+    )
     repetitions: int | None = Field(
         10,
         description="""
@@ -252,13 +319,17 @@ METADATA = meta.Component(
             name="obs_values",
             contentType="@0xe17592335373b246 = common/common_capnp:Value.lf64",
             desc="""List of observations. If the list contains null or NaN sentinel values, these will be replaced with NaN.
-            These sentinel values can be given as 'null_sentinel' and 'NaN_sentinel' attributes.""",
+            These sentinel values can be given as 'null_sentinel' and 'NaN_sentinel' attributes.
+            Alternatively the values can be sent as common.capnp:Blob of little-endian float64 values
+            with content type 'application/x-float64-le'.""",
         ),
         meta.Port(
             name="sim_values",
             contentType="@0xe17592335373b246 = common/common_capnp:Value.lf64",
             desc="""List of simulated values. If the list contains null or NaN sentinel values, these will be replaced with NaN.
-            These sentinel values can be given as 'null_sentinel' and 'NaN_sentinel' attributes.""",
+            These sentinel values can be given as 'null_sentinel' and 'NaN_sentinel' attributes.
+            Alternatively the values can be sent as common.capnp:Blob of little-endian float64 values
+            with content type 'application/x-float64-le'.""",
         ),
     ],
     outPorts=[
@@ -272,6 +343,12 @@ METADATA = meta.Component(
             contentType="Text",
             desc="best optimized result",
         ),
+        meta.Port(
+            name="trace",
+            contentType="Text",
+            desc="""path to the Parquet file with the objective function values and parameters of all runs,
+            with the 'param_set_id' attribute, e.g. to be rendered by the 'plot calibration trace' component""",
+        ),
     ],
     config=Config,
 )
@@ -286,6 +363,8 @@ class SpotPySetup:
         sim_values_in_p,
         loop: asyncio.AbstractEventLoop,
         log_out_p=None,
+        sim_id_attr: str | None = None,
+        sim_cache: SimulationCache | None = None,
     ):
         self.params = params
         self.observations = observations
@@ -293,6 +372,14 @@ class SpotPySetup:
         self.sim_values_in_p = sim_values_in_p
         self.loop = loop
         self.log_out_p = log_out_p
+        # if set, parameter sets are tagged with an id and replies are matched by it,
+        # which allows several simulation() calls from different threads at the same time
+        self.sim_id_attr = sim_id_attr
+        self._sim_ids = itertools.count()
+        self._pending: dict[str, asyncio.Future] = {}
+        self._dispatch_task: asyncio.Task | None = None
+        self._sim_values_done = False
+        self.sim_cache = sim_cache
 
     def _run_on_loop(self, coro):
         return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
@@ -307,11 +394,57 @@ class SpotPySetup:
     async def _read_sim_values(self):
         return await self.sim_values_in_p.read()
 
+    async def _request_sim_values(self, sim_id: str, out_ip):
+        """Send the parameter set out_ip tagged with sim_id and wait for the simulated values with the same id."""
+        if self._sim_values_done:
+            return None
+        reply = self.loop.create_future()
+        self._pending[sim_id] = reply
+        await self._write_sampled_params(out_ip)
+        if self._dispatch_task is None:
+            self._dispatch_task = asyncio.create_task(self._dispatch_sim_values())
+        return await reply
+
+    async def _dispatch_sim_values(self):
+        try:
+            while self._pending:
+                in_msg = await self._read_sim_values()
+                if in_msg.which() == "done":
+                    self._sim_values_done = True
+                    break
+
+                in_ip = in_msg.value.as_struct(fbp_capnp.IP)
+                sim_id = next((attr.value.as_text() for attr in in_ip.attributes if attr.key == self.sim_id_attr), None)
+                if sim_id is None and len(self._pending) == 1:
+                    sim_id = next(iter(self._pending))
+                if (reply := self._pending.pop(sim_id, None)) is None:
+                    logger.warning(
+                        "%s received simulated values for unknown %s '%s'. Skipping.",
+                        Path(__file__).name,
+                        self.sim_id_attr,
+                        sim_id,
+                    )
+                    continue
+                reply.set_result(in_ip)
+        except Exception as e:
+            logger.exception("%s Exception while receiving simulated values", Path(__file__).name)
+            for reply in self._pending.values():
+                reply.set_exception(e)
+            self._pending.clear()
+        finally:
+            self._dispatch_task = None
+        for reply in self._pending.values():
+            reply.set_result(None)
+        self._pending.clear()
+
     def parameters(self):
         return spotpy.parameter.generate(self.params)
 
     def simulation(self, vector):
         # vector = MaxAssimilationRate, AssimilateReallocation, RootPenetrationRate
+        if self.sim_cache is not None and (sim_values := self.sim_cache.get(vector)) is not None:
+            return sim_values
+
         sim_values = None
         try:
             name_to_param = dict(zip(vector.name, vector))
@@ -321,25 +454,33 @@ class SpotPySetup:
                 n2p_list[i].fst = k
                 n2p_list[i].snd = common_capnp.Value.new_message(f64=float(v))
             out_ip = fbp_capnp.IP.new_message(content=out_value)
-            self._run_on_loop(self._write_sampled_params(out_ip))
-            logger.info("%s %s sent params to monica setup: %s", Path(__file__).name, datetime.now(), vector)
-            if self.log_out_p:
-                self._run_on_loop(self._write_log(f"{datetime.now()} sent params to monica setup: {vector}"))
-
-            in_msg = self._run_on_loop(self._read_sim_values())
-            # check for end of data from in port
-            if in_msg.which() == "done":
-                return None
-
-            in_ip = in_msg.value.as_struct(fbp_capnp.IP)
-            sentinel_values = {}
-            nan_sentinel, success = get_attr_val("nan_sentinel", in_ip.attributes)
-            if success:
-                sentinel_values[nan_sentinel] = np.nan
-            #check_and_possibly_add_sentinel_value(sentinel_values, in_ip.attributes, "nan_sentinel")
-            sim_values = capnp_value_lf64_to_numpy_array_with_nan(
-                in_ip.content.as_struct(common_capnp.Value).lf64, sentinel_values=sentinel_values
-            )
+            if self.sim_id_attr:
+                sim_id = str(next(self._sim_ids))
+                out_ip.attributes = [{"key": self.sim_id_attr, "value": sim_id}]
+                logger.info(
+                    "%s %s sending params %s to monica setup: %s", Path(__file__).name, datetime.now(), sim_id, vector
+                )
+                if self.log_out_p:
+                    self._run_on_loop(
+                        self._write_log(f"{datetime.now()} sent params {sim_id} to monica setup: {vector}")
+                    )
+                in_ip = self._run_on_loop(self._request_sim_values(sim_id, out_ip))
+                # end of data from in port
+                if in_ip is None:
+                    return None
+            else:
+                self._run_on_loop(self._write_sampled_params(out_ip))
+                logger.info("%s %s sent params to monica setup: %s", Path(__file__).name, datetime.now(), vector)
+                if self.log_out_p:
+                    self._run_on_loop(self._write_log(f"{datetime.now()} sent params to monica setup: {vector}"))
+
+                in_msg = self._run_on_loop(self._read_sim_values())
+                # check for end of data from in port
+                if in_msg.which() == "done":
+                    return None
+
+                in_ip = in_msg.value.as_struct(fbp_capnp.IP)
+            sim_values = ip_to_numpy(in_ip, sentinels=sentinels_from_attributes(in_ip.attributes))
             if self.log_out_p:
                 self._run_on_loop(
                     self._write_log(
@@ -347,6 +488,8 @@ class SpotPySetup:
                     ),
                 )
             assert len(sim_values) == len(self.observations)
+            if self.sim_cache is not None:
+                self.sim_cache.put(vector, sim_values)
         except Exception:
             logger.exception("%s %s exception", Path(__file__).name, datetime.now())
 
@@ -394,6 +537,68 @@ def print_status_final(sampler_status, stream):
     stream.write("******************************\n\n")
 
 
+class InFlightForEach:
+    """spotpy repeater (like spotpy.parallel.*.ForEach) running up to max_in_flight simulations at the same time.
+
+    The simulations run in threads, which spend their time waiting for the simulated values,
+    so the number of busy downstream models is the limit, not the number of local cores.
+    """
+
+    def __init__(self, sampler, max_in_flight: int, ordered: bool = True):
+        self.sampler = sampler
+        self.max_in_flight = max_in_flight
+        self.ordered = ordered
+        self.phase = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    def is_idle(self):
+        return False
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="spotpy-sim")
+
+    def terminate(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def setphase(self, phasename):
+        self.phase = phasename
+
+    def simulate(self, id_params_tuple):
+        """Thread safe version of spotpy's _algorithm.simulate, which updates the shared sampler.all_params."""
+        id, params = id_params_tuple
+        all_params = self.sampler.all_params.copy()
+        all_params[self.sampler.non_constant_positions] = params
+        return id, params, self.sampler.setup.simulation(self.sampler.partype(*all_params))
+
+    def __call__(self, jobs):
+        self.start()
+        in_flight: deque[Future] = deque()
+        for job in jobs:
+            in_flight.append(self._executor.submit(self.simulate, job))
+            while len(in_flight) >= self.max_in_flight:
+                yield from self._collect(in_flight, block=True)
+            yield from self._collect(in_flight, block=False)
+        while in_flight:
+            yield from self._collect(in_flight, block=True)
+
+    def _collect(self, in_flight: deque[Future], block: bool):
+        if self.ordered:
+            while in_flight and (block or in_flight[0].done()):
+                yield in_flight.popleft().result()
+                block = False
+            return
+
+        done = [f for f in in_flight if f.done()]
+        if not done and block:
+            done = list(wait(in_flight, return_when=FIRST_COMPLETED).done)
+        for f in done:
+            in_flight.remove(f)
+            yield f.result()
+
+
 class SpotpyAlgo(Protocol):
     status: Any
 
@@ -522,11 +727,11 @@ def custom_update_sample_params(algo: str, sample_params: dict[str, Any], spotpy
 
 
 def capnp_value_lf64_to_numpy_array(lf64: common_capnp.types.readers.Float64ListReader):
-    return np.array(lf64, np.float64)
+    return lf64_to_numpy(lf64)
 
 
 def capnp_value_lf64_to_numpy_array_with_nan(lf64: common_capnp.types.readers.Float64ListReader, sentinel_values={}):
-    return np.array([sentinel_values.get(v, v) if sentinel_values else v for v in lf64])
+    return replace_sentinels(lf64_to_numpy(lf64), sentinel_values.keys())
 
 
 def check_and_possibly_add_sentinel_value(sentinel_values: dict, attr, sentinel_attr_name):
@@ -564,6 +769,7 @@ class Component(process.Process[Config]):
         ):
             path_to_db_dir = self.config.path_to_db_dir
             temp_dir = None
+            sim_cache = None
             try:
                 spotpy_params: list[spotpy.parameter.Uniform] = []
                 if self.in_ports["init_params"]:
@@ -616,9 +822,7 @@ class Component(process.Process[Config]):
                             check_and_possibly_add_sentinel_value(sentinel_values, attr, "null_sentinel")
                             check_and_possibly_add_sentinel_value(sentinel_values, attr, "nan_sentinel")
 
-                        obs_values = capnp_value_lf64_to_numpy_array_with_nan(
-                            obs_values_ip.content.as_struct(common_capnp.Value).lf64, sentinel_values=sentinel_values
-                        )
+                        obs_values = ip_to_numpy(obs_values_ip, sentinels=sentinel_values.keys())
                         if len(obs_values) == 0:
                             logger.warning("%s: no observed values to calibrate!", Path(__file__).name)
                             continue
@@ -626,12 +830,27 @@ class Component(process.Process[Config]):
                         logger.exception("%s Exception", Path(__file__).name)
                         continue
 
+                if self.config.sim_cache_size > 0 or self.config.sim_cache_path:
+                    sim_cache = SimulationCache(
+                        self.config.sim_cache_size,
+                        path=self.config.sim_cache_path,
+                        decimals=self.config.sim_cache_decimals,
+                        context=context_hash(
+                            self.config.sim_cache_namespace,
+                            param_set_id,
+                            json.dumps([p.name for p in spotpy_params]),
+                            b"" if obs_values is None else np.asarray(obs_values, np.float64).tobytes(),
+                        ),
+                    )
+
                 spot_setup = SpotPySetup(
                     spotpy_params,
                     obs_values,
                     self.out_ports["sampled_params"],
                     self.in_ports["sim_values"],
                     loop,
+                    sim_id_attr=self.config.sim_id_attr if self.config.max_in_flight > 1 else None,
+                    sim_cache=sim_cache,
                 )
 
                 rep = self.config.repetitions
@@ -647,13 +866,39 @@ class Component(process.Process[Config]):
                     )
                 ) is None:
                     continue
+                if self.config.db_format != "csv":
+                    install_result_db(
+                        sampler,
+                        BufferedResultDb(
+                            path_to_spotpy_db,
+                            sampler.parnames,
+                            db_format=self.config.db_format,
+                            block_rows=self.config.db_block_rows,
+                        ),
+                    )
+                if self.config.max_in_flight > 1:
+                    sampler.repeat = InFlightForEach(
+                        sampler, self.config.max_in_flight, ordered=self.config.ordered_results
+                    )
 
                 # Run the sampler in a thread so the event loop stays free to handle
                 # the async port calls made by SpotPySetup.simulation() via
                 # asyncio.run_coroutine_threadsafe().
+                trace_writer = TraceWriter(
+                    f"{self.config.path_to_out_folder}/{param_set_id}_SCEUA_objectivefunctiontrace_MONICA.parquet",
+                    sampler.parnames,
+                    block_rows=self.config.trace_block_rows,
+                )
+                install_trace(sampler, trace_writer)
                 sample_params = sample_params_for_algorithm(self.config.algorithm, self.config)
                 custom_update_sample_params(self.config.algorithm, sample_params, spotpy_params)
-                await asyncio.to_thread(sampler.sample, rep, **sample_params)
+                try:
+                    await asyncio.to_thread(sampler.sample, rep, **sample_params)
+                finally:
+                    sampler.repeat.terminate()
+                    if isinstance(sampler.datawriter, BufferedResultDb):
+                        sampler.datawriter.finalize()
+                    trace_path = trace_writer.close()
 
                 if self.out_ports["best"]:
                     best_out_stream = io.StringIO()
@@ -661,23 +906,22 @@ class Component(process.Process[Config]):
                     best_ip = fbp_capnp.IP.new_message(content=best_out_stream.getvalue())
                     await self.write_out("best", best_ip)
 
-                results: ndarray = spotpy.analyser.load_csv_results(path_to_spotpy_db)
-                fig = plt.figure(1, figsize=(9, 6))
-                plt.plot(results["like1"], "r+")
-                plt.show()
-                plt.ylabel("RMSE")
-                plt.xlabel("Iteration")
-                fig.savefig(
-                    f"{self.config.path_to_out_folder}/{param_set_id}_SCEUA_objectivefunctiontrace_MONICA.png",
-                    dpi=150,
-                )
-                plt.close(fig)
+                if self.out_ports["trace"]:
+                    trace_ip = fbp_capnp.IP.new_message(
+                        content=str(trace_path),
+                        attributes=[{"key": "param_set_id", "value": param_set_id}],
+                    )
+                    await self.write_out("trace", trace_ip)
 
             except Exception:
                 logger.exception("%s Exception", Path(__file__).name)
-
-            if temp_dir:
-                temp_dir.cleanup()
+            finally:
+                # also reached by the continue statements above
+                if sim_cache is not None:
+                    logger.info("%s: simulation cache hits: %d misses: %d", self.name, sim_cache.hits, sim_cache.misses)
+                    sim_cache.close()
+                if temp_dir:
+                    temp_dir.cleanup()
 
         logger.info("%s: process finished", self.name)
 